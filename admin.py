@@ -1,12 +1,20 @@
 import logging
 import asyncio
 import os
-from aiogram import Dispatcher, Bot
+from aiogram import Dispatcher, Router, Bot, F
 from aiogram.filters import Command
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, FSInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database import db
+from chatfilters import inline
+from loopmonitor import monitor
+from diagnostics import collect_runtime_stats, format_runtime_report
+from chatsettings import chat_settings, FEATURES
+from exporter import EXPORTS, FORMATS, export_table, cleanup
+from backup import backups
+from retention import retention
+from ratelimit import rate_limited
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +74,12 @@ async def admin_command(message: Message, state: FSMContext):
                         text="🔧 Sozlamalar",
                         callback_data="admin_settings"
                     )
+                ],
+                [
+                    InlineKeyboardButton(
+                        text="🩺 Diagnostika",
+                        callback_data="admin_diagnostics"
+                    )
                 ]
             ]
         )
@@ -79,8 +93,9 @@ Admin panelga xush kelibsiz. Bu yerdan botni boshqarishingiz mumkin:
 
 📊 **Analitika** - Bot statistikasini ko'rish
 📢 **Xabar yuborish** - Barcha foydalanuvchilarga xabar yuborish
-👥 **Foydalanuvchilar** - Foydalanuvchilar ro'yxati
+👥 **Foydalanuvchilar** - Foydalanuvchilar ro'yxati va eksport (Excel/CSV)
 🔧 **Sozlamalar** - Bot sozlamalari
+🩺 **Diagnostika** - Runtime holati (xotira, navbatlar, API xatolari)
 
 Super Admin ID: `{SUPER_ADMIN_ID}`
 Sizning ID: `{user_id}`
@@ -329,6 +344,10 @@ async def confirm_broadcast(callback_query: CallbackQuery, state: FSMContext, bo
         success_count = 0
         failed_count = 0
         
+        # The session's rate limiter paces sends and lets moderation calls
+        # go first; with it disabled (RATE_LIMIT_GLOBAL=0) a small delay
+        # between sends keeps the broadcast under Telegram's limits
+        delay = 0 if rate_limited(bot) else 0.05
         for user in users:
             try:
                 user_id = user['user_id']
@@ -349,8 +368,8 @@ async def confirm_broadcast(callback_query: CallbackQuery, state: FSMContext, bo
                 
                 success_count += 1
                 
-                # Small delay to avoid rate limits
-                await asyncio.sleep(0.05)
+                if delay:
+                    await asyncio.sleep(delay)
                 
             except Exception as e:
                 failed_count += 1
@@ -388,6 +407,25 @@ async def cancel_broadcast(callback_query: CallbackQuery, state: FSMContext):
         logger.error(f"Error canceling broadcast: {e}")
         await callback_query.answer("❌ Xatolik yuz berdi!")
 
+def loop_health_text() -> str:
+    """Event-loop lag and slow handler section of the debug report"""
+    slow = monitor.slow_handlers()
+    slow_text = "\n".join(
+        f"• `{entry.handler}` - {entry.elapsed:.1f}s ({entry.update_type}, chat `{entry.chat_id}`)"
+        for entry in slow[:5]
+    ) or "• Yo'q ✅"
+    return f"""
+**⏱ Event loop:**
+• Oxirgi kechikish: {monitor.last_lag * 1000:.1f} ms
+• Maksimal kechikish: {monitor.max_lag * 1000:.1f} ms
+• Ishlayotgan handlerlar: {len(monitor.in_flight)}
+
+**🐢 Sekin handlerlar (> {monitor.handler_budget:.1f}s):**
+{slow_text}
+
+Stack uchun: /debug\\_admin stack
+"""
+
 async def debug_admin_info(message: Message):
     """Debug command to check admin info"""
     try:
@@ -404,12 +442,81 @@ Environment SUPER_ADMIN_ID: `{os.getenv('SUPER_ADMIN_ID', 'NOT_SET')}`
 - User ID va Super Admin ID bir xilmi? {user_id == SUPER_ADMIN_ID}
 - Super Admin ID noldan farqlimi? {SUPER_ADMIN_ID != 0}
         """
+        if is_super_admin(user_id):
+            debug_text += format_runtime_report(collect_runtime_stats())
+            debug_text += loop_health_text()
         await message.answer(debug_text, parse_mode="Markdown")
         
+        # "/debug_admin stack" dumps the stacks of handlers over budget
+        if is_super_admin(user_id) and message.text and "stack" in message.text.split()[1:]:
+            stacks = monitor.dump_stacks(only_slow=True)
+            await message.answer(stacks[-4000:] if stacks else "✅ Hozir vaqt budjetidan oshgan handler yo'q.")
+        
     except Exception as e:
         logger.error(f"Error in debug info: {e}")
         await message.answer("❌ Debug ma'lumotni olishda xatolik!")
 
+def export_keyboard() -> InlineKeyboardMarkup:
+    """One row per exportable table, one button per format"""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"📤 {export.label} ({fmt.upper()})",
+                    callback_data=f"export:{name}:{fmt}"
+                )
+                for fmt in FORMATS
+            ]
+            for name, export in EXPORTS.items()
+        ]
+    )
+
+async def send_export(callback_query: CallbackQuery):
+    """Build the requested export off the event loop and send it as a document"""
+    _, name, fmt = callback_query.data.split(":")
+    if name not in EXPORTS or fmt not in FORMATS:
+        await callback_query.answer("❌ Noma'lum eksport!")
+        return
+    
+    await callback_query.answer("⏳ Fayl tayyorlanmoqda...")
+    path = None
+    try:
+        path, count = await export_table(name, fmt)
+        await callback_query.message.answer_document(
+            FSInputFile(path),
+            caption=f"📤 {EXPORTS[name].label}: {count} ta yozuv"
+        )
+    except Exception as e:
+        logger.error(f"Error exporting {name} as {fmt}: {e}")
+        await callback_query.message.answer("❌ Eksport qilishda xatolik yuz berdi.")
+    finally:
+        if path:
+            cleanup(path)
+
+# Bots can upload documents up to 50 MB
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024
+
+async def send_backup(callback_query: CallbackQuery):
+    """Take an online backup now and send it to the admin"""
+    await callback_query.answer("⏳ Backup olinmoqda...")
+    try:
+        path = await backups.create()
+        size = os.path.getsize(path)
+        if size > MAX_DOCUMENT_BYTES:
+            await callback_query.message.answer(
+                f"💾 Backup saqlandi: `{path}` ({size / 1024 / 1024:.1f} MB)\n"
+                "Fayl Telegram orqali yuborish uchun juda katta.",
+                parse_mode="Markdown"
+            )
+            return
+        await callback_query.message.answer_document(
+            FSInputFile(path),
+            caption=f"💾 Backup: {os.path.basename(path)} ({size / 1024 / 1024:.1f} MB)"
+        )
+    except Exception as e:
+        logger.error(f"Error creating backup: {e}")
+        await callback_query.message.answer("❌ Backup olishda xatolik yuz berdi.")
+
 def setup_admin(dp: Dispatcher, bot: Bot):
     """Setup admin handlers"""
     
@@ -419,12 +526,19 @@ def setup_admin(dp: Dispatcher, bot: Bot):
     
     logger.info(f"Setting up admin handlers for SUPER_ADMIN_ID: {SUPER_ADMIN_ID}")
     
-    @dp.message(Command("admin"))
+    # Everything on this router belongs to the super admin, so other users'
+    # updates are rejected by a single cheap check instead of walking every
+    # command, callback and FSM state filter below
+    router = Router(name="admin")
+    router.message.filter(inline(F.from_user.id == SUPER_ADMIN_ID))
+    router.callback_query.filter(inline(F.from_user.id == SUPER_ADMIN_ID))
+    
+    @router.message(Command("admin"))
     async def admin_handler(message: Message, state: FSMContext):
         logger.info(f"Admin command handler triggered by user {message.from_user.id}")
         await admin_command(message, state)
     
-    @dp.message(Command("analytics"))
+    @router.message(Command("analytics"))
     async def analytics_handler(message: Message):
         logger.info(f"Analytics command handler triggered by user {message.from_user.id}")
         await analytics_command(message)
@@ -435,27 +549,27 @@ def setup_admin(dp: Dispatcher, bot: Bot):
         await debug_admin_info(message)
     
     # Admin callback handlers
-    @dp.callback_query(lambda c: c.data == "admin_broadcast")
+    @router.callback_query(inline(F.data == "admin_broadcast"))
     async def broadcast_callback_handler(callback_query: CallbackQuery, state: FSMContext):
         await start_broadcast(callback_query, state)
     
-    @dp.callback_query(lambda c: c.data == "broadcast_with_photo")
+    @router.callback_query(inline(F.data == "broadcast_with_photo"))
     async def broadcast_photo_handler(callback_query: CallbackQuery, state: FSMContext):
         await broadcast_with_photo(callback_query, state)
     
-    @dp.callback_query(lambda c: c.data == "broadcast_text_only")
+    @router.callback_query(inline(F.data == "broadcast_text_only"))
     async def broadcast_text_handler(callback_query: CallbackQuery, state: FSMContext):
         await broadcast_text_only(callback_query, state)
     
-    @dp.callback_query(lambda c: c.data == "confirm_broadcast")
+    @router.callback_query(inline(F.data == "confirm_broadcast"))
     async def confirm_broadcast_handler(callback_query: CallbackQuery, state: FSMContext):
         await confirm_broadcast(callback_query, state, bot)
     
-    @dp.callback_query(lambda c: c.data in ["cancel_broadcast", "broadcast_cancel"])
+    @router.callback_query(inline(F.data.in_({"cancel_broadcast", "broadcast_cancel"})))
     async def cancel_broadcast_handler(callback_query: CallbackQuery, state: FSMContext):
         await cancel_broadcast(callback_query, state)
     
-    @dp.callback_query(lambda c: c.data == "admin_analytics")
+    @router.callback_query(inline(F.data == "admin_analytics"))
     async def analytics_callback_handler(callback_query: CallbackQuery):
         if not is_super_admin(callback_query.from_user.id):
             await callback_query.answer("❌ Ruxsat yo'q!")
@@ -463,7 +577,7 @@ def setup_admin(dp: Dispatcher, bot: Bot):
         await analytics_command(callback_query.message)
         await callback_query.answer()
     
-    @dp.callback_query(lambda c: c.data == "admin_users")
+    @router.callback_query(inline(F.data == "admin_users"))
     async def users_callback_handler(callback_query: CallbackQuery):
         try:
             if not is_super_admin(callback_query.from_user.id):
@@ -482,48 +596,86 @@ def setup_admin(dp: Dispatcher, bot: Bot):
 📈 **Guruh statistikasi:**
 • Jami guruhlar: {analytics.get('total_groups', 0)}
 • Faol guruhlar: {analytics.get('active_groups', 0)}
+
+📤 To'liq ro'yxatni yuklab olish uchun formatni tanlang:
             """
-            await callback_query.message.edit_text(users_text, parse_mode="Markdown")
+            await callback_query.message.edit_text(users_text, reply_markup=export_keyboard(), parse_mode="Markdown")
         except Exception as e:
             logger.error(f"Error getting users info: {e}")
             await callback_query.message.edit_text("❌ Foydalanuvchilar ma'lumotini olishda xatolik!")
         await callback_query.answer()
     
-    @dp.callback_query(lambda c: c.data == "admin_settings")
+    @router.callback_query(inline(F.data.startswith("export:")))
+    async def export_callback_handler(callback_query: CallbackQuery):
+        await send_export(callback_query)
+    
+    @router.callback_query(inline(F.data == "admin_settings"))
     async def settings_callback_handler(callback_query: CallbackQuery):
         if not is_super_admin(callback_query.from_user.id):
             await callback_query.answer("❌ Ruxsat yo'q!")
             return
             
-        settings_text = """
+        # Built from the settings cache, so opening the screen costs no queries
+        customized_groups = len(chat_settings)
+        disabled = chat_settings.disabled_counts()
+        feature_lines = "\n".join(
+            f"• {label}: Yoqilgan ✅" + (f" ({disabled[name]} guruhda o'chirilgan)" if disabled[name] else "")
+            for name, (_, label) in FEATURES.items()
+        )
+        settings_text = f"""
 🔧 **Bot Sozlamalari**
 
-⚡ **Joriy sozlamalar:**
+⚡ **Joriy sozlamalar (standart):**
 • Anti-spam: Yoqilgan ✅
-• Link aniqlash: Yoqilgan ✅
-• Mention nazorati: Yoqilgan ✅
-• Join/Leave o'chirish: Yoqilgan ✅
+{feature_lines}
+
+👥 **Guruh sozlamalari:**
+• O'zgartirilgan guruhlar: {customized_groups}
+• Guruh adminlari: /settings, /enable, /disable
 
 📊 **Ma'lumotlar bazasi:**
 • SQLite faylda saqlanadi
-• Avtomatik backup: Yo'q ❌
-
-ℹ️ Qo'shimcha sozlamalar keyingi yangilanishlarda qo'shiladi.
+• {backups.status_text()}
+• {retention.status_text()}
         """
-        await callback_query.message.edit_text(settings_text, parse_mode="Markdown")
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text="💾 Backup olish",
+                        callback_data="admin_backup"
+                    )
+                ]
+            ]
+        )
+        await callback_query.message.edit_text(settings_text, reply_markup=keyboard, parse_mode="Markdown")
+        await callback_query.answer()
+    
+    @router.callback_query(inline(F.data == "admin_backup"))
+    async def backup_callback_handler(callback_query: CallbackQuery):
+        await send_backup(callback_query)
+    
+    @router.callback_query(inline(F.data == "admin_diagnostics"))
+    async def diagnostics_callback_handler(callback_query: CallbackQuery):
+        try:
+            report = format_runtime_report(collect_runtime_stats()) + loop_health_text()
+            await callback_query.message.edit_text(report, parse_mode="Markdown")
+        except Exception as e:
+            logger.error(f"Error building diagnostics: {e}")
+            await callback_query.message.edit_text("❌ Diagnostika ma'lumotini olishda xatolik!")
         await callback_query.answer()
     
     # State handlers
-    @dp.message(BroadcastStates.waiting_for_photo)
+    @router.message(BroadcastStates.waiting_for_photo)
     async def photo_upload_handler(message: Message, state: FSMContext):
         await handle_photo_upload(message, state)
     
-    @dp.message(BroadcastStates.waiting_for_text)
+    @router.message(BroadcastStates.waiting_for_text)
     async def text_input_handler(message: Message, state: FSMContext):
         await handle_broadcast_text(message, state)
     
     # Cancel command
-    @dp.message(Command("cancel"))
+    @router.message(Command("cancel"))
     async def cancel_command_handler(message: Message, state: FSMContext):
         current_state = await state.get_state()
         if current_state:
@@ -532,4 +684,11 @@ def setup_admin(dp: Dispatcher, bot: Bot):
         else:
             await message.answer("❌ Bekor qilinadigan jarayon yo'q.")
     
+    # Non-admins still get an explicit refusal for admin commands
+    @dp.message(Command("admin", "analytics"), inline(F.from_user.id != SUPER_ADMIN_ID))
+    async def unauthorized_admin_handler(message: Message):
+        logger.warning(f"Unauthorized admin attempt by user {message.from_user.id}")
+        await message.answer("❌ Bu buyruq faqat super admin uchun!")
+    
+    dp.include_router(router)
     logger.info(f"Admin handlers setup completed for super admin: {SUPER_ADMIN_ID}")
\ No newline at end of file
@@ -0,0 +1,162 @@
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from database import db
+from metrics import registry, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+BACKUPS_TOTAL = registry.register(Counter(
+    "bot_backups_total", "Database backups attempted", ("result",)))
+BACKUP_SECONDS = registry.register(Histogram(
+    "bot_backup_seconds", "Time to write a database backup",
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300)))
+
+class BackupManager:
+    """Online snapshots of the bot database with retention
+    
+    Uses SQLite's backup API from a worker thread, copying ``pages`` pages
+    per step and sleeping ``pause`` seconds in between so the disk and the
+    writer connections get their turn. The source connection holds one read
+    transaction for the whole copy: in WAL mode that pins a snapshot without
+    blocking writers, and it stops the backup from restarting every time a
+    message write lands between two steps. Finished files are gzipped when
+    ``compress`` is set and only the newest ``keep`` are kept.
+    """
+    
+    def __init__(self, db_path: str, directory: str = "backups", interval: float = 24 * 3600,
+                 keep: int = 7, compress: bool = True, pages: int = 256, pause: float = 0.005):
+        self.db_path = db_path
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.compress = compress
+        self.pages = pages
+        self.pause = pause
+        self.last_path: Optional[str] = None
+        self.last_time: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def prefix(self) -> str:
+        return Path(self.db_path).stem + "_"
+    
+    def _copy(self, target: str):
+        source = sqlite3.connect(Path(self.db_path).absolute().as_uri() + "?mode=ro", uri=True,
+                                 isolation_level=None)
+        destination = sqlite3.connect(target)
+        try:
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchall()
+            # ``sleep`` only applies to busy retries; the progress callback
+            # runs after every step, so it is where the pause goes
+            source.backup(destination, pages=self.pages,
+                          progress=lambda status, remaining, total: time.sleep(self.pause))
+            source.execute("COMMIT")
+        finally:
+            destination.close()
+            source.close()
+    
+    def _write(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{self.prefix}{datetime.now():%Y%m%d_%H%M%S}.db"
+        path = os.path.join(self.directory, name)
+        partial = path + ".part"
+        self._copy(partial)
+        if self.compress:
+            with open(partial, "rb") as source, gzip.open(partial + ".gz", "wb", compresslevel=6) as output:
+                shutil.copyfileobj(source, output, 1024 * 1024)
+            os.remove(partial)
+            partial, path = partial + ".gz", path + ".gz"
+        # Only complete files carry the final name, so retention and restores never see a partial copy
+        os.replace(partial, path)
+        self._prune()
+        return path
+    
+    def backups(self) -> List[str]:
+        """Finished backups, newest first"""
+        try:
+            names = [name for name in os.listdir(self.directory)
+                     if name.startswith(self.prefix) and (name.endswith(".db") or name.endswith(".db.gz"))]
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in sorted(names, reverse=True)]
+    
+    def _prune(self):
+        for path in self.backups()[self.keep:]:
+            try:
+                os.remove(path)
+                logger.info("Removed old backup %s", path)
+            except OSError as e:
+                logger.error("Error removing old backup %s: %s", path, e)
+    
+    async def create(self) -> str:
+        """Write a backup now and return its path; concurrent calls share one run at a time"""
+        async with self._lock:
+            start = time.perf_counter()
+            try:
+                path = await asyncio.to_thread(self._write)
+            except Exception:
+                BACKUPS_TOTAL.inc("error")
+                raise
+            BACKUPS_TOTAL.inc("ok")
+            BACKUP_SECONDS.observe(time.perf_counter() - start)
+            self.last_path, self.last_time = path, time.time()
+            logger.info("Database backup written to %s (%d bytes in %.1fs)",
+                        path, os.path.getsize(path), time.perf_counter() - start)
+            return path
+    
+    def start(self):
+        """Back up every ``interval`` seconds on the running loop (0 disables the schedule)"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name="database-backup")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        # A restart should not postpone the next backup by a whole interval
+        existing = self.backups()
+        if existing:
+            self.last_path, self.last_time = existing[0], os.path.getmtime(existing[0])
+        while True:
+            due = (self.last_time or 0) + self.interval - time.time()
+            if due > 0:
+                await asyncio.sleep(due)
+            try:
+                await self.create()
+            except Exception as e:
+                logger.error("Error backing up database: %s", e)
+                await asyncio.sleep(min(self.interval, 600))
+    
+    def status_text(self) -> str:
+        """One line for the admin settings screen"""
+        if self.interval <= 0:
+            return "Avtomatik backup: Yo'q ❌"
+        text = f"Avtomatik backup: har {self.interval / 3600:g} soatda ✅ (oxirgi {self.keep} ta saqlanadi)"
+        if self.last_time:
+            text += f"\n• Oxirgi backup: {datetime.fromtimestamp(self.last_time):%Y-%m-%d %H:%M}"
+        return text
+
+# Global backup manager
+backups = BackupManager(
+    db_path=db.db_path,
+    directory=os.getenv('BACKUP_DIR', 'backups'),
+    interval=float(os.getenv('BACKUP_INTERVAL_HOURS', '24')) * 3600,
+    keep=int(os.getenv('BACKUP_KEEP', '7')),
+    compress=os.getenv('BACKUP_COMPRESS', '1') != '0',
+)
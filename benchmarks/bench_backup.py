@@ -0,0 +1,53 @@
+"""Online backup cost and its effect on per-message writes
+
+Fills a database with --users users, then runs BackupManager.create in a
+loop for --seconds while the activity writes from bench_readpool keep
+going, and compares write latency with an idle run. Also reports one
+backup's duration and its size raw and gzipped.
+
+Run: python benchmarks/bench_backup.py [--users 200000] [--seconds 3]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from common import report
+from bench_readpool import fill, measure
+
+import backup
+import database
+
+
+async def run(users: int, seconds: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = database.Database(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        fill(db.db_path, users)
+        directory = os.path.join(tmp, "backups")
+
+        for compress in (False, True):
+            manager = backup.BackupManager(db.db_path, directory=directory, keep=2, compress=compress)
+            start = time.perf_counter()
+            path = await manager.create()
+            report("backup", {
+                "users": users,
+                "compress": compress,
+                "seconds": round(time.perf_counter() - start, 2),
+                "database_bytes": os.path.getsize(db.db_path),
+                "backup_bytes": os.path.getsize(path),
+            })
+
+        report("backup_writes", {"scenario": "idle", **await measure(db, seconds)})
+        report("backup_writes", {"scenario": "during_backup",
+                                 **await measure(db, seconds, manager.create)})
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.seconds))
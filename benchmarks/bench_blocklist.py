@@ -0,0 +1,82 @@
+"""Blocklist memory and lookup cost versus a plain set of strings
+
+Builds blocklists of increasing size from random domains and usernames and
+reports build time, the memory held by the Bloom filter plus digest array
+next to a ``set`` of the same strings (both measured with tracemalloc),
+and per-message find() time over the link spam and long corpora with a few
+corpus domains listed.
+
+Run: python benchmarks/bench_blocklist.py [--size N]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from common import report
+from corpus import build_corpora
+
+from blocklist import Blocklist, normalize_entry
+
+
+def make_entries(count: int, seed: int = 7):
+    """Random domains and usernames plus one the corpus links to"""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz0123456789"
+    entries = {"easy-money.uz", "@spam_channel"}
+    while len(entries) < count:
+        name = "".join(rng.choice(letters) for _ in range(rng.randint(5, 14)))
+        if rng.random() < 0.3:
+            entries.add(f"@{name}")
+        else:
+            entries.add(f"{name}.{rng.choice(('com', 'uz', 'ru', 'net', 'xyz'))}")
+    return [normalize_entry(entry) for entry in entries]
+
+
+def allocated(build):
+    """Result of build() and the bytes it still holds"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def run(size: int):
+    corpora = build_corpora(size)
+    for count in (1000, 10000, 50000):
+        entries = make_entries(count)
+        start = time.perf_counter()
+        _built(entries)
+        build_s = time.perf_counter() - start
+        blocklist, blocklist_bytes = allocated(lambda: _built(entries))
+        # The set keeps its own copies of the strings, as it would when loaded from a file
+        _, set_bytes = allocated(lambda: {entry.encode().decode() for entry in entries})
+        results = {
+            "entries": count,
+            "build_ms": round(build_s * 1e3, 1),
+            "bloom_bytes": len(blocklist.bloom.bits),
+            "blocklist_bytes": blocklist_bytes,
+            "set_bytes": set_bytes,
+            "bytes_per_entry": round(blocklist_bytes / count, 1),
+        }
+        for name in ("link_spam", "long"):
+            texts = [text.lower() for text in corpora[name]]
+            start = time.perf_counter()
+            hits = sum(1 for text in texts if blocklist.find(text))
+            results[f"{name}_us_per_msg"] = round((time.perf_counter() - start) / len(texts) * 1e6, 2)
+            results[f"{name}_hits"] = hits
+        report("blocklist", results)
+
+
+def _built(entries):
+    blocklist = Blocklist()
+    blocklist.build(entries)
+    return blocklist
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000, help="messages per corpus")
+    args = parser.parse_args()
+    run(args.size)
@@ -0,0 +1,134 @@
+"""Per-update dispatch cost: flat lambda-filtered dispatcher vs chat-type-scoped routers
+
+Handler bodies are replaced with no-ops so only routing and filter evaluation
+is measured. Run: python benchmarks/bench_dispatch.py [--updates N]
+"""
+import argparse
+import asyncio
+import time
+
+from common import make_bot, make_update, message_dict, report, user_dict
+
+from aiogram import Dispatcher
+from aiogram.enums import ContentType
+from aiogram.filters import Command
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import admin
+import chatsettings
+import commands
+import domainlists
+import duplicatedetector
+import floodlimiter
+import joinremover
+import linkdetector
+import main
+import spamscore
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+def _silence_handlers():
+    for module, names in (
+        (linkdetector, ("handle_link_message", "cache_user_activity")),
+        (joinremover, ("handle_new_members", "handle_left_members")),
+        (floodlimiter, ("handle_flood_message",)),
+        (main, ("track_user_activity",)),
+        (commands, ("start_command",)),
+        (admin, ("admin_command", "analytics_command", "debug_admin_info", "handle_photo_upload",
+                 "handle_broadcast_text", "start_broadcast", "cancel_broadcast")),
+    ):
+        for name in names:
+            setattr(module, name, _noop)
+
+
+def build_legacy(bot):
+    """Replica of the original flat registration order with lambda filters"""
+    dp = Dispatcher(storage=MemoryStorage())
+    commands.setup_commands(dp)
+    for name in ("admin", "analytics", "debug_admin"):
+        dp.message(Command(name))(_noop)
+    for data in ("admin_broadcast", "broadcast_with_photo", "broadcast_text_only", "confirm_broadcast",
+                 "admin_analytics", "admin_users", "admin_settings"):
+        dp.callback_query(lambda c, data=data: c.data == data)(_noop)
+    dp.message(admin.BroadcastStates.waiting_for_photo)(_noop)
+    dp.message(admin.BroadcastStates.waiting_for_text)(_noop)
+    dp.message(Command("cancel"))(_noop)
+    dp.message(linkdetector.LinkDetectorFilter())(_noop)
+    dp.message(lambda message: message.chat and message.chat.type in ['group', 'supergroup'])(_noop)
+    dp.message(lambda message: message.content_type == ContentType.NEW_CHAT_MEMBERS)(_noop)
+    dp.message(lambda message: message.content_type == ContentType.LEFT_CHAT_MEMBER)(_noop)
+    dp.message(lambda message: message.chat and message.chat.type == 'private')(_noop)
+    return dp
+
+
+def build_routed(bot):
+    """The tree main.main builds"""
+    dp = Dispatcher(storage=MemoryStorage())
+    commands.setup_commands(dp)
+    admin.setup_admin(dp, bot)
+    private_router, group_router = main.create_chat_routers()
+    joinremover.setup_join_remover(group_router, bot)
+    floodlimiter.setup_flood_limiter(group_router, bot)
+    duplicatedetector.setup_duplicate_detector(group_router, bot)
+    chatsettings.setup_chat_settings(group_router, bot)
+    domainlists.setup_domain_lists(group_router, bot)
+    spamscore.setup_spam_score(group_router, bot)
+    linkdetector.setup_link_detector(group_router, bot)
+    main.setup_activity_tracking(private_router)
+    dp.include_routers(group_router, private_router)
+    return dp
+
+
+def build_corpus(bot, size: int):
+    """Traffic mix dominated by ordinary group chatter, like production"""
+    templates = [
+        lambda: message_dict("Assalomu alaykum, bugun uchrashuv soat nechida?"),
+        lambda: message_dict("Rahmat, hammasi tushunarli"),
+        lambda: message_dict("Yangi kanal: https://t.me/spam_channel obuna bo'ling"),
+        lambda: message_dict("@someone qarab ko'r"),
+        lambda: message_dict(None, new_chat_members=[user_dict(3003, "newbie")]),
+        lambda: message_dict(None, left_chat_member=user_dict(3004, "leaver")),
+        lambda: message_dict("salom", chat_id=1001, chat_type="private"),
+        lambda: message_dict("Ok"),
+    ]
+    updates = []
+    for i in range(size):
+        message = templates[i % len(templates)]()
+        # Spread senders so the flood limiter does not kick in
+        message["from"]["id"] = 10000 + i
+        updates.append(make_update(bot, message))
+    return updates
+
+
+async def measure(dp, bot, updates, rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        best = min(best, time.perf_counter() - start)
+    return best / len(updates) * 1e6
+
+
+async def run(size: int):
+    _silence_handlers()
+    bot = make_bot()
+    updates = build_corpus(bot, size)
+    legacy_us = await measure(build_legacy(bot), bot, updates)
+    routed_us = await measure(build_routed(bot), bot, updates)
+    report("dispatch", {
+        "updates": size,
+        "legacy_us_per_update": round(legacy_us, 2),
+        "routed_us_per_update": round(routed_us, 2),
+        "speedup": round(legacy_us / routed_us, 2),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=4000)
+    args = parser.parse_args()
+    asyncio.run(run(args.updates))
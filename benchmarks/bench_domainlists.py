@@ -0,0 +1,50 @@
+"""Per-chat domain list matching cost as the lists grow
+
+Builds DomainMatcher automata with increasing numbers of entries and times
+verdict() over the link spam and long corpora. Per-message cost should stay
+flat as entries are added; only compile time grows.
+
+Run: python benchmarks/bench_domainlists.py [--size N]
+"""
+import argparse
+import random
+import time
+
+from common import report
+from corpus import build_corpora
+
+from domainlists import ALLOW, DENY, DomainMatcher
+
+
+def make_entries(count: int, seed: int = 11):
+    """Random allow/deny domains plus the ones the corpus actually links to"""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    entries = {"t.me": ALLOW, "example.com": ALLOW, "easy-money.uz": DENY}
+    while len(entries) < count:
+        name = "".join(rng.choice(letters) for _ in range(rng.randint(4, 12)))
+        entries[f"{name}.{rng.choice(('com', 'uz', 'ru', 'net'))}"] = rng.choice((ALLOW, DENY))
+    return entries
+
+
+def run(size: int):
+    corpora = build_corpora(size)
+    for count in (10, 1000, 10000):
+        start = time.perf_counter()
+        matcher = DomainMatcher(make_entries(count))
+        compile_ms = (time.perf_counter() - start) * 1e3
+        results = {"entries": count, "compile_ms": round(compile_ms, 1), "states": len(matcher.goto)}
+        for name in ("link_spam", "long"):
+            texts = corpora[name]
+            start = time.perf_counter()
+            for text in texts:
+                matcher.verdict(text)
+            results[f"{name}_us_per_msg"] = round((time.perf_counter() - start) / len(texts) * 1e6, 2)
+        report("domainlists", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000, help="messages per corpus")
+    args = parser.parse_args()
+    run(args.size)
@@ -0,0 +1,75 @@
+"""Admin export cost: time, peak memory and event loop stalls
+
+Fills a users table with each --rows size and exports it as xlsx and csv
+through exporter.export_table, while a ticker on the event loop records the
+worst delay it saw. Growth of the process's peak RSS should stay flat as
+the row count grows, and the loop should only see GIL-switch sized stalls.
+
+Run: python benchmarks/bench_export.py [--rows 10000 200000]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import resource
+import tempfile
+import time
+from contextlib import closing
+
+from common import report
+
+import database
+import exporter
+
+
+def fill(path: str, rows: int):
+    with closing(sqlite3.connect(path)) as connection, connection:
+        connection.execute("DELETE FROM users")
+        connection.executemany(
+            "INSERT INTO users (user_id, username, first_name, last_name, language_code) VALUES (?, ?, ?, ?, ?)",
+            ((user_id, f"user{user_id}", "Фойдаланувчи", "Bench", "uz") for user_id in range(1, rows + 1)))
+
+
+async def worst_stall(stop: asyncio.Event, interval: float = 0.005) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = database.Database(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        exporter.db = db
+        for rows in sizes:
+            fill(db.db_path, rows)
+            for fmt in exporter.FORMATS:
+                stop = asyncio.Event()
+                ticker = asyncio.create_task(worst_stall(stop))
+                peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                start = time.perf_counter()
+                path, count = await exporter.export_table("users", fmt)
+                elapsed = time.perf_counter() - start
+                peak_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                stop.set()
+                report("export", {
+                    "rows": count,
+                    "format": fmt,
+                    "seconds": round(elapsed, 2),
+                    "rows_per_sec": round(count / elapsed),
+                    "file_bytes": os.path.getsize(path),
+                    "peak_rss_growth_kb": peak_after - peak_before,
+                    "worst_loop_stall_ms": round(await ticker * 1e3, 2),
+                })
+                exporter.cleanup(path)
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 200000])
+    args = parser.parse_args()
+    asyncio.run(run(args.rows))
@@ -0,0 +1,109 @@
+"""Statistics rebuild by the migration runner and the counter write it enables
+
+Builds a schema-version-1 database whose statistics table holds --rows
+rows over --days days, the way the old "INSERT OR IGNORE" counters left it
+(one row per counted message), and times:
+
+* legacy: one counter increment as it ran before (insert + UPDATE of every
+  row of the day, a full table scan)
+* migrate: Database.init_db bringing the file to the latest version, which
+  rebuilds statistics in batches with a unique date
+* upsert: one counter increment through Database on the rebuilt table
+
+Also checks that the merged rows kept each day's real totals.
+
+Run: python benchmarks/bench_migrations.py [--rows 200000] [--days 30]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import closing
+from datetime import date, timedelta
+
+from common import report
+
+import aiosqlite
+
+import database
+import migrations
+
+
+async def legacy_schema(path: str):
+    async with aiosqlite.connect(path) as connection:
+        await connection.execute("BEGIN")
+        await migrations.initial_schema(connection)
+        await connection.execute("PRAGMA user_version = 1")
+        await connection.commit()
+
+
+def fill(path: str, rows: int, days: int):
+    """Rows as the old counters wrote them: the first row of a day saw every increment"""
+    per_day = rows // days
+    start = date.today() - timedelta(days=days - 1)
+    with closing(sqlite3.connect(path)) as connection, connection:
+        connection.executemany(
+            "INSERT INTO statistics (date, messages_deleted, spam_detected) VALUES (?, ?, ?)",
+            (((start + timedelta(days=day)).isoformat(), per_day - index, (per_day - index) // 10)
+             for day in range(days) for index in range(per_day)))
+    return per_day
+
+
+async def legacy_increment(path: str) -> float:
+    today = date.today().isoformat()
+    start = time.perf_counter()
+    async with aiosqlite.connect(path) as connection:
+        await connection.execute("INSERT OR IGNORE INTO statistics (date) VALUES (?)", (today,))
+        await connection.execute("UPDATE statistics SET messages_deleted = messages_deleted + 1 WHERE date = ?",
+                                 (today,))
+        await connection.commit()
+    return time.perf_counter() - start
+
+
+async def upsert_increment(db: database.Database) -> float:
+    start = time.perf_counter()
+    await db.increment_deleted_messages_counter()
+    return time.perf_counter() - start
+
+
+async def run(rows: int, days: int, samples: int = 20):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        await legacy_schema(path)
+        per_day = fill(path, rows, days)
+
+        legacy = [await legacy_increment(path) for _ in range(samples)]
+
+        db = database.Database(path)
+        start = time.perf_counter()
+        await db.init_db()
+        migrate_seconds = time.perf_counter() - start
+
+        with closing(sqlite3.connect(path)) as connection:
+            merged = connection.execute("SELECT COUNT(*), MIN(messages_deleted) FROM statistics").fetchone()
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+
+        upsert = [await upsert_increment(db) for _ in range(samples)]
+        await db.close()
+
+        report("migrations", {
+            "rows": rows,
+            "days": days,
+            "schema_version": version,
+            "migrate_seconds": round(migrate_seconds, 2),
+            "rows_after": merged[0],
+            "totals_kept": merged[1] == per_day,
+            "legacy_increment_ms": round(statistics.median(legacy) * 1e3, 2),
+            "upsert_increment_ms": round(statistics.median(upsert) * 1e3, 2),
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.days))
@@ -0,0 +1,185 @@
+"""Offline benchmark of the moderation hot path
+
+Measures, per corpus, messages/sec through LinkDetectorFilter alone and
+through the full routed dispatcher against a fake Bot API session, the cost
+of unchanged edits, plus per-message cost of the activity-tracking DB writes
+and memory growth.
+Results are printed as JSON lines; --output also writes them to a file
+for regression tracking.
+
+Run: python benchmarks/bench_moderation.py [--size N] [--output results.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from common import GROUP_CHAT_ID, make_bot, make_update, message_dict, report
+from corpus import build_corpora
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import chatsettings
+import database
+import domainlists
+import duplicatedetector
+import floodlimiter
+import joinremover
+import linkdetector
+import main
+import spamscore
+from metrics import CACHE_REQUESTS
+
+_real_sleep = asyncio.sleep
+
+
+@contextmanager
+def no_sleep():
+    """Skip the handler's warning-cleanup sleep while keeping the yield point"""
+    async def _sleep(delay, result=None):
+        return await _real_sleep(0, result)
+    asyncio.sleep = _sleep
+    try:
+        yield
+    finally:
+        asyncio.sleep = _real_sleep
+
+
+_senders = itertools.count()
+
+
+def sender(index: int) -> int:
+    """Spread messages over many users so the flood limiter stays out of the way
+
+    Ids keep rotating across passes and corpora rather than restarting at
+    ``index``, so no user sends more than a handful of messages per run.
+    """
+    return 10000 + next(_senders) % 100000
+
+
+def build_dispatcher(bot):
+    dp = Dispatcher(storage=MemoryStorage())
+    private_router, group_router = main.create_chat_routers()
+    joinremover.setup_join_remover(group_router, bot)
+    floodlimiter.setup_flood_limiter(group_router, bot)
+    duplicatedetector.setup_duplicate_detector(group_router, bot)
+    chatsettings.setup_chat_settings(group_router, bot)
+    domainlists.setup_domain_lists(group_router, bot)
+    spamscore.setup_spam_score(group_router, bot)
+    linkdetector.setup_link_detector(group_router, bot)
+    main.setup_activity_tracking(private_router)
+    dp.include_routers(group_router, private_router)
+    return dp
+
+
+async def bench_filter(texts, bot):
+    detector = linkdetector.LinkDetectorFilter()
+    messages = [make_update(bot, message_dict(text, user_id=sender(i))).message for i, text in enumerate(texts)]
+    start = time.perf_counter()
+    flagged = 0
+    for message in messages:
+        flagged += bool(await detector(message))
+    elapsed = time.perf_counter() - start
+    return {"filter_msgs_per_sec": round(len(messages) / elapsed), "flagged": flagged}
+
+
+async def bench_dispatch(texts, bot, dp):
+    updates = [make_update(bot, message_dict(text, user_id=sender(i))) for i, text in enumerate(texts)]
+    bot.session.calls.clear()
+    start = time.perf_counter()
+    with no_sleep():
+        for update in updates:
+            await dp.feed_update(bot, update)
+    elapsed = time.perf_counter() - start
+    api_calls = sum(bot.session.calls.values())
+    
+    # Memory is measured in a second pass so tracing does not skew the timing
+    updates = [make_update(bot, message_dict(text, user_id=sender(i))) for i, text in enumerate(texts)]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    with no_sleep():
+        for update in updates:
+            await dp.feed_update(bot, update)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    growth = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "dispatch_msgs_per_sec": round(len(updates) / elapsed),
+        "api_calls_per_msg": round(api_calls / len(updates), 3),
+        "memory_growth_bytes_per_msg": round(growth / len(updates), 1),
+    }
+
+
+async def bench_edits(texts, bot, dp):
+    """Edits that leave the text unchanged, which the content-hash cache skips"""
+    messages = [message_dict(text, user_id=sender(i)) for i, text in enumerate(texts)]
+    with no_sleep():
+        for message in messages:
+            await dp.feed_update(bot, make_update(bot, message))
+    edits = [make_update(bot, edited_message={**message, "edit_date": message["date"] + 1}) for message in messages]
+    bot.session.calls.clear()
+    skipped_before = CACHE_REQUESTS.get("scanned_content", "hit")
+    start = time.perf_counter()
+    with no_sleep():
+        for update in edits:
+            await dp.feed_update(bot, update)
+    elapsed = time.perf_counter() - start
+    return {
+        "edit_msgs_per_sec": round(len(edits) / elapsed),
+        "edit_api_calls_per_msg": round(sum(bot.session.calls.values()) / len(edits), 3),
+        "edits_skipped": int(CACHE_REQUESTS.get("scanned_content", "hit") - skipped_before),
+    }
+
+
+async def bench_db(count: int):
+    """Cost of the per-message activity writes (user + group upsert and touch)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = database.Database(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        start = time.perf_counter()
+        for i in range(count):
+            user_id = 1000 + i % 200
+            await db.add_user(user_id=user_id, username=f"user{user_id}", first_name="Bench")
+            await db.update_user_activity(user_id)
+            await db.add_group(chat_id=GROUP_CHAT_ID, title="Bench group", chat_type="supergroup")
+            await db.update_group_activity(GROUP_CHAT_ID)
+        elapsed = time.perf_counter() - start
+    return {"db_ms_per_msg": round(elapsed / count * 1000, 3), "db_msgs_per_sec": round(count / elapsed)}
+
+
+async def run(size: int, db_messages: int):
+    corpora = build_corpora(size)
+    bot = make_bot()
+    dp = build_dispatcher(bot)
+    results = []
+    for name, texts in corpora.items():
+        result = {"corpus": name, "messages": len(texts)}
+        result.update(await bench_filter(texts, bot))
+        result.update(await bench_dispatch(texts, bot, dp))
+        result.update(await bench_edits(texts, bot, dp))
+        results.append(result)
+        report("moderation", result)
+    db_result = {"corpus": "activity_writes", "messages": db_messages}
+    db_result.update(await bench_db(db_messages))
+    results.append(db_result)
+    report("moderation", db_result)
+    await bot.session.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000, help="messages per corpus")
+    parser.add_argument("--db-messages", type=int, default=300)
+    parser.add_argument("--output", help="write all results to this JSON file")
+    args = parser.parse_args()
+    results = asyncio.run(run(args.size, args.db_messages))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({"timestamp": int(time.time()), "results": results}, output, ensure_ascii=False, indent=2)
@@ -0,0 +1,48 @@
+"""Cost and effect of the link obfuscation normalization pass
+
+Times normalize_for_scan per message on every corpus and counts how many
+messages the link rules flag with and without it. Normalization should add
+only microseconds per message while catching the obfuscated corpus.
+
+Run: python benchmarks/bench_normalize.py [--size N]
+"""
+import argparse
+import re
+import time
+
+from common import report
+from corpus import build_corpora
+
+from normalizer import normalize_for_scan
+
+LINK_PATTERNS = [
+    re.compile(r'https?://[^\s]+', re.IGNORECASE),
+    re.compile(r'www\.[^\s]+', re.IGNORECASE),
+    re.compile(r'\b[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b', re.IGNORECASE),
+    re.compile(r't\.me/[^\s]+', re.IGNORECASE),
+]
+
+
+def flagged(texts):
+    return sum(1 for text in texts if any(pattern.search(text) for pattern in LINK_PATTERNS))
+
+
+def run(size: int):
+    for name, texts in build_corpora(size).items():
+        start = time.perf_counter()
+        normalized = [normalize_for_scan(text) for text in texts]
+        elapsed = time.perf_counter() - start
+        report("normalize", {
+            "corpus": name,
+            "messages": len(texts),
+            "us_per_msg": round(elapsed / len(texts) * 1e6, 2),
+            "flagged_raw": flagged(texts),
+            "flagged_normalized": flagged(normalized),
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000, help="messages per corpus")
+    args = parser.parse_args()
+    run(args.size)
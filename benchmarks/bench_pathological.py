@@ -0,0 +1,146 @@
+"""Worst-case scan time of the link rules on adversarial input
+
+Each input is a 4096-character message built to make backtracking regexes
+blow up: long runs with no dot, dot-separated single letters, hyphen runs,
+repeated scheme prefixes, '@' floods and so on. Reports the slowest
+per-message time for the original unbounded patterns and for the current
+scanner (normalization, LinkDetectorFilter rules, blocklist and domain
+list lookups). The combined scan stops at the first rule that matches, so
+every link rule and every blocklist and domain list host pattern is also
+run on its own over the whole input. Exits non-zero when the scanner or
+any single pattern exceeds --budget-ms on any input.
+
+Run: python benchmarks/bench_pathological.py [--budget-ms 2] [--rounds 5]
+"""
+import argparse
+import re
+import sys
+import time
+
+from common import report
+
+import blocklist as blocklist_module
+import domainlists
+from blocklist import Blocklist
+from domainlists import DomainMatcher
+from linkdetector import LINK_PATTERN, LINK_RULES, MAX_SCAN_CHARS, MENTION_PATTERN
+from normalizer import normalize_for_scan
+
+LEGACY_PATTERNS = [
+    r'https?://[^\s]+',
+    r'www\.[^\s]+',
+    r'\b[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b',
+    r't\.me/[^\s]+',
+    r'@[a-zA-Z0-9_]+\.[a-zA-Z]{2,}',
+]
+
+
+def adversarial_inputs(size: int = MAX_SCAN_CHARS):
+    def fill(unit):
+        return (unit * (size // len(unit) + 1))[:size]
+    return {
+        "alnum_run": fill("a"),
+        "dotted_letters": fill("a."),
+        "dotted_digits": fill("1."),
+        "hyphen_run": fill("a-"),
+        "dots_then_digit": fill("a.")[:-1] + "1",
+        "long_labels": fill("a" * 70 + "."),
+        "scheme_flood": fill("http:/"),
+        "at_flood": fill("@a."),
+        "at_run": "@" + fill("a")[1:],
+        "bracket_dots": fill("a[.]"),
+        "spaced_dots": fill("a . "),
+        "mixed_script": fill("\u0430a."),
+        "zero_width": fill("a\u200b."),
+    }
+
+
+def rule_patterns():
+    """Every pattern run over message text, each link rule on its own"""
+    patterns = {f"link:{name}": re.compile(rule) for name, rule in LINK_RULES.items()}
+    patterns["mention"] = MENTION_PATTERN
+    patterns["blocklist:host"] = blocklist_module._HOST
+    patterns["blocklist:at_username"] = blocklist_module._AT_USERNAME
+    patterns["blocklist:tme_username"] = blocklist_module._TME_USERNAME
+    patterns["domainlists:host"] = domainlists._HOST
+    patterns["domainlists:entry"] = domainlists._DOMAIN_ENTRY
+    return patterns
+
+
+def exhaust(pattern, text):
+    # Every match over the whole text, the worst case for any caller
+    for _ in pattern.finditer(text):
+        pass
+
+
+def legacy_scan(text):
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, text, re.IGNORECASE):
+            return True
+    return bool(re.findall(r'@[a-zA-Z0-9_]+', text))
+
+
+def current_scan(text, matcher, blocklist):
+    text = normalize_for_scan(text[:MAX_SCAN_CHARS])
+    found = LINK_PATTERN.search(text) or MENTION_PATTERN.search(text)
+    if found:
+        blocklist.find(text.lower())
+        matcher.verdict(text)
+    return bool(found)
+
+
+def timed(func, text, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def run(budget_ms: float, rounds: int, legacy_rounds: int) -> bool:
+    matcher = DomainMatcher({"example.com": "allow", "t.me/spam": "deny"})
+    blocklist = Blocklist()
+    blocklist.build(["spam.com", "@spam_channel"])
+    within_budget = True
+    for name, text in adversarial_inputs().items():
+        current_ms = timed(lambda t: current_scan(t, matcher, blocklist), text, rounds)
+        legacy_ms = timed(legacy_scan, text, legacy_rounds) if legacy_rounds else None
+        within_budget &= current_ms <= budget_ms
+        report("pathological", {
+            "input": name,
+            "chars": len(text),
+            "legacy_ms": round(legacy_ms, 3) if legacy_ms is not None else None,
+            "current_ms": round(current_ms, 3),
+            "within_budget": current_ms <= budget_ms,
+        })
+    
+    patterns = rule_patterns()
+    for name, text in adversarial_inputs().items():
+        text = normalize_for_scan(text).lower()
+        slowest, slowest_ms = None, 0.0
+        for rule, pattern in patterns.items():
+            rule_ms = timed(lambda t: exhaust(pattern, t), text, rounds)
+            if rule_ms > slowest_ms:
+                slowest, slowest_ms = rule, rule_ms
+            if rule_ms > budget_ms:
+                within_budget = False
+                report("pathological_rule", {"input": name, "rule": rule, "ms": round(rule_ms, 3),
+                                             "within_budget": False})
+        report("pathological_rules", {
+            "input": name,
+            "rules": len(patterns),
+            "slowest_rule": slowest,
+            "slowest_ms": round(slowest_ms, 3),
+            "within_budget": slowest_ms <= budget_ms,
+        })
+    return within_budget
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=2.0, help="allowed scan time per message")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--legacy-rounds", type=int, default=1, help="0 skips the old patterns, which take hundreds of ms per input")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.budget_ms, args.rounds, args.legacy_rounds) else 1)
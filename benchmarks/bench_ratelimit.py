@@ -0,0 +1,98 @@
+"""Moderation burst against the fake Bot API with and without the rate limiter
+
+A spam wave hits --groups groups with --messages messages each; every one
+gets a deleteMessage and a warning sendMessage, while an admin broadcast
+to --broadcast private chats runs at the same time. The fake server
+answers 429 past 30 calls/s or 20 messages/min per group, like Telegram.
+
+For each mode, reports per-call-type outcomes after --seconds (ok, failed
+with 429, still queued) and deletion latency. Without the limiter the
+burst overshoots and calls fail; with it, deletions finish first and
+warnings wait for their chat's budget instead of being lost.
+
+Run: python benchmarks/bench_ratelimit.py [--groups 4] [--messages 30] [--broadcast 300]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+
+from common import report
+from fakeapi import FakeBotAPI
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+
+from ratelimit import RateLimiter
+
+
+async def call(outcomes: Counter, kind: str, request, latencies=None):
+    start = time.perf_counter()
+    try:
+        await request
+        outcomes[kind, "ok"] += 1
+        if latencies is not None:
+            latencies.append(time.perf_counter() - start)
+    except TelegramRetryAfter:
+        outcomes[kind, "429"] += 1
+    except asyncio.CancelledError:
+        outcomes[kind, "queued"] += 1
+        raise
+
+
+async def broadcast(bot: Bot, outcomes: Counter, users: int):
+    for user_id in range(1, users + 1):
+        await call(outcomes, "broadcast", bot.send_message(chat_id=user_id, text="E'lon"))
+
+
+async def run_mode(base_url: str, limited: bool, args):
+    api = FakeBotAPI(latency=0.02)
+    url = await api.start(port=args.port)
+    bot = Bot(token="123456:BENCHMARK", session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    if limited:
+        bot.session.middleware(RateLimiter())
+
+    outcomes: Counter = Counter()
+    delete_latencies = []
+    tasks = [asyncio.create_task(broadcast(bot, outcomes, args.broadcast))]
+    for group in range(args.groups):
+        chat_id = -1001000000000 - group
+        for message_id in range(1, args.messages + 1):
+            tasks.append(asyncio.create_task(call(outcomes, "delete", bot.delete_message(
+                chat_id=chat_id, message_id=message_id), delete_latencies)))
+            tasks.append(asyncio.create_task(call(outcomes, "warning", bot.send_message(
+                chat_id=chat_id, text="Reklama taqiqlangan"))))
+
+    done, pending = await asyncio.wait(tasks, timeout=args.seconds)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    await bot.session.close()
+    await api.stop()
+
+    report("ratelimit", {
+        "mode": "limiter" if limited else "none",
+        **{f"{kind}_{result}": count for (kind, result), count in sorted(outcomes.items())},
+        "delete_p50_ms": round(statistics.median(delete_latencies) * 1e3, 1) if delete_latencies else None,
+        "delete_max_ms": round(max(delete_latencies) * 1e3, 1) if delete_latencies else None,
+        "server_429": sum(api.throttled.values()),
+    })
+
+
+async def run(args):
+    for limited in (False, True):
+        await run_mode("", limited, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--groups", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=30)
+    parser.add_argument("--broadcast", type=int, default=300)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=8091)
+    args = parser.parse_args()
+    asyncio.run(run(args))
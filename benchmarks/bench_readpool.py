@@ -0,0 +1,115 @@
+"""Per-message write latency while admin queries scan the database
+
+Fills a database with --users users, then times the per-message activity
+writes (user upsert + last_seen touch) for --seconds each:
+
+* idle: no concurrent reads
+* shared: rollback journal, full user list read on a fresh connection in a
+  loop (how get_all_users ran before WAL and the read pool)
+* pool: WAL mode, the same read through Database.get_all_users, i.e. the
+  read-only pool
+
+Reports write latency percentiles and how many full reads completed. With
+the rollback journal a write waits for the reader's lock (p99 around a
+second); with the pool it stays within a few ms of idle.
+
+Run: python benchmarks/bench_readpool.py [--users 200000] [--seconds 3]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import closing
+
+from common import report
+
+import aiosqlite
+
+import database
+
+LEGACY_USERS_QUERY = """
+    SELECT user_id, username, first_name, last_name
+    FROM users
+    WHERE is_active = 1 AND is_bot = 0
+"""
+
+
+def fill(path: str, users: int):
+    with closing(sqlite3.connect(path)) as connection, connection:
+        connection.executemany(
+            "INSERT INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?)",
+            ((user_id, f"user{user_id}", "Bench", "User") for user_id in range(1, users + 1)))
+
+
+async def legacy_read(path: str) -> int:
+    async with aiosqlite.connect(path) as connection:
+        connection.row_factory = aiosqlite.Row
+        async with connection.execute(LEGACY_USERS_QUERY) as cursor:
+            return len([dict(row) for row in await cursor.fetchall()])
+
+
+async def pooled_read(db: database.Database) -> int:
+    return len(await db.get_all_users())
+
+
+async def measure(db: database.Database, seconds: float, read=None):
+    latencies = []
+    reads = 0
+    stop = time.perf_counter() + seconds
+
+    async def reader():
+        nonlocal reads
+        while time.perf_counter() < stop:
+            await read()
+            reads += 1
+
+    async def writer():
+        user_id = 0
+        while time.perf_counter() < stop:
+            user_id = user_id % 1000 + 1
+            start = time.perf_counter()
+            await db.add_user(user_id=user_id, username=f"user{user_id}", first_name="Bench")
+            await db.update_user_activity(user_id)
+            latencies.append((time.perf_counter() - start) * 1e3)
+
+    await asyncio.gather(writer(), *([reader()] if read else []))
+    latencies.sort()
+    return {
+        "writes": len(latencies),
+        "write_p50_ms": round(statistics.median(latencies), 2),
+        "write_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+        "write_max_ms": round(latencies[-1], 2),
+        "full_reads": reads,
+    }
+
+
+async def run(users: int, seconds: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = database.Database(path)
+        await db.init_db()
+        fill(path, users)
+
+        report("readpool", {"scenario": "idle", "users": users, **await measure(db, seconds)})
+
+        with closing(sqlite3.connect(path)) as connection:
+            connection.execute("PRAGMA journal_mode=DELETE")
+        report("readpool", {"scenario": "shared", "users": users,
+                            **await measure(db, seconds, lambda: legacy_read(path))})
+
+        with closing(sqlite3.connect(path)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+        report("readpool", {"scenario": "pool", "users": users,
+                            **await measure(db, seconds, lambda: pooled_read(db))})
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.seconds))
@@ -0,0 +1,85 @@
+"""Retention pass cost on a database full of stale rows
+
+Fills --users users (the older half last seen years ago) with memberships,
+then runs RetentionJob.run_once while the activity writes from
+bench_readpool keep going. Reports rows removed, how long the pass took,
+write latency during it and the file size before and after the
+incremental vacuum.
+
+Run: python benchmarks/bench_retention.py [--users 200000] [--seconds 3]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+from common import report
+from bench_readpool import measure
+
+# User pruning is opt-in; the stale users are what this bench measures
+os.environ.setdefault("RETENTION_USER_DAYS", "365")
+
+import database
+import retention
+
+
+def fill(path: str, users: int):
+    with closing(sqlite3.connect(path)) as connection, connection:
+        connection.executemany(
+            "INSERT INTO users (user_id, username, first_name, last_seen) VALUES (?, ?, ?, ?)",
+            ((user_id, f"user{user_id}", "Bench", "2020-01-01 00:00:00" if user_id <= users // 2 else "2099-01-01 00:00:00")
+             for user_id in range(1, users + 1)))
+        connection.execute("INSERT INTO groups (chat_id, title) VALUES (-1, 'Bench')")
+        connection.executemany("INSERT INTO user_groups (user_id, chat_id) VALUES (?, -1)",
+                               ((user_id,) for user_id in range(1, users + 1)))
+
+
+def file_bytes(path: str) -> int:
+    with closing(sqlite3.connect(path)) as connection:
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path)
+
+
+async def run(users: int, seconds: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = database.Database(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        fill(db.db_path, users)
+        before = file_bytes(db.db_path)
+
+        retention.db = db
+        job = retention.RetentionJob(chunk=500, pause=0.01)
+        deleted = {}
+
+        async def prune_once():
+            nonlocal deleted
+            if not deleted:
+                start = time.perf_counter()
+                deleted = await job.run_once()
+                deleted["seconds"] = round(time.perf_counter() - start, 2)
+            else:
+                await asyncio.sleep(0.05)
+
+        writes = await measure(db, seconds, prune_once)
+        report("retention", {
+            "users": users,
+            **{f"deleted_{table}": count for table, count in deleted.items() if table != "seconds"},
+            "pass_seconds": deleted.get("seconds"),
+            "file_bytes_before": before,
+            "file_bytes_after": file_bytes(db.db_path),
+            "write_p50_ms": writes["write_p50_ms"],
+            "write_p99_ms": writes["write_p99_ms"],
+            "write_max_ms": writes["write_max_ms"],
+        })
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.seconds))
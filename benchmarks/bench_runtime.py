@@ -0,0 +1,123 @@
+"""Per-update overhead with the default and the tuned runtime profile
+
+For each profile, in its own event loop:
+
+* decode: a 100-update getUpdates response body through the session's
+  check_response (JSON parse + model validation)
+* dispatch: decode plus feeding every update through the routed
+  dispatcher (handlers replaced with no-ops, as in bench_dispatch)
+* encode: building the form data of a sendMessage with an inline keyboard
+* loop: a round trip through the event loop (call_soon + future)
+
+"default" is aiogram's AiohttpSession with stdlib json on asyncio;
+"tuned" is runtime.create_session on the loop runtime.install_event_loop
+picks. uvloop and orjson are optional; the report says which were used.
+
+Run: python benchmarks/bench_runtime.py [--batches 40]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from common import BENCH_TOKEN, message_dict, report, user_dict
+from bench_dispatch import _silence_handlers, build_routed
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import GetUpdates, SendMessage
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+import runtime
+
+BATCH = 100
+
+
+def updates_body(offset: int) -> str:
+    """getUpdates response with the bench_dispatch traffic mix"""
+    templates = [
+        lambda: message_dict("Assalomu alaykum, bugun uchrashuv soat nechida?"),
+        lambda: message_dict("Rahmat, hammasi tushunarli"),
+        lambda: message_dict("Yangi kanal: https://t.me/spam_channel obuna bo'ling"),
+        lambda: message_dict("@someone qarab ko'r"),
+        lambda: message_dict(None, new_chat_members=[user_dict(3003, "newbie")]),
+        lambda: message_dict("salom", chat_id=1001, chat_type="private"),
+        lambda: message_dict("Ok"),
+    ]
+    result = []
+    for i in range(BATCH):
+        message = templates[i % len(templates)]()
+        message["from"]["id"] = 10000 + offset + i
+        result.append({"update_id": offset + i + 1, "message": message})
+    return json.dumps({"ok": True, "result": result}, ensure_ascii=False)
+
+
+def warning() -> SendMessage:
+    return SendMessage(chat_id=-1001234567890, text="⚠️ Reklama taqiqlangan!", reply_markup=InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="Qoidalar", url="https://t.me/rules"),
+                          InlineKeyboardButton(text="Apellyatsiya", callback_data="appeal:1001")]]))
+
+
+def best_of(func, rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def profile(name: str, session: AiohttpSession, batches: int):
+    bot = Bot(token=BENCH_TOKEN, session=session)
+    dp = build_routed(bot)
+    bodies = [updates_body(i * BATCH) for i in range(batches)]
+    method = GetUpdates()
+
+    def decode():
+        for body in bodies:
+            session.check_response(bot, method, 200, body)
+
+    dispatch_best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for body in bodies:
+            for update in session.check_response(bot, method, 200, body).result:
+                await dp.feed_update(bot, update)
+        dispatch_best = min(dispatch_best, time.perf_counter() - start)
+
+    message = warning()
+    encode = best_of(lambda: [session.build_form_data(bot, message) for _ in range(2000)])
+
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    for _ in range(20000):
+        future = loop.create_future()
+        loop.call_soon(future.set_result, None)
+        await future
+    loop_us = (time.perf_counter() - start) / 20000 * 1e6
+
+    updates = batches * BATCH
+    report("runtime", {
+        "profile": name,
+        "loop": type(loop).__module__.split(".")[0],
+        "json": "orjson" if session.json_loads is not json.loads else "stdlib",
+        "decode_us_per_update": round(best_of(decode) / updates * 1e6, 2),
+        "dispatch_us_per_update": round(dispatch_best / updates * 1e6, 2),
+        "encode_us_per_request": round(encode / 2000 * 1e6, 2),
+        "loop_roundtrip_us": round(loop_us, 2),
+    })
+    await session.close()
+
+
+def run(batches: int):
+    _silence_handlers()
+    asyncio.run(profile("default", AiohttpSession(), batches))
+    runtime.install_event_loop()
+    asyncio.run(profile("tuned", runtime.create_session(), batches))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batches", type=int, default=40)
+    args = parser.parse_args()
+    run(args.batches)
@@ -0,0 +1,88 @@
+"""Spam model training and micro-batched scoring throughput
+
+Trains a model on labelled corpora (chatter as ham; link spam, obfuscated
+links and text-only ads as spam), reports the share of each corpus scored
+above the threshold, then measures messages per second through
+SpamModel.score_batch at several batch sizes and through SpamScorer with
+concurrent callers, as the dispatcher would drive it. Needs NumPy.
+
+Run: python benchmarks/bench_spamscore.py [--size N] [--threshold 0.9]
+"""
+import argparse
+import asyncio
+import time
+
+from common import report
+from corpus import build_corpora
+
+from normalizer import normalize_for_scan
+from spamscore import SpamScorer, message_features, train
+
+HAM = ("clean", "cyrillic", "mention_heavy", "long")
+SPAM = ("link_spam", "obfuscated", "text_ads")
+
+
+def labelled(corpora):
+    return [(normalize_for_scan(text), name in SPAM) for name in HAM + SPAM for text in corpora[name]]
+
+
+async def scorer_throughput(model, texts, concurrency: int) -> float:
+    scorer = SpamScorer(batch_size=64, max_delay=0.002)
+    scorer.model = model
+    queue = list(texts)
+
+    async def worker():
+        while queue:
+            await scorer.score(queue.pop())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return len(texts) / (time.perf_counter() - start)
+
+
+def run(size: int, threshold: float):
+    samples = labelled(build_corpora(size, seed=7))
+    start = time.perf_counter()
+    model = train(samples)
+    report("spamscore_train", {"samples": len(samples), "train_ms": round((time.perf_counter() - start) * 1e3, 1)})
+
+    evaluation = build_corpora(size, seed=11)
+    for name in HAM + SPAM:
+        texts = [normalize_for_scan(text) for text in evaluation[name]]
+        scores = model.score_batch([message_features(text, model.bits) for text in texts])
+        report("spamscore_flagged", {
+            "corpus": name,
+            "label": "spam" if name in SPAM else "ham",
+            "flagged_ratio": round(float((scores >= threshold).mean()), 3),
+        })
+
+    texts = [normalize_for_scan(text) for text in evaluation["mixed"] + evaluation["text_ads"]]
+    features = [message_features(text, model.bits) for text in texts]
+    start = time.perf_counter()
+    for text in texts:
+        message_features(text, model.bits)
+    features_us = (time.perf_counter() - start) / len(texts) * 1e6
+    for batch_size in (1, 16, 64, 256):
+        start = time.perf_counter()
+        for offset in range(0, len(features), batch_size):
+            model.score_batch(features[offset:offset + batch_size])
+        elapsed = time.perf_counter() - start
+        report("spamscore_batch", {
+            "batch_size": batch_size,
+            "features_us_per_msg": round(features_us, 2),
+            "score_us_per_msg": round(elapsed / len(features) * 1e6, 2),
+            "msgs_per_sec": int(len(features) / (elapsed + features_us * len(features) / 1e6)),
+        })
+    for concurrency in (1, 64, 256):
+        report("spamscore_scorer", {
+            "concurrency": concurrency,
+            "msgs_per_sec": int(asyncio.run(scorer_throughput(model, texts, concurrency))),
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000, help="messages per corpus")
+    parser.add_argument("--threshold", type=float, default=0.9)
+    args = parser.parse_args()
+    run(args.size, args.threshold)
@@ -0,0 +1,132 @@
+"""Shared helpers for the offline benchmarks: synthetic updates and a fake Bot API session"""
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# Benchmarks run from a checkout without a .env; the bot modules only need a
+# syntactically valid token to import
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+# Keep benchmark runs from writing bot.log or drowning results in INFO lines
+os.environ.setdefault("LOG_FILE", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# The bot modules default to files in the working directory; dispatched
+# messages bump spam counters and replay runs the backup job, so both go to a
+# scratch directory instead of whatever database sits where the bench is run
+_SCRATCH = tempfile.mkdtemp(prefix="bench-")
+atexit.register(shutil.rmtree, _SCRATCH, ignore_errors=True)
+os.environ.setdefault("DB_PATH", os.path.join(_SCRATCH, "bot_database.db"))
+os.environ.setdefault("BACKUP_DIR", os.path.join(_SCRATCH, "backups"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Update
+
+BENCH_TOKEN = os.environ["BOT_TOKEN"]
+GROUP_CHAT_ID = -1001234567890
+
+_update_id = 0
+_message_id = 0
+
+
+def user_dict(user_id: int = 1001, username: Optional[str] = "bench_user") -> Dict[str, Any]:
+    """Telegram User payload"""
+    user = {"id": user_id, "is_bot": False, "first_name": "Bench", "language_code": "uz"}
+    if username:
+        user["username"] = username
+    return user
+
+
+def chat_dict(chat_id: int = GROUP_CHAT_ID, chat_type: str = "supergroup") -> Dict[str, Any]:
+    """Telegram Chat payload"""
+    if chat_type == "private":
+        return {"id": chat_id, "type": "private", "first_name": "Bench"}
+    return {"id": chat_id, "type": chat_type, "title": "Bench group"}
+
+
+def message_dict(text: Optional[str] = None, chat_id: int = GROUP_CHAT_ID,
+                 chat_type: str = "supergroup", user_id: int = 1001,
+                 username: Optional[str] = "bench_user", **extra: Any) -> Dict[str, Any]:
+    """Telegram Message payload"""
+    global _message_id
+    _message_id += 1
+    message = {
+        "message_id": _message_id,
+        "date": int(time.time()),
+        "chat": chat_dict(chat_id, chat_type),
+        "from": user_dict(user_id, username),
+    }
+    if text is not None:
+        message["text"] = text
+    message.update(extra)
+    return message
+
+
+def make_update(bot: Bot, message: Optional[Dict[str, Any]] = None, **payload: Any) -> Update:
+    """Build an Update already mounted on ``bot`` so feed_update skips the JSON round-trip"""
+    global _update_id
+    _update_id += 1
+    data = {"update_id": _update_id}
+    if message is not None:
+        data["message"] = message
+    data.update(payload)
+    return Update.model_validate(data, context={"bot": bot})
+
+
+class FakeSession(BaseSession):
+    """Bot API session that answers every method locally and counts the calls"""
+
+    file_content = b"benchmark file\n"
+
+    def __init__(self, latency: float = 0.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.calls: Counter = Counter()
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None):
+        name = type(method).__name__
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        content = json.dumps({"ok": True, "result": self._result_for(name, method)})
+        return self.check_response(bot=bot, method=method, status_code=200, content=content).result
+
+    def _result_for(self, name: str, method) -> Any:
+        if name in ("SendMessage", "SendPhoto", "SendDocument"):
+            chat_id = getattr(method, "chat_id", GROUP_CHAT_ID)
+            return message_dict("ok", chat_id=chat_id, user_id=42, username="bench_bot")
+        if name == "GetChatMember":
+            return {"status": "member", "user": user_dict(2002, "member")}
+        if name == "GetChatAdministrators":
+            return []
+        if name == "GetMe":
+            return {"id": 42, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        """Every file download returns ``file_content``; counted as StreamContent"""
+        self.calls["StreamContent"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for start in range(0, len(self.file_content), chunk_size):
+            yield self.file_content[start:start + chunk_size]
+
+    async def close(self) -> None:
+        pass
+
+
+def make_bot(latency: float = 0.0) -> Bot:
+    """Bot wired to a FakeSession"""
+    return Bot(token=BENCH_TOKEN, session=FakeSession(latency=latency))
+
+
+def report(name: str, results: Dict[str, Any]) -> None:
+    """Print results as one JSON line so runs can be diffed and tracked"""
+    print(json.dumps({"benchmark": name, **results}, ensure_ascii=False))
@@ -0,0 +1,84 @@
+"""Synthetic message corpora modelled on real group traffic"""
+import random
+from typing import Dict, List
+
+CLEAN = [
+    "Assalomu alaykum, bugun uchrashuv soat nechida?",
+    "Rahmat, hammasi tushunarli",
+    "Ertaga darsga kim boradi?",
+    "Ok",
+    "Zo'r bo'libdi 👍",
+    "Uyga vazifa nima edi?",
+    "Menimcha bu to'g'ri emas",
+    "Kechirasiz, kech qoldim",
+]
+
+CYRILLIC = [
+    "Ассалому алайкум, бугун учрашув соат нечида?",
+    "Раҳмат, ҳаммаси тушунарли",
+    "Эртага дарсга ким боради?",
+    "Привет всем, кто сегодня идёт на встречу?",
+    "Ўзбекистон бўйлаб об-ҳаво маълумоти",
+]
+
+LINK_SPAM = [
+    "Yangi kanal: https://t.me/spam_channel obuna bo'ling",
+    "Pul ishlash sirlari www.easy-money.uz da",
+    "Bonus oling: bit.ly/3xYzAbC",
+    "Kanalimizga qo'shiling t.me/+AbCdEfGh123",
+    "Chegirma! shop.example.com/sale faqat bugun",
+]
+
+MENTION_HEAVY = [
+    "@ali_valiyev @sardor_01 @dilnoza_m qarab ko'ringlar",
+    "Admin @group_admin ga yozing",
+    "@crypto_signals_uz kanalida signal bor",
+    "@a @b @c @d @e @f salom",
+]
+
+# Link spam dressed up to slip past ASCII-only patterns
+OBFUSCATED = [
+    "Yangi kanal: t . me/spam_channel obuna bo'ling",
+    "Pul ishlash sirlari t[.]me/easy_money da",
+    "Bonus oling: bit(dot)ly/3xYzAbC",
+    "Kanalimizga qo'shiling t\u200b.\u200bme/+AbCdEfGh123",
+    "Chegirma! ｓｈｏｐ．ｅｘａｍｐｌｅ．ｃｏｍ faqat bugun",
+    "Kazino: саsinо.com 🎰",
+    "Obuna bo'ling t。me/kanal",
+]
+
+# Ads with no link at all: contact "in private", phone numbers, prices
+TEXT_ADS = [
+    "Ishonchli daromad! Kuniga 500$ gacha, batafsil lichkaga yozing",
+    "Kredit kerakmi? Tez va oson, +998 90 123 45 67 ga qo'ng'iroq qiling",
+    "Заработок без вложений от 300$ в неделю, пишите в личку",
+    "Chegirma 70%! Faqat bugun, buyurtma uchun lichkaga yozing",
+    "Kripto signal guruhi, kuniga 20% foyda, qiziqqanlar + qo'ysin",
+    "Работа на дому, оплата ежедневно, подробности в лс",
+]
+
+def long_message(rng: random.Random, words: int = 600) -> str:
+    vocabulary = " ".join(CLEAN + CYRILLIC).split()
+    return " ".join(rng.choice(vocabulary) for _ in range(words))[:4096]
+
+def build_corpora(size: int = 1000, seed: int = 7) -> Dict[str, List[str]]:
+    """Named corpora of ``size`` texts each, reproducible for a given seed"""
+    rng = random.Random(seed)
+    corpora = {
+        'clean': [rng.choice(CLEAN) for _ in range(size)],
+        'cyrillic': [rng.choice(CYRILLIC) for _ in range(size)],
+        'link_spam': [rng.choice(LINK_SPAM) for _ in range(size)],
+        'mention_heavy': [rng.choice(MENTION_HEAVY) for _ in range(size)],
+        'obfuscated': [rng.choice(OBFUSCATED) for _ in range(size)],
+        'text_ads': [rng.choice(TEXT_ADS) for _ in range(size)],
+        'long': [long_message(rng) for _ in range(max(1, size // 10))],
+    }
+    # Production-like mix: mostly chatter, a little spam
+    corpora['mixed'] = (
+        corpora['clean'][: size * 6 // 10]
+        + corpora['cyrillic'][: size * 2 // 10]
+        + corpora['link_spam'][: size // 10]
+        + corpora['mention_heavy'][: size // 10]
+    )
+    rng.shuffle(corpora['mixed'])
+    return corpora
@@ -0,0 +1,147 @@
+"""Local fake Bot API HTTP server for end-to-end load tests
+
+Serves ``/bot<token>/<method>`` like api.telegram.org: ``getUpdates`` hands
+out queued updates (long-polling), every other method is answered with a
+plausible canned result. Calls are recorded per method, latency can be
+injected, and Telegram's flood limits are simulated with 429 responses
+carrying ``retry_after``.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+from common import message_dict, user_dict
+
+
+class FakeBotAPI:
+    """In-process aiohttp server imitating the Bot API"""
+
+    def __init__(self, latency: float = 0.0, global_limit: int = 30, chat_limit: int = 20,
+                 error_rate: float = 0.0, retry_after: int = 1, seed: int = 7):
+        self.latency = latency
+        # Telegram allows ~30 calls/s overall and ~20 messages/min per group
+        self.global_limit = global_limit
+        self.chat_limit = chat_limit
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+
+        self.calls: Counter = Counter()
+        self.throttled: Counter = Counter()
+        self.latencies: List[float] = []
+        self.pending: Deque[Dict[str, Any]] = deque()
+        self.delivered = 0
+        self._new_updates = asyncio.Event()
+        self._global_window: Deque[float] = deque()
+        self._chat_windows: Dict[str, Deque[float]] = defaultdict(deque)
+        self._runner: Optional[web.AppRunner] = None
+
+    # Updates ---------------------------------------------------------------
+
+    def push_update(self, update: Dict[str, Any]) -> None:
+        self.pending.append(update)
+        self._new_updates.set()
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        while self.pending and self.pending[0]["update_id"] < offset:
+            self.pending.popleft()
+        if not self.pending and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        batch = [self.pending[i] for i in range(min(limit, len(self.pending)))]
+        return batch
+
+    # Flood limits ------------------------------------------------------------
+
+    def _over_limit(self, window: Deque[float], limit: int, period: float, now: float) -> bool:
+        while window and now - window[0] >= period:
+            window.popleft()
+        if len(window) >= limit:
+            return True
+        window.append(now)
+        return False
+
+    def _throttle(self, method: str, params: Dict[str, Any]) -> bool:
+        if method in ("getUpdates", "getMe", "deleteWebhook"):
+            return False
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return True
+        now = time.monotonic()
+        chat_id = params.get("chat_id")
+        if chat_id and str(chat_id).startswith("-") and method.startswith("send"):
+            if self._over_limit(self._chat_windows[str(chat_id)], self.chat_limit, 60.0, now):
+                return True
+        return self._over_limit(self._global_window, self.global_limit, 1.0, now)
+
+    # Canned results ----------------------------------------------------------
+
+    def _result_for(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getMe":
+            return {"id": 42, "is_bot": True, "first_name": "Replay", "username": "replay_bot"}
+        if method in ("sendMessage", "sendPhoto", "sendDocument"):
+            chat_id = int(params.get("chat_id", 0))
+            chat_type = "supergroup" if chat_id < 0 else "private"
+            return message_dict("ok", chat_id=chat_id, chat_type=chat_type, user_id=42, username="replay_bot")
+        if method == "getChatMember":
+            return {"status": "member", "user": user_dict(2002, "member")}
+        if method == "getChatAdministrators":
+            return []
+        return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post()) if request.can_read_body else {}
+        params.update(request.query)
+        self.calls[method] += 1
+
+        if method == "getUpdates":
+            result = await self._get_updates(params)
+            self.delivered += len(result)
+            return web.json_response({"ok": True, "result": result})
+
+        start = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._throttle(method, params):
+            self.throttled[method] += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+        self.latencies.append(time.perf_counter() - start)
+        return web.json_response({"ok": True, "result": self._result_for(method, params)})
+
+    # Lifecycle -----------------------------------------------------------------
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8089) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": dict(self.calls),
+            "throttled": dict(self.throttled),
+            "updates_delivered": self.delivered,
+        }
@@ -0,0 +1,147 @@
+"""Replay recorded updates through main.main against the fake Bot API server
+
+Recordings are the gzip JSONL files written by recorder.UpdateRecorder
+(RECORD_UPDATES=updates.jsonl.gz). The bot runs unmodified: main.main polls
+the local fake server (BOT_API_URL), which hands out the recorded updates at
+the chosen speed and records every outgoing call.
+
+Run:
+    python benchmarks/replay.py updates.jsonl.gz --speed max
+    python benchmarks/replay.py updates.jsonl.gz --speed 1 --latency 0.05 --error-rate 0.01
+    python benchmarks/replay.py synthetic.jsonl.gz --synthesize 5000
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import signal
+import sys
+import time
+
+from common import chat_dict, message_dict, report, user_dict
+from corpus import build_corpora
+from fakeapi import FakeBotAPI
+
+
+def load_recording(path):
+    """Yield (timestamp, update) pairs from a gzip JSONL recording"""
+    with gzip.open(path, "rt", encoding="utf-8") as recording:
+        for line in recording:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                yield entry["ts"], entry["update"]
+
+
+def synthesize(path, count: int, rate: float = 50.0, seed: int = 7):
+    """Write a synthetic recording spread over several groups at ``rate`` updates/sec"""
+    rng = random.Random(seed)
+    texts = build_corpora(count, seed)["mixed"]
+    chats = [-1001000000000 - i for i in range(20)]
+    start = time.time()
+    with gzip.open(path, "wt", encoding="utf-8") as output:
+        for i in range(count):
+            chat_id = rng.choice(chats)
+            user_id = rng.randint(1000, 5000)
+            if i % 25 == 0:
+                message = message_dict(None, chat_id=chat_id, user_id=user_id,
+                                       new_chat_members=[user_dict(user_id, f"user{user_id}")])
+            else:
+                message = message_dict(texts[i % len(texts)], chat_id=chat_id, user_id=user_id,
+                                       username=f"user{user_id}")
+            update = {"update_id": i + 1, "message": message}
+            output.write(json.dumps({"ts": start + i / rate, "update": update}, ensure_ascii=False) + "\n")
+
+
+async def feed(api: FakeBotAPI, entries, speed: float):
+    """Queue updates on the fake server, paced by the recorded timestamps"""
+    first_ts = None
+    started = time.monotonic()
+    for update_id, (ts, update) in enumerate(entries, 1):
+        update["update_id"] = update_id
+        if speed > 0:
+            first_ts = first_ts if first_ts is not None else ts
+            delay = (ts - first_ts) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        api.push_update(update)
+    return update_id if entries else 0
+
+
+async def wait_until_idle(api: FakeBotAPI, idle: float):
+    """Wait until every update was delivered and no API call happened for ``idle`` seconds"""
+    last_total, last_change = -1, time.monotonic()
+    while True:
+        await asyncio.sleep(0.1)
+        total = sum(api.calls.values())
+        if total != last_total:
+            last_total, last_change = total, time.monotonic()
+        elif not api.pending and time.monotonic() - last_change >= idle:
+            return
+
+
+async def wait_for_handlers():
+    """Wait for update handlers still in flight, such as ones sleeping before deleting a warning
+
+    Polling stops on SIGINT without waiting for them and main.main then closes
+    the session, so a handler still running would call the API after the
+    fake server is gone.
+    """
+    current = asyncio.current_task()
+    while True:
+        handlers = [task for task in asyncio.all_tasks() if task is not current
+                    and getattr(task.get_coro(), "__qualname__", "") == "Dispatcher._process_update"]
+        if not handlers:
+            return
+        await asyncio.wait(handlers)
+
+
+async def run(args):
+    api = FakeBotAPI(latency=args.latency, error_rate=args.error_rate, retry_after=args.retry_after)
+    base_url = await api.start(port=args.port)
+    os.environ["BOT_API_URL"] = base_url
+    import main
+
+    entries = list(load_recording(args.recording))
+    bot_task = asyncio.create_task(main.main())
+    started = time.perf_counter()
+    fed = await feed(api, entries, 0 if args.speed == "max" else float(args.speed))
+    await wait_until_idle(api, args.idle)
+    elapsed = time.perf_counter() - started - args.idle
+    await wait_for_handlers()
+
+    # Same path as Ctrl+C: aiogram's signal handler stops polling gracefully,
+    # whereas cancelling the task would leave its polling loop running
+    signal.raise_signal(signal.SIGINT)
+    await bot_task
+    await api.stop()
+
+    latencies = sorted(api.latencies)
+    report("replay", {
+        "recording": os.path.basename(args.recording),
+        "speed": args.speed,
+        "updates": fed,
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(fed / elapsed, 1) if elapsed > 0 else None,
+        "api_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        **api.summary(),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="gzip JSONL recording")
+    parser.add_argument("--speed", default="max", help="'max' or a multiple of real time (1 = as recorded)")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated API latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--idle", type=float, default=2.0, help="quiet period that ends the replay")
+    parser.add_argument("--synthesize", type=int, metavar="N", help="write N synthetic updates to RECORDING and exit")
+    args = parser.parse_args()
+    if args.synthesize:
+        synthesize(args.recording, args.synthesize)
+        sys.exit(0)
+    asyncio.run(run(args))
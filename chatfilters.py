@@ -0,0 +1,58 @@
+import logging
+from aiogram import Bot
+from aiogram.enums import ChatType
+from aiogram.filters import Filter
+from aiogram.types import Message, TelegramObject
+from magic_filter import MagicFilter
+
+logger = logging.getLogger(__name__)
+
+GROUP_CHAT_TYPES = frozenset({ChatType.GROUP, ChatType.SUPERGROUP})
+
+class InlineMagic(Filter):
+    """Evaluate a magic filter directly on the event loop
+    
+    aiogram hands every non-coroutine filter (lambdas and bare ``F`` expressions
+    alike) to the default thread pool, which costs a thread hop per check.
+    Wrapping the expression in an async filter keeps the check inline.
+    """
+    
+    __slots__ = ("magic",)
+    
+    def __init__(self, magic: MagicFilter):
+        self.magic = magic
+    
+    async def __call__(self, event: TelegramObject) -> bool:
+        return bool(self.magic.resolve(event))
+    
+    def __str__(self) -> str:
+        return f"InlineMagic({self.magic!r})"
+
+def inline(magic: MagicFilter) -> InlineMagic:
+    """Shortcut for ``InlineMagic(magic)``"""
+    return InlineMagic(magic)
+
+async def is_chat_admin(bot: Bot, message: Message) -> bool:
+    """True for group admins, including anonymous admins posting as the chat"""
+    if message.sender_chat and message.sender_chat.id == message.chat.id:
+        return True
+    if not message.from_user:
+        return False
+    try:
+        member = await bot.get_chat_member(message.chat.id, message.from_user.id)
+        return member.status in ('creator', 'administrator')
+    except Exception as e:
+        logger.error("Error checking admin status in chat %s: %s", message.chat.id, e)
+        return False
+
+class ChatAdmin(Filter):
+    """Pass group admins only
+    
+    Meant as a router-level filter placed after the command filter, so the
+    ``getChatMember`` lookup only runs for the router's own commands and
+    anything else, including a non-admin's command, falls through to the
+    routers after it.
+    """
+    
+    async def __call__(self, message: Message, bot: Bot) -> bool:
+        return await is_chat_admin(bot, message)
@@ -0,0 +1,118 @@
+import logging
+from typing import Dict, Optional
+from aiogram import Router, Bot
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from chatfilters import ChatAdmin
+from database import db
+from metrics import CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Feature flags, one bit each
+LINK_FILTER = 1
+MENTION_CHECK = 2
+JOIN_CLEANUP = 4
+DEFAULT_FLAGS = LINK_FILTER | MENTION_CHECK | JOIN_CLEANUP
+
+# Command argument -> (flag, label shown to admins)
+FEATURES = {
+    "links": (LINK_FILTER, "Link aniqlash"),
+    "mentions": (MENTION_CHECK, "Mention nazorati"),
+    "joins": (JOIN_CLEANUP, "Join/Leave o'chirish"),
+}
+
+class ChatSettings:
+    """Per-chat feature flags held as one int per chat
+    
+    Only chats that changed something have a row (and a dict entry); every
+    other chat uses ``DEFAULT_FLAGS``. The table is read once at startup and
+    writes go through ``set``, which updates the cache after the DB, so
+    ``enabled`` is a dict lookup and never touches the database.
+    """
+    
+    def __init__(self):
+        self.flags: Dict[int, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self.flags)
+    
+    async def load(self):
+        self.flags = await db.get_all_chat_settings()
+        logger.info("Loaded settings for %d chats", len(self.flags))
+    
+    def get(self, chat_id: int) -> int:
+        return self.flags.get(chat_id, DEFAULT_FLAGS)
+    
+    def enabled(self, chat_id: int, flag: int) -> bool:
+        return bool(self.flags.get(chat_id, DEFAULT_FLAGS) & flag)
+    
+    async def set(self, chat_id: int, flag: int, enabled: bool, updated_by: Optional[int] = None) -> int:
+        flags = self.get(chat_id)
+        flags = flags | flag if enabled else flags & ~flag
+        await db.set_chat_settings(chat_id, flags, updated_by)
+        if flags == DEFAULT_FLAGS:
+            self.flags.pop(chat_id, None)
+        else:
+            self.flags[chat_id] = flags
+        return flags
+    
+    def disabled_counts(self) -> Dict[str, int]:
+        """Number of chats with each feature switched off"""
+        return {name: sum(1 for flags in self.flags.values() if not flags & flag)
+                for name, (flag, _) in FEATURES.items()}
+
+# Global settings instance
+chat_settings = ChatSettings()
+CACHE_SIZE.set_function(lambda: len(chat_settings), "chat_settings")
+
+def format_settings(flags: int) -> str:
+    lines = []
+    for name, (flag, label) in FEATURES.items():
+        status = "Yoqilgan ✅" if flags & flag else "O'chirilgan ❌"
+        lines.append(f"• {label}: {status} (`{name}`)")
+    return "\n".join(lines)
+
+async def settings_command(message: Message, command: CommandObject, bot: Bot):
+    """Handle /settings, /enable and /disable from group admins"""
+    try:
+        chat_id = message.chat.id
+        if command.command == "settings":
+            await message.reply(
+                "🔧 **Guruh sozlamalari**\n\n" + format_settings(chat_settings.get(chat_id)) +
+                "\n\nO'zgartirish: /enable yoki /disable + nomi, masalan `/disable joins`",
+                parse_mode="Markdown")
+            return
+        
+        name = (command.args or "").strip().lower()
+        if name not in FEATURES:
+            await message.reply(f"ℹ️ Foydalanish: /{command.command} " + " | ".join(FEATURES))
+            return
+        
+        flag, label = FEATURES[name]
+        enabled = command.command == "enable"
+        await chat_settings.set(chat_id, flag, enabled, message.from_user.id if message.from_user else None)
+        status = "yoqildi" if enabled else "o'chirildi"
+        await message.reply(f"✅ {label}: {status}.")
+        logger.info("Feature %s %s in chat %s", name, "enabled" if enabled else "disabled", chat_id)
+    
+    except Exception as e:
+        logger.error("Error in settings command: %s", e)
+        await message.reply("Xatolik yuz berdi. Iltimos qayta urinib ko'ring.")
+
+def setup_chat_settings(parent: Router, bot: Bot):
+    """Setup group settings commands on the group router
+    
+    Commands from non-admins are not handled here and go on to the routers
+    after it like any other message.
+    """
+    
+    router = Router(name="chatsettings")
+    router.message.filter(Command("settings", "enable", "disable"), ChatAdmin())
+    
+    @router.message()
+    async def settings_handler(message: Message, command: CommandObject):
+        await settings_command(message, command, bot)
+    
+    parent.include_router(router)
+    logger.info("Chat settings setup completed")
@@ -1,7 +1,8 @@
 import logging
-from aiogram import Dispatcher
+from aiogram import Dispatcher, F
 from aiogram.filters import Command
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
+from chatfilters import inline
 
 logger = logging.getLogger(__name__)
 
@@ -93,7 +94,7 @@ def setup_commands(dp: Dispatcher):
         await help_command(message)
         
     # Handle help callback
-    @dp.callback_query(lambda c: c.data == "help")
+    @dp.callback_query(inline(F.data == "help"))
     async def help_callback_handler(callback_query):
         await help_command(callback_query.message)
         await callback_query.answer()
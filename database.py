@@ -1,83 +1,142 @@
 import aiosqlite
+import asyncio
+import functools
 import logging
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+from metrics import DB_SECONDS
+from migrations import migrate
 
 logger = logging.getLogger(__name__)
 
+def timed(operation: str):
+    """Record how long a database operation takes in the metrics registry"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                DB_SECONDS.observe(time.perf_counter() - start, operation)
+        return wrapper
+    return decorator
+
+def _dict_row(cursor, row) -> Dict[str, Any]:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+class ReadPool:
+    """Read-only connections for admin and report queries
+    
+    Up to ``size`` connections are opened lazily with ``mode=ro`` and kept
+    open, so heavy scans (analytics, user lists, exports) never share a
+    connection with the per-message writes and at most ``size`` of them run
+    at once. With the database in WAL mode a reader works on a snapshot and
+    never blocks a writer's commit.
+    """
+    
+    def __init__(self, db_path: str, size: int = 2):
+        self.db_path = db_path
+        self.size = size
+        self.idle: List[aiosqlite.Connection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+    
+    @property
+    def uri(self) -> str:
+        return Path(self.db_path).absolute().as_uri() + "?mode=ro"
+    
+    async def _open(self) -> aiosqlite.Connection:
+        connection = await aiosqlite.connect(self.uri, uri=True)
+        # Rows become dicts in the connection's thread, not on the event loop
+        connection.row_factory = _dict_row
+        return connection
+    
+    def _slot(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        return self._slots
+    
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a read-only connection, waiting while all of them are busy"""
+        async with self._slot():
+            connection = self.idle.pop() if self.idle else await self._open()
+            try:
+                yield connection
+            finally:
+                self.idle.append(connection)
+    
+    def _run_sync(self, func: Callable, *args):
+        connection = sqlite3.connect(self.uri, uri=True)
+        try:
+            return func(connection, *args)
+        finally:
+            connection.close()
+    
+    async def run_sync(self, func: Callable, *args):
+        """Run blocking ``func(connection, *args)`` in a worker thread
+        
+        For streaming jobs (exports, backups of query results) that iterate a
+        cursor themselves; the sqlite3 connection is read-only too and the
+        job takes one of the pool's slots while it runs.
+        """
+        async with self._slot():
+            return await asyncio.to_thread(self._run_sync, func, *args)
+    
+    async def close(self):
+        while self.idle:
+            await self.idle.pop().close()
+
 class Database:
-    def __init__(self, db_path: str = "bot_database.db"):
+    def __init__(self, db_path: str = "bot_database.db", read_pool_size: int = 2):
         self.db_path = db_path
+        self.reads = ReadPool(db_path, read_pool_size)
+    
+    async def close(self):
+        """Close the pooled read connections"""
+        await self.reads.close()
     
     async def init_db(self):
-        """Initialize database tables"""
+        """Set up the database file and apply pending schema migrations"""
         try:
             async with aiosqlite.connect(self.db_path) as db:
-                # Users table
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id INTEGER PRIMARY KEY,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        is_bot BOOLEAN DEFAULT 0,
-                        language_code TEXT,
-                        is_premium BOOLEAN DEFAULT 0,
-                        first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_active BOOLEAN DEFAULT 1
-                    )
-                """)
-                
-                # Groups table
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS groups (
-                        chat_id INTEGER PRIMARY KEY,
-                        title TEXT,
-                        type TEXT,
-                        username TEXT,
-                        member_count INTEGER DEFAULT 0,
-                        first_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_active BOOLEAN DEFAULT 1
-                    )
-                """)
-                
-                # User-Group relations table
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS user_groups (
-                        user_id INTEGER,
-                        chat_id INTEGER,
-                        joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_admin BOOLEAN DEFAULT 0,
-                        PRIMARY KEY (user_id, chat_id),
-                        FOREIGN KEY (user_id) REFERENCES users (user_id),
-                        FOREIGN KEY (chat_id) REFERENCES groups (chat_id)
-                    )
-                """)
-                
-                # Statistics table
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS statistics (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        date DATE DEFAULT CURRENT_DATE,
-                        total_users INTEGER DEFAULT 0,
-                        total_groups INTEGER DEFAULT 0,
-                        active_users INTEGER DEFAULT 0,
-                        active_groups INTEGER DEFAULT 0,
-                        messages_deleted INTEGER DEFAULT 0,
-                        spam_detected INTEGER DEFAULT 0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
+                # Freed pages are handed back by the retention job's
+                # incremental vacuum. A new file takes the mode right away;
+                # an existing one only switches on a full rebuild, which locks
+                # the database for as long as it takes to copy, so it runs
+                # only when asked for with DB_VACUUM_ON_START=1
+                await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                async with db.execute("PRAGMA auto_vacuum") as cursor:
+                    auto_vacuum = (await cursor.fetchone())[0]
+                if auto_vacuum != 2:
+                    if os.getenv('DB_VACUUM_ON_START') == '1':
+                        logger.warning("Rebuilding the database to switch to incremental auto-vacuum, "
+                                       "it is locked until this finishes")
+                        start = time.perf_counter()
+                        await db.execute("VACUUM")
+                        logger.info("Database switched to incremental auto-vacuum (%.1fs)", time.perf_counter() - start)
+                    else:
+                        logger.warning("Database is not in incremental auto-vacuum mode, so pruned rows do not "
+                                       "shrink the file; restart once with DB_VACUUM_ON_START=1 to rebuild it")
                 
-                await db.commit()
-                logger.info("Database initialized successfully")
+                # Write-ahead logging lets admin reads run alongside the
+                # per-message writes; the mode is stored in the file
+                await db.execute("PRAGMA journal_mode=WAL")
+                
+                version = await migrate(db)
+                logger.info("Database initialized successfully (schema version %d)", version)
                 
         except Exception as e:
-            logger.error(f"Error initializing database: {e}")
+            logger.error("Error initializing database: %s", e)
             raise
     
+    @timed("add_user")
     async def add_user(self, user_id: int, username: str = None, first_name: str = None, 
                       last_name: str = None, is_bot: bool = False, language_code: str = None,
                       is_premium: bool = False):
@@ -91,11 +150,12 @@ class Database:
                 """, (user_id, username, first_name, last_name, is_bot, language_code, is_premium))
                 
                 await db.commit()
-                logger.info(f"User {user_id} ({username}) added/updated in database")
+                logger.debug("User %s (%s) added/updated in database", user_id, username)
                 
         except Exception as e:
-            logger.error(f"Error adding user {user_id}: {e}")
+            logger.error("Error adding user %s: %s", user_id, e)
     
+    @timed("add_group")
     async def add_group(self, chat_id: int, title: str = None, chat_type: str = None, 
                        username: str = None, member_count: int = 0):
         """Add or update group in database"""
@@ -108,11 +168,12 @@ class Database:
                 """, (chat_id, title, chat_type, username, member_count))
                 
                 await db.commit()
-                logger.info(f"Group {chat_id} ({title}) added/updated in database")
+                logger.debug("Group %s (%s) added/updated in database", chat_id, title)
                 
         except Exception as e:
-            logger.error(f"Error adding group {chat_id}: {e}")
+            logger.error("Error adding group %s: %s", chat_id, e)
     
+    @timed("update_user_activity")
     async def update_user_activity(self, user_id: int):
         """Update user's last seen timestamp"""
         try:
@@ -123,8 +184,9 @@ class Database:
                 await db.commit()
                 
         except Exception as e:
-            logger.error(f"Error updating user activity {user_id}: {e}")
+            logger.error("Error updating user activity %s: %s", user_id, e)
     
+    @timed("update_group_activity")
     async def update_group_activity(self, chat_id: int):
         """Update group's last active timestamp"""
         try:
@@ -135,31 +197,29 @@ class Database:
                 await db.commit()
                 
         except Exception as e:
-            logger.error(f"Error updating group activity {chat_id}: {e}")
+            logger.error("Error updating group activity %s: %s", chat_id, e)
     
+    @timed("get_all_users")
     async def get_all_users(self) -> List[Dict[str, Any]]:
         """Get all users for broadcasting"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
+            async with self.reads.connection() as db:
                 async with db.execute("""
                     SELECT user_id, username, first_name, last_name 
                     FROM users 
                     WHERE is_active = 1 AND is_bot = 0
                 """) as cursor:
-                    rows = await cursor.fetchall()
-                    return [dict(row) for row in rows]
+                    return await cursor.fetchall()
                     
         except Exception as e:
-            logger.error(f"Error getting users: {e}")
+            logger.error("Error getting users: %s", e)
             return []
     
+    @timed("get_analytics")
     async def get_analytics(self) -> Dict[str, Any]:
         """Get bot analytics"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                
+            async with self.reads.connection() as db:
                 # Total users
                 async with db.execute("SELECT COUNT(*) as count FROM users WHERE is_bot = 0") as cursor:
                     total_users = (await cursor.fetchone())['count']
@@ -189,7 +249,7 @@ class Database:
                     ORDER BY member_count DESC 
                     LIMIT 5
                 """) as cursor:
-                    top_groups = [dict(row) for row in await cursor.fetchall()]
+                    top_groups = await cursor.fetchall()
                 
                 return {
                     'total_users': total_users,
@@ -200,46 +260,200 @@ class Database:
                 }
                 
         except Exception as e:
-            logger.error(f"Error getting analytics: {e}")
+            logger.error("Error getting analytics: %s", e)
             return {}
     
+    @timed("increment_spam_counter")
     async def increment_spam_counter(self):
         """Increment spam detection counter"""
         try:
             async with aiosqlite.connect(self.db_path) as db:
-                today = datetime.now().date()
                 await db.execute("""
-                    INSERT OR IGNORE INTO statistics (date) VALUES (?)
-                """, (today,))
-                
-                await db.execute("""
-                    UPDATE statistics SET spam_detected = spam_detected + 1 
-                    WHERE date = ?
-                """, (today,))
+                    INSERT INTO statistics (date, spam_detected) VALUES (?, 1)
+                    ON CONFLICT (date) DO UPDATE SET spam_detected = spam_detected + 1
+                """, (datetime.now().date().isoformat(),))
                 
                 await db.commit()
                 
         except Exception as e:
-            logger.error(f"Error incrementing spam counter: {e}")
+            logger.error("Error incrementing spam counter: %s", e)
     
+    @timed("increment_deleted_messages_counter")
     async def increment_deleted_messages_counter(self):
         """Increment deleted messages counter"""
         try:
             async with aiosqlite.connect(self.db_path) as db:
-                today = datetime.now().date()
                 await db.execute("""
-                    INSERT OR IGNORE INTO statistics (date) VALUES (?)
-                """, (today,))
+                    INSERT INTO statistics (date, messages_deleted) VALUES (?, 1)
+                    ON CONFLICT (date) DO UPDATE SET messages_deleted = messages_deleted + 1
+                """, (datetime.now().date().isoformat(),))
+                
+                await db.commit()
                 
+        except Exception as e:
+            logger.error("Error incrementing deleted messages counter: %s", e)
+
+    @timed("add_raid_event")
+    async def add_raid_event(self, chat_id: int, join_count: int):
+        """Record a detected join raid"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
                 await db.execute("""
-                    UPDATE statistics SET messages_deleted = messages_deleted + 1 
-                    WHERE date = ?
-                """, (today,))
+                    INSERT INTO raid_events (chat_id, join_count) VALUES (?, ?)
+                """, (chat_id, join_count))
+                await db.commit()
                 
+        except Exception as e:
+            logger.error("Error recording raid event for chat %s: %s", chat_id, e)
+
+    @timed("get_chat_domains")
+    async def get_chat_domains(self, chat_id: int) -> Dict[str, str]:
+        """Get a chat's domain lists as {domain: 'allow' | 'deny'}"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                async with db.execute("""
+                    SELECT domain, list_type FROM chat_domains WHERE chat_id = ?
+                """, (chat_id,)) as cursor:
+                    return {domain: list_type for domain, list_type in await cursor.fetchall()}
+                    
+        except Exception as e:
+            logger.error("Error getting domain lists for chat %s: %s", chat_id, e)
+            return {}
+    
+    @timed("set_chat_domain")
+    async def set_chat_domain(self, chat_id: int, domain: str, list_type: str, added_by: int = None):
+        """Put a domain on a chat's allow or deny list (moving it if already listed)"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.execute("""
+                    INSERT OR REPLACE INTO chat_domains (chat_id, domain, list_type, added_by)
+                    VALUES (?, ?, ?, ?)
+                """, (chat_id, domain, list_type, added_by))
                 await db.commit()
                 
         except Exception as e:
-            logger.error(f"Error incrementing deleted messages counter: {e}")
+            logger.error("Error setting domain %s for chat %s: %s", domain, chat_id, e)
+            raise
+    
+    @timed("remove_chat_domain")
+    async def remove_chat_domain(self, chat_id: int, domain: str) -> bool:
+        """Remove a domain from a chat's lists; returns False if it was not listed"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                cursor = await db.execute("""
+                    DELETE FROM chat_domains WHERE chat_id = ? AND domain = ?
+                """, (chat_id, domain))
+                await db.commit()
+                return cursor.rowcount > 0
+                
+        except Exception as e:
+            logger.error("Error removing domain %s for chat %s: %s", domain, chat_id, e)
+            raise
+
+    @timed("get_all_chat_settings")
+    async def get_all_chat_settings(self) -> Dict[int, int]:
+        """Get feature flags of every chat that changed its settings"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                async with db.execute("SELECT chat_id, flags FROM chat_settings") as cursor:
+                    return {chat_id: flags for chat_id, flags in await cursor.fetchall()}
+                    
+        except Exception as e:
+            logger.error("Error getting chat settings: %s", e)
+            return {}
+    
+    @timed("set_chat_settings")
+    async def set_chat_settings(self, chat_id: int, flags: int, updated_by: int = None):
+        """Store a chat's feature flags"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.execute("""
+                    INSERT OR REPLACE INTO chat_settings (chat_id, flags, updated_by, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, (chat_id, flags, updated_by))
+                await db.commit()
+                
+        except Exception as e:
+            logger.error("Error saving settings for chat %s: %s", chat_id, e)
+            raise
+
+    @timed("get_spam_thresholds")
+    async def get_spam_thresholds(self) -> Dict[int, Optional[float]]:
+        """Get the spam score threshold of every chat that overrides the default"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                async with db.execute("SELECT chat_id, threshold FROM chat_spam_thresholds") as cursor:
+                    return {chat_id: threshold for chat_id, threshold in await cursor.fetchall()}
+                    
+        except Exception as e:
+            logger.error("Error getting spam thresholds: %s", e)
+            return {}
+    
+    @timed("set_spam_threshold")
+    async def set_spam_threshold(self, chat_id: int, threshold: Optional[float], updated_by: int = None):
+        """Store a chat's spam score threshold (None switches scoring off)"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.execute("""
+                    INSERT OR REPLACE INTO chat_spam_thresholds (chat_id, threshold, updated_by, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, (chat_id, threshold, updated_by))
+                await db.commit()
+                
+        except Exception as e:
+            logger.error("Error saving spam threshold for chat %s: %s", chat_id, e)
+            raise
+    
+    @timed("remove_spam_threshold")
+    async def remove_spam_threshold(self, chat_id: int):
+        """Return a chat to the default spam score threshold"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.execute("DELETE FROM chat_spam_thresholds WHERE chat_id = ?", (chat_id,))
+                await db.commit()
+                
+        except Exception as e:
+            logger.error("Error removing spam threshold for chat %s: %s", chat_id, e)
+            raise
+
+    @timed("prune")
+    async def prune(self, table: str, condition: str, params: tuple = (), after: int = 0,
+                    limit: int = 500) -> Tuple[int, Optional[int]]:
+        """Delete up to ``limit`` rows of ``table`` matching ``condition``
+        
+        Rows are visited in rowid order starting after ``after``, so repeated
+        calls walk the table once instead of rescanning it per chunk. Returns
+        the number deleted and the rowid to resume from (None when done).
+        """
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                async with db.execute(f"""
+                    SELECT rowid FROM {table} WHERE rowid > ? AND ({condition}) ORDER BY rowid LIMIT ?
+                """, (after, *params, limit)) as cursor:
+                    rowids = [row[0] for row in await cursor.fetchall()]
+                if rowids:
+                    await db.executemany(f"DELETE FROM {table} WHERE rowid = ?", ((rowid,) for rowid in rowids))
+                    await db.commit()
+                return len(rowids), (rowids[-1] if len(rowids) == limit else None)
+                
+        except Exception as e:
+            logger.error("Error pruning %s: %s", table, e)
+            raise
+    
+    @timed("incremental_vacuum")
+    async def incremental_vacuum(self, pages: int) -> int:
+        """Release up to ``pages`` free pages to the filesystem; returns how many stay free"""
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                # execute() steps a statement once and frees a single page;
+                # executescript() runs the pragma to completion
+                await db.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+                async with db.execute("PRAGMA freelist_count") as cursor:
+                    return (await cursor.fetchone())[0]
+                    
+        except Exception as e:
+            logger.error("Error running incremental vacuum: %s", e)
+            raise
 
 # Global database instance
-db = Database()
\ No newline at end of file
+db = Database(os.getenv('DB_PATH', 'bot_database.db'), read_pool_size=int(os.getenv('DB_READ_POOL_SIZE', '2')))
\ No newline at end of file
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import resource
+import time
+from typing import Any, Dict
+
+from metrics import (API_REQUESTS, CACHE_SIZE, DB_SECONDS, QUEUE_DEPTH, UPDATE_RATE,
+                     UPDATES_TOTAL, cache_hit_ratio)
+from loopmonitor import monitor
+
+START_TIME = time.monotonic()
+
+# Database operations that write; the rest are admin reads
+DB_WRITE_OPERATIONS = (
+    "add_user", "add_group", "update_user_activity", "update_group_activity",
+    "increment_spam_counter", "increment_deleted_messages_counter", "add_raid_event",
+    "set_chat_domain", "remove_chat_domain", "set_chat_settings",
+    "set_spam_threshold", "remove_spam_threshold", "prune", "incremental_vacuum",
+)
+
+def rss_bytes() -> int:
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def format_duration(seconds: float) -> str:
+    days, rest = divmod(int(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if days:
+        return f"{days}d {hours}h {minutes}m"
+    return f"{hours}h {minutes}m {seconds}s"
+
+def collect_runtime_stats() -> Dict[str, Any]:
+    """Snapshot of in-process counters; no I/O besides reading /proc"""
+    api_total = API_REQUESTS.total()
+    api_errors = api_total - sum(value for labels, value in API_REQUESTS.values.items() if labels[1] == "ok")
+    db_writes = sum(DB_SECONDS.count(operation) for operation in DB_WRITE_OPERATIONS)
+    db_write_time = sum(DB_SECONDS.mean(operation) * DB_SECONDS.count(operation) for operation in DB_WRITE_OPERATIONS)
+    
+    return {
+        'uptime': time.monotonic() - START_TIME,
+        'updates_total': UPDATES_TOTAL.total(),
+        'updates_per_sec': UPDATE_RATE.rate(),
+        'tasks': len(asyncio.all_tasks()),
+        'handlers_in_flight': len(monitor.in_flight),
+        'loop_lag_ms': monitor.last_lag * 1000,
+        'membership_cache_size': int(CACHE_SIZE.get("membership")),
+        'membership_hit_ratio': cache_hit_ratio("membership"),
+        'queues': {labels[0]: int(QUEUE_DEPTH.get(*labels)) for labels in QUEUE_DEPTH.functions},
+        'db_writes': db_writes,
+        'db_write_ms': db_write_time / db_writes * 1000 if db_writes else 0.0,
+        'api_calls': int(api_total),
+        'api_error_ratio': api_errors / api_total if api_total else 0.0,
+        'rss_mb': rss_bytes() / (1024 * 1024),
+    }
+
+def format_runtime_report(stats: Dict[str, Any]) -> str:
+    """Markdown block for the admin diagnostics view"""
+    queues = "\n".join(f"• `{name}`: {depth}" for name, depth in stats['queues'].items()) or "• Yo'q"
+    return f"""
+🩺 **Runtime diagnostikasi**
+
+⏳ Ishlash vaqti: {format_duration(stats['uptime'])}
+📨 Updatelar: {stats['updates_total']:.0f} (oxirgi 1 daqiqa: {stats['updates_per_sec']:.2f}/s)
+🧵 Asyncio tasklar: {stats['tasks']} (handlerlar: {stats['handlers_in_flight']})
+⏱ Event loop kechikishi: {stats['loop_lag_ms']:.1f} ms
+
+🗂 **Mention keshi:**
+• Yozuvlar: {stats['membership_cache_size']}
+• Hit rate: {stats['membership_hit_ratio'] * 100:.1f}%
+
+📥 **Navbatlar:**
+{queues}
+
+💾 **Ma'lumotlar bazasi:**
+• Yozuvlar: {stats['db_writes']}
+• O'rtacha yozish vaqti: {stats['db_write_ms']:.2f} ms
+
+🌐 **Bot API:**
+• So'rovlar: {stats['api_calls']}
+• Xatolik darajasi: {stats['api_error_ratio'] * 100:.1f}%
+
+🧠 RSS xotira: {stats['rss_mb']:.1f} MB
+"""
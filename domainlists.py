@@ -0,0 +1,229 @@
+import logging
+import os
+import re
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+from aiogram import Router, Bot
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from chatfilters import ChatAdmin
+from database import db
+from metrics import CACHE_REQUESTS, CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+ALLOW = "allow"
+DENY = "deny"
+
+# Hosts in lowercased text: a whole run of host characters with a host's
+# shape (group 1), ignoring stray dots/hyphens around it. The lookbehind
+# only lets a match start where a run starts and the labels cannot contain
+# dots, so every run is tried once and finding hosts is linear in the text.
+_HOST = re.compile(r'(?<![a-z0-9.-])\.*((?:[a-z0-9-]+\.)+[a-z]{2,24})[.-]*(?![a-z0-9.-])')
+_DOMAIN_ENTRY = re.compile(r'^[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}(?:/[^\s]*)?$')
+_LABEL_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789-')
+
+def normalize_domain(value: str) -> Optional[str]:
+    """Canonical list entry: lowercase host with optional path, no scheme or www."""
+    value = value.strip().lower()
+    for prefix in ('https://', 'http://', 'www.'):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+    value = value.rstrip('/')
+    return value if _DOMAIN_ENTRY.match(value) else None
+
+class DomainMatcher:
+    """Aho-Corasick automaton over a chat's allow/deny entries
+    
+    One pass over the text finds every listed entry regardless of how many
+    are configured. Matches only count on label boundaries, so "example.com"
+    matches "www.example.com" and "example.com/page" but not "myexample.com"
+    or "example.community".
+    """
+    
+    def __init__(self, entries: Dict[str, str]):
+        # state -> {char: next state}, failure link and (entry, list type) outputs
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Tuple[Tuple[str, str], ...]] = [()]
+        
+        for entry, list_type in entries.items():
+            state = 0
+            for char in entry:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            self.output[state] += ((entry, list_type),)
+        
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+    
+    def scan(self, text: str) -> List[Tuple[int, int, str]]:
+        """(start, end, list type) of every entry found on label boundaries in lowercased text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        matches = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                end = index + 1
+                for entry, list_type in output[state]:
+                    start = end - len(entry)
+                    if start > 0 and text[start - 1] in _LABEL_CHARS:
+                        continue
+                    if end < len(text) and text[end] in _LABEL_CHARS:
+                        continue
+                    matches.append((start, end, list_type))
+        return matches
+    
+    def verdict(self, text: str) -> Optional[str]:
+        """DENY if any denied entry occurs, ALLOW if every host in the text is
+        allowlisted, otherwise None (the default link rules apply)"""
+        # Every entry contains a dot, so only dotted words need the
+        # per-character walk
+        hosts = 0
+        covered = True
+        for token in text.lower().split():
+            if '.' not in token:
+                continue
+            matches = self.scan(token)
+            if any(list_type == DENY for _, _, list_type in matches):
+                return DENY
+            if not covered:
+                continue
+            
+            # An allowed entry covers a host when it ends where the host ends
+            # and starts at the host or one of its label boundaries
+            for host in _HOST.finditer(token):
+                hosts += 1
+                host_start, host_end = host.span(1)
+                if not any(end == host_end and (start == host_start or
+                                                (start > host_start and token[start - 1] == '.'))
+                           for start, end, _ in matches):
+                    covered = False
+                    break
+        return ALLOW if covered and hosts else None
+
+class DomainListCache:
+    """Compiled per-chat matchers, loaded lazily from SQLite
+    
+    Chats without lists cache ``None`` so they cost a dict lookup. Entries
+    are LRU-bounded by ``max_chats``. Every change goes through
+    ``invalidate``, which bumps the chat's version so a load that raced
+    with the change is not stored.
+    """
+    
+    def __init__(self, max_chats: int = 5000):
+        self.max_chats = max_chats
+        self.matchers: "OrderedDict[int, Optional[DomainMatcher]]" = OrderedDict()
+        self.versions: Dict[int, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self.matchers)
+    
+    async def get(self, chat_id: int) -> Optional[DomainMatcher]:
+        if chat_id in self.matchers:
+            CACHE_REQUESTS.inc("domain_lists", "hit")
+            self.matchers.move_to_end(chat_id)
+            return self.matchers[chat_id]
+        CACHE_REQUESTS.inc("domain_lists", "miss")
+        
+        version = self.versions.get(chat_id, 0)
+        entries = await db.get_chat_domains(chat_id)
+        matcher = DomainMatcher(entries) if entries else None
+        if self.versions.get(chat_id, 0) == version:
+            self.matchers[chat_id] = matcher
+            while len(self.matchers) > self.max_chats:
+                self.matchers.popitem(last=False)
+        return matcher
+    
+    def invalidate(self, chat_id: int):
+        self.versions[chat_id] = self.versions.get(chat_id, 0) + 1
+        self.matchers.pop(chat_id, None)
+    
+    async def verdict(self, chat_id: int, text: str) -> Optional[str]:
+        matcher = await self.get(chat_id)
+        return matcher.verdict(text) if matcher else None
+
+# Global cache instance
+domain_lists = DomainListCache(max_chats=int(os.getenv('DOMAIN_LIST_MAX_CHATS', '5000')))
+CACHE_SIZE.set_function(lambda: len(domain_lists), "domain_lists")
+
+async def domain_list_command(message: Message, command: CommandObject, bot: Bot):
+    """Handle /allow, /deny, /unlist and /domains from group admins"""
+    try:
+        chat_id = message.chat.id
+        if command.command == "domains":
+            entries = await db.get_chat_domains(chat_id)
+            if not entries:
+                await message.reply("📋 Bu guruhda domen ro'yxatlari bo'sh.")
+                return
+            allowed = sorted(domain for domain, list_type in entries.items() if list_type == ALLOW)
+            denied = sorted(domain for domain, list_type in entries.items() if list_type == DENY)
+            text = "📋 Domen ro'yxatlari:\n\n"
+            text += "✅ Ruxsat etilgan:\n" + ("\n".join(f"• {d}" for d in allowed) or "—") + "\n\n"
+            text += "⛔ Taqiqlangan:\n" + ("\n".join(f"• {d}" for d in denied) or "—")
+            await message.reply(text, disable_web_page_preview=True)
+            return
+        
+        domain = normalize_domain(command.args or "")
+        if not domain:
+            await message.reply(f"ℹ️ Foydalanish: /{command.command} example.com")
+            return
+        
+        if command.command == "unlist":
+            removed = await db.remove_chat_domain(chat_id, domain)
+            domain_lists.invalidate(chat_id)
+            await message.reply(f"🗑 {domain} ro'yxatdan olib tashlandi." if removed
+                                else f"ℹ️ {domain} ro'yxatlarda yo'q.", disable_web_page_preview=True)
+            return
+        
+        if command.command == ALLOW and '/' in domain:
+            await message.reply("ℹ️ Ruxsat ro'yxatiga faqat domen qo'shiladi (yo'lsiz).")
+            return
+        
+        await db.set_chat_domain(chat_id, domain, command.command, message.from_user.id if message.from_user else None)
+        domain_lists.invalidate(chat_id)
+        if command.command == ALLOW:
+            await message.reply(f"✅ {domain} ruxsat etilganlar ro'yxatiga qo'shildi.", disable_web_page_preview=True)
+        else:
+            await message.reply(f"⛔ {domain} taqiqlanganlar ro'yxatiga qo'shildi.", disable_web_page_preview=True)
+        logger.info("Domain %s set to %s in chat %s", domain, command.command, chat_id)
+    
+    except Exception as e:
+        logger.error("Error in domain list command: %s", e)
+        await message.reply("Xatolik yuz berdi. Iltimos qayta urinib ko'ring.")
+
+def setup_domain_lists(parent: Router, bot: Bot):
+    """Setup domain list commands on the group router
+    
+    Must be included before the link detector, which would otherwise delete
+    the commands themselves since they contain domains. Commands from
+    non-admins are not handled here and go on to the link detector like any
+    other message.
+    """
+    
+    router = Router(name="domainlists")
+    router.message.filter(Command("allow", "deny", "unlist", "domains"), ChatAdmin())
+    
+    @router.message()
+    async def domain_list_handler(message: Message, command: CommandObject):
+        await domain_list_command(message, command, bot)
+    
+    parent.include_router(router)
+    logger.info("Domain lists setup completed")
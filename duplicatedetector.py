@@ -0,0 +1,218 @@
+import heapq
+import logging
+import os
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from aiogram import Router, Bot, F
+from aiogram.filters import BaseFilter
+from aiogram.types import Message
+from chatfilters import inline
+from database import db
+from metrics import registry, Counter, CACHE_SIZE
+from normalizer import normalize_for_scan
+
+logger = logging.getLogger(__name__)
+
+DUPLICATES_TOTAL = registry.register(Counter(
+    "bot_duplicate_spam_total", "Messages flagged as cross-chat duplicates", ("match",)))
+
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+_DIGITS = re.compile(r'\d')
+
+def normalize_text(text: str) -> str:
+    """Lowercase, fold digits and drop punctuation/emoji so trivial edits still match"""
+    return _NON_WORD.sub(' ', _DIGITS.sub('0', text.lower())).strip()
+
+def minhash_signature(words: List[str], size: int) -> Tuple[int, ...]:
+    """Bottom-k MinHash over word bigrams: the ``size`` smallest shingle hashes
+    
+    Two texts with high shingle overlap share most of their smallest hashes,
+    so near-duplicates collide on several signature values.
+    """
+    if len(words) > 1:
+        shingles = {f"{a} {b}" for a, b in zip(words, words[1:])}
+    else:
+        shingles = set(words)
+    return tuple(heapq.nsmallest(size, map(hash, shingles)))
+
+class FingerprintIndex:
+    """Recent message fingerprints across all chats with time-based eviction
+    
+    A message is flagged when the same normalized text (exact hash) or a
+    near-duplicate (sharing ``min_shared`` MinHash values) was posted in
+    ``chat_threshold`` distinct chats by its sender, or in
+    ``crowd_threshold`` distinct chats by anyone. The second rule catches
+    farms of accounts that each post once; since different people do write
+    the same greeting in different groups, it needs more chats and only
+    applies to texts of at least ``crowd_min_length`` characters. Posting
+    lists hold distinct texts rather than occurrences and are capped at
+    ``max_postings``, so a lookup touches a bounded number of entries no
+    matter how much traffic is indexed.
+    """
+    
+    def __init__(self, window: float = 600.0, chat_threshold: int = 3, min_length: int = 30,
+                 crowd_threshold: int = 5, crowd_min_length: int = 60,
+                 signature_size: int = 8, min_shared: int = 4, max_postings: int = 64):
+        self.window = window
+        self.chat_threshold = chat_threshold
+        self.min_length = min_length
+        self.crowd_threshold = crowd_threshold
+        self.crowd_min_length = crowd_min_length
+        self.signature_size = signature_size
+        self.min_shared = min_shared
+        self.max_postings = max_postings
+        
+        # (timestamp, exact key, chat id, sender id), oldest first
+        self.entries: Deque[Tuple[float, int, int, int]] = deque()
+        # exact key -> {chat id: {sender id: occurrences}}
+        self.exact: Dict[int, Dict[int, Dict[int, int]]] = {}
+        # exact key -> MinHash signature
+        self.signatures: Dict[int, Tuple[int, ...]] = {}
+        # signature value -> distinct exact keys carrying it, newest last
+        self.postings: Dict[int, Deque[int]] = {}
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def check(self, chat_id: int, sender_id: int, text: str, now: Optional[float] = None) -> Optional[str]:
+        """Index a message; returns "exact" or "near" when it was cross-posted"""
+        normalized = normalize_text(text)
+        if len(normalized) < self.min_length:
+            return None
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        
+        exact_key = hash(normalized)
+        signature = self.signatures.get(exact_key)
+        if signature is None:
+            signature = minhash_signature(normalized.split(), self.signature_size)
+        crowd = len(normalized) >= self.crowd_min_length
+        match = None
+        
+        if self._spread(self._chats((exact_key,), sender_id), chat_id, crowd):
+            match = "exact"
+        elif self._spread(self._chats(self._near_keys(signature), sender_id), chat_id, crowd):
+            match = "near"
+        
+        self._add(now, exact_key, signature, chat_id, sender_id)
+        return match
+    
+    def _spread(self, chats: Tuple[set, set], chat_id: int, crowd: bool) -> bool:
+        own, everyone = chats
+        own.add(chat_id)
+        everyone.add(chat_id)
+        return len(own) >= self.chat_threshold or (crowd and len(everyone) >= self.crowd_threshold)
+    
+    def _chats(self, keys, sender_id: int) -> Tuple[set, set]:
+        """Chats the texts under ``keys`` were posted in: (by ``sender_id``, by anyone)"""
+        own, everyone = set(), set()
+        for key in keys:
+            for chat, senders in self.exact.get(key, {}).items():
+                everyone.add(chat)
+                if sender_id in senders:
+                    own.add(chat)
+        return own, everyone
+    
+    def _near_keys(self, signature: Tuple[int, ...]) -> List[int]:
+        shared: Dict[int, int] = {}
+        for value in signature:
+            for key in self.postings.get(value, ()):
+                shared[key] = shared.get(key, 0) + 1
+        return [key for key, count in shared.items() if count >= self.min_shared]
+    
+    def _add(self, now: float, exact_key: int, signature: Tuple[int, ...], chat_id: int, sender_id: int):
+        self.entries.append((now, exact_key, chat_id, sender_id))
+        chats = self.exact.get(exact_key)
+        if chats is None:
+            chats = self.exact[exact_key] = {}
+            self.signatures[exact_key] = signature
+            for value in signature:
+                postings = self.postings.get(value)
+                if postings is None:
+                    postings = self.postings[value] = deque(maxlen=self.max_postings)
+                postings.append(exact_key)
+        senders = chats.setdefault(chat_id, {})
+        senders[sender_id] = senders.get(sender_id, 0) + 1
+    
+    def _evict(self, now: float):
+        cutoff = now - self.window
+        while self.entries and self.entries[0][0] < cutoff:
+            _, exact_key, chat_id, sender_id = self.entries.popleft()
+            chats = self.exact[exact_key]
+            senders = chats[chat_id]
+            senders[sender_id] -= 1
+            if senders[sender_id] <= 0:
+                del senders[sender_id]
+            if not senders:
+                del chats[chat_id]
+            if not chats:
+                del self.exact[exact_key]
+                self._drop_postings(exact_key, self.signatures.pop(exact_key))
+    
+    def _drop_postings(self, exact_key: int, signature: Tuple[int, ...]):
+        for value in signature:
+            postings = self.postings.get(value)
+            if postings is None:
+                continue
+            try:
+                postings.remove(exact_key)
+            except ValueError:
+                pass
+            if not postings:
+                del self.postings[value]
+
+# Global fingerprint index
+fingerprint_index = FingerprintIndex(
+    window=float(os.getenv('DUPLICATE_WINDOW', '600')),
+    chat_threshold=int(os.getenv('DUPLICATE_CHAT_THRESHOLD', '3')),
+    min_length=int(os.getenv('DUPLICATE_MIN_LENGTH', '30')),
+    crowd_threshold=int(os.getenv('DUPLICATE_CROWD_THRESHOLD', '5')),
+    crowd_min_length=int(os.getenv('DUPLICATE_CROWD_MIN_LENGTH', '60')),
+)
+CACHE_SIZE.set_function(lambda: len(fingerprint_index), "fingerprints")
+
+def sender_id(message: Message) -> int:
+    """Who posted the message: the user, or the channel/group posting anonymously"""
+    if message.sender_chat:
+        return message.sender_chat.id
+    return message.from_user.id if message.from_user else 0
+
+class DuplicateSpamFilter(BaseFilter):
+    """Indexes every group text and caption and passes for cross-chat duplicates
+    
+    The content goes through ``normalize_for_scan`` first, so copies
+    disguised with lookalike letters or spaced-out dots share a fingerprint.
+    """
+    
+    async def __call__(self, message: Message):
+        content = normalize_for_scan(message.text or message.caption)
+        match = fingerprint_index.check(message.chat.id, sender_id(message), content)
+        if match:
+            return {"duplicate_match": match}
+        return False
+
+async def handle_duplicate_message(message: Message, duplicate_match: str):
+    """Delete a message already posted in other groups"""
+    try:
+        await message.delete()
+        DUPLICATES_TOTAL.inc(duplicate_match)
+        await db.increment_spam_counter()
+        logger.warning("Cross-chat duplicate (%s) deleted from user %s in chat %s",
+                       duplicate_match, message.from_user.id if message.from_user else None, message.chat.id)
+        
+    except Exception as e:
+        logger.error("Error deleting duplicate message: %s", e)
+
+def setup_duplicate_detector(parent: Router, bot: Bot):
+    """Setup cross-chat duplicate detection on the group router"""
+    
+    router = Router(name="duplicatedetector")
+    
+    @router.message(inline(F.text | F.caption), DuplicateSpamFilter())
+    async def duplicate_handler(message: Message, duplicate_match: str):
+        await handle_duplicate_message(message, duplicate_match)
+    
+    parent.include_router(router)
+    logger.info("Duplicate detector setup completed")
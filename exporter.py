@@ -0,0 +1,90 @@
+import csv
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from typing import NamedTuple, Tuple
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from database import db
+
+logger = logging.getLogger(__name__)
+
+class Export(NamedTuple):
+    label: str
+    query: str
+
+EXPORTS = {
+    "users": Export("Foydalanuvchilar", """
+        SELECT user_id, username, first_name, last_name, language_code, is_bot, is_premium,
+               is_active, first_seen, last_seen
+        FROM users ORDER BY user_id
+    """),
+    "groups": Export("Guruhlar", """
+        SELECT chat_id, title, type, username, member_count, is_active, first_added, last_active
+        FROM groups ORDER BY chat_id
+    """),
+}
+FORMATS = ("xlsx", "csv")
+
+# Rows fetched from the cursor at a time; memory stays flat however big the table is
+FETCH_SIZE = 2000
+# Excel's row limit is 1,048,576; larger exports continue on a new sheet
+MAX_SHEET_ROWS = 1_000_000
+
+def _cell(value):
+    # Names may contain control characters, which openpyxl refuses to write
+    return ILLEGAL_CHARACTERS_RE.sub('', value) if isinstance(value, str) else value
+
+def write_export(connection: sqlite3.Connection, export: Export, fmt: str, path: str) -> int:
+    """Stream the query result into ``path``; runs in a worker thread"""
+    cursor = connection.execute(export.query)
+    headers = [column[0] for column in cursor.description]
+    chunks = iter(lambda: cursor.fetchmany(FETCH_SIZE), [])
+    count = 0
+    
+    if fmt == "csv":
+        # utf-8-sig so Excel detects the encoding of Cyrillic names
+        with open(path, "w", newline="", encoding="utf-8-sig") as output:
+            writer = csv.writer(output)
+            writer.writerow(headers)
+            for rows in chunks:
+                writer.writerows(rows)
+                count += len(rows)
+        return count
+    
+    # Write-only workbooks serialize each row as it is appended
+    workbook = Workbook(write_only=True)
+    sheet = None
+    for rows in chunks:
+        for row in rows:
+            if count % MAX_SHEET_ROWS == 0:
+                sheet = workbook.create_sheet(f"{export.label} {count // MAX_SHEET_ROWS + 1}")
+                sheet.append(headers)
+            sheet.append([_cell(value) for value in row])
+            count += 1
+    if sheet is None:
+        workbook.create_sheet(export.label).append(headers)
+    workbook.save(path)
+    return count
+
+async def export_table(name: str, fmt: str) -> Tuple[str, int]:
+    """Export a table to a temporary file; returns (path, row count)
+    
+    The caller removes the file's directory with ``cleanup`` once it is sent.
+    """
+    export = EXPORTS[name]
+    directory = tempfile.mkdtemp(prefix="export-")
+    path = os.path.join(directory, f"{name}_{datetime.now():%Y%m%d_%H%M}.{fmt}")
+    try:
+        count = await db.reads.run_sync(write_export, export, fmt, path)
+    except Exception:
+        cleanup(path)
+        raise
+    logger.info("Exported %d %s rows to %s (%d bytes)", count, name, path, os.path.getsize(path))
+    return path, count
+
+def cleanup(path: str):
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
@@ -0,0 +1,123 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional, Tuple
+from aiogram import Router, Bot, F
+from aiogram.filters import BaseFilter
+from aiogram.types import Message, ChatPermissions
+from chatfilters import inline
+from metrics import registry, Counter, CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+FLOOD_ACTIONS = registry.register(Counter(
+    "bot_flood_actions_total", "Messages acted on by the flood limiter", ("action",)))
+
+class FloodLimiter:
+    """Token bucket per (chat, user) with bounded memory
+    
+    Each sender gets ``burst`` tokens refilled at ``rate`` per second; a
+    message costs one token. Buckets live in an LRU-ordered dict: touching a
+    bucket moves it to the end, so idle buckets collect at the front and are
+    evicted from there once they exceed ``idle_seconds`` or the table
+    outgrows ``max_entries``. Every operation is O(1) amortized.
+    """
+    
+    def __init__(self, rate: float = 1.0, burst: int = 8, max_entries: int = 50000,
+                 idle_seconds: float = 300.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        # (chat_id, user_id) -> [tokens, last refill time, already punished]
+        self.buckets: "OrderedDict[Tuple[int, int], list]" = OrderedDict()
+    
+    def hit(self, chat_id: int, user_id: int, now: Optional[float] = None) -> bool:
+        """Spend a token; returns True when the sender is over the limit"""
+        now = time.monotonic() if now is None else now
+        key = (chat_id, user_id)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [float(self.burst), now, False]
+            self._evict(now)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return False
+        return True
+    
+    def first_violation(self, chat_id: int, user_id: int) -> bool:
+        """True only for the first over-limit message of a burst (to act once per burst)"""
+        bucket = self.buckets.get((chat_id, user_id))
+        if bucket is None or bucket[2]:
+            return False
+        bucket[2] = True
+        return True
+    
+    def _evict(self, now: float):
+        while self.buckets:
+            key, bucket = next(iter(self.buckets.items()))
+            if len(self.buckets) > self.max_entries or now - bucket[1] > self.idle_seconds:
+                self.buckets.popitem(last=False)
+            else:
+                break
+
+# Global limiter instance
+flood_limiter = FloodLimiter(
+    rate=float(os.getenv('FLOOD_RATE', '1.0')),
+    burst=int(os.getenv('FLOOD_BURST', '8')),
+    max_entries=int(os.getenv('FLOOD_MAX_TRACKED', '50000')),
+    idle_seconds=float(os.getenv('FLOOD_IDLE', '300')),
+)
+# "delete" removes over-limit messages; "mute" also restricts the sender
+FLOOD_ACTION = os.getenv('FLOOD_ACTION', 'delete')
+FLOOD_MUTE_SECONDS = int(os.getenv('FLOOD_MUTE_SECONDS', '300'))
+CACHE_SIZE.set_function(lambda: len(flood_limiter.buckets), "flood_buckets")
+
+class FloodFilter(BaseFilter):
+    """Passes when the sender has exhausted their message budget"""
+    
+    async def __call__(self, message: Message) -> bool:
+        return flood_limiter.hit(message.chat.id, message.from_user.id)
+
+async def handle_flood_message(message: Message, bot: Bot):
+    """Delete an over-limit message and, if configured, mute the sender"""
+    chat_id = message.chat.id
+    user_id = message.from_user.id
+    try:
+        await message.delete()
+        FLOOD_ACTIONS.inc("delete")
+        
+        if FLOOD_ACTION == 'mute' and flood_limiter.first_violation(chat_id, user_id):
+            await bot.restrict_chat_member(
+                chat_id=chat_id,
+                user_id=user_id,
+                permissions=ChatPermissions(can_send_messages=False),
+                until_date=timedelta(seconds=FLOOD_MUTE_SECONDS)
+            )
+            FLOOD_ACTIONS.inc("mute")
+            logger.warning("Muted user %s in chat %s for flooding (%ss)", user_id, chat_id, FLOOD_MUTE_SECONDS)
+        
+    except Exception as e:
+        logger.error("Error handling flood message from user %s in chat %s: %s", user_id, chat_id, e)
+
+def setup_flood_limiter(parent: Router, bot: Bot):
+    """Setup the per-user flood limiter on the group router"""
+    
+    router = Router(name="floodlimiter")
+    # Service messages and anonymous senders are not rate limited
+    router.message.filter(inline(F.from_user & ~F.new_chat_members & ~F.left_chat_member))
+    
+    @router.message(FloodFilter())
+    async def flood_handler(message: Message):
+        await handle_flood_message(message, bot)
+    
+    parent.include_router(router)
+    logger.info("Flood limiter setup completed")
@@ -1,39 +1,305 @@
+import asyncio
 import logging
-from aiogram import Dispatcher, Bot
-from aiogram.types import Message
+import os
+import time
+from array import array
+from datetime import timedelta
+from typing import Dict, List, Optional, Set
+from aiogram import Router, Bot, F
+from aiogram.types import Message, ChatPermissions
 from aiogram.enums import ContentType
+from aiogram.exceptions import TelegramRetryAfter
+from chatfilters import inline
+from metrics import QUEUE_DEPTH, registry, Counter
+from database import db
+from chatsettings import chat_settings, JOIN_CLEANUP
 
 logger = logging.getLogger(__name__)
 
+# Service messages this module cleans up; the router is gated on these so
+# ordinary chat messages never reach the handlers below
+SERVICE_CONTENT_TYPES = {ContentType.NEW_CHAT_MEMBERS, ContentType.LEFT_CHAT_MEMBER}
+
+# deleteMessages accepts at most 100 message IDs per call
+DELETE_BATCH_SIZE = 100
+
+class DeletionBatcher:
+    """Coalesce service-message deletions per chat into deleteMessages calls
+    
+    The first message queued for a chat opens a short window; everything
+    queued for that chat until it closes (or until 100 IDs pile up) is
+    deleted in one request. 429s are retried after ``retry_after``; if the
+    bulk call still fails, the IDs are deleted one by one.
+    """
+    
+    def __init__(self, window: float = 1.0, max_retries: int = 3):
+        self.window = window
+        self.max_retries = max_retries
+        self.pending: Dict[int, List[int]] = {}
+        self._bots: Dict[int, Bot] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+        # Flushes of full batches; the loop only keeps weak references to tasks
+        self._flushes: Set[asyncio.Task] = set()
+    
+    def add(self, bot: Bot, chat_id: int, message_id: int):
+        """Queue a message for deletion"""
+        ids = self.pending.setdefault(chat_id, [])
+        ids.append(message_id)
+        self._bots[chat_id] = bot
+        if len(ids) == DELETE_BATCH_SIZE:
+            self._cancel_timer(chat_id)
+            task = asyncio.create_task(self.flush(chat_id))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        elif chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+    
+    def depth(self) -> int:
+        return sum(len(ids) for ids in self.pending.values())
+    
+    def _cancel_timer(self, chat_id: int):
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+    
+    async def _flush_later(self, chat_id: int):
+        await asyncio.sleep(self.window)
+        self._timers.pop(chat_id, None)
+        await self.flush(chat_id)
+    
+    async def flush(self, chat_id: int):
+        """Delete everything queued for a chat"""
+        ids = self.pending.pop(chat_id, None)
+        bot = self._bots.pop(chat_id, None)
+        if not ids or bot is None:
+            return
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            await self._delete_batch(bot, chat_id, ids[start:start + DELETE_BATCH_SIZE])
+    
+    async def _delete_batch(self, bot: Bot, chat_id: int, ids: List[int]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await bot.delete_messages(chat_id=chat_id, message_ids=ids)
+                logger.debug("Deleted %d service messages in chat %s", len(ids), chat_id)
+                return
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    break
+                logger.warning("deleteMessages throttled in chat %s, retrying in %ss", chat_id, e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.warning("deleteMessages failed in chat %s (%s), deleting one by one", chat_id, e)
+                break
+        await self._delete_individually(bot, chat_id, ids)
+    
+    async def _delete_individually(self, bot: Bot, chat_id: int, ids: List[int]):
+        for message_id in ids:
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=message_id)
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                try:
+                    await bot.delete_message(chat_id=chat_id, message_id=message_id)
+                except Exception as e:
+                    logger.error("Error deleting service message %s in chat %s: %s", message_id, chat_id, e)
+            except Exception as e:
+                logger.error("Error deleting service message %s in chat %s: %s", message_id, chat_id, e)
+    
+    async def close(self):
+        """Flush every chat immediately (shutdown)"""
+        for chat_id in list(self._timers):
+            self._cancel_timer(chat_id)
+        await asyncio.gather(*(self.flush(chat_id) for chat_id in list(self.pending)), *self._flushes)
+
+# Global batcher instance
+deletion_batcher = DeletionBatcher(window=float(os.getenv('JOIN_DELETE_WINDOW', '1.0')))
+QUEUE_DEPTH.set_function(deletion_batcher.depth, "service_deletions")
+
+RAIDS_TOTAL = registry.register(Counter(
+    "bot_join_raids_total", "Join raids that put a chat into lockdown"))
+RESTRICTED_TOTAL = registry.register(Counter(
+    "bot_raid_restrictions_total", "New members restricted during lockdown", ("result",)))
+
+class SlidingWindowCounter:
+    """Event count over the trailing ``window`` seconds
+    
+    Ring buffer of ``slots`` buckets plus a running total: recording an event
+    expires at most the buckets skipped since the previous event, so the cost
+    is O(1) amortized and memory is fixed per chat.
+    """
+    
+    __slots__ = ("slot_seconds", "counts", "total", "head")
+    
+    def __init__(self, window: float = 60.0, slots: int = 12):
+        self.slot_seconds = window / slots
+        self.counts = array('I', bytes(4 * slots))
+        self.total = 0
+        self.head = 0
+    
+    def add(self, amount: int = 1, now: Optional[float] = None) -> int:
+        """Record events and return the count inside the window"""
+        self._advance(time.monotonic() if now is None else now)
+        self.counts[self.head % len(self.counts)] += amount
+        self.total += amount
+        return self.total
+    
+    def count(self, now: Optional[float] = None) -> int:
+        self._advance(time.monotonic() if now is None else now)
+        return self.total
+    
+    def _advance(self, now: float):
+        slot = int(now / self.slot_seconds)
+        if slot <= self.head:
+            return
+        size = len(self.counts)
+        if slot - self.head >= size:
+            for i in range(size):
+                self.counts[i] = 0
+            self.total = 0
+        else:
+            for expired in range(self.head + 1, slot + 1):
+                index = expired % size
+                self.total -= self.counts[index]
+                self.counts[index] = 0
+        self.head = slot
+
+class RaidGuard:
+    """Detect join waves per chat and hold the chat in lockdown while they last
+    
+    ``threshold`` joins inside ``window`` seconds start a lockdown of
+    ``lockdown`` seconds. While it lasts, new members are muted until the
+    lockdown ends and linkdetector deletes mentions without member lookups.
+    """
+    
+    def __init__(self, threshold: int = 15, window: float = 60.0, lockdown: float = 600.0):
+        self.threshold = threshold
+        self.window = window
+        self.lockdown = lockdown
+        self.counters: Dict[int, SlidingWindowCounter] = {}
+        self.last_seen: Dict[int, float] = {}
+        self.lockdowns: Dict[int, float] = {}
+        self.raid_joins: Dict[int, int] = {}
+    
+    def is_lockdown(self, chat_id: int, now: Optional[float] = None) -> bool:
+        until = self.lockdowns.get(chat_id)
+        if until is None:
+            return False
+        if (time.monotonic() if now is None else now) < until:
+            return True
+        del self.lockdowns[chat_id]
+        return False
+    
+    def record_joins(self, chat_id: int, joins: int, now: Optional[float] = None) -> bool:
+        """Count joins; returns True when they start a new lockdown"""
+        now = time.monotonic() if now is None else now
+        counter = self.counters.get(chat_id)
+        if counter is None:
+            counter = self.counters[chat_id] = SlidingWindowCounter(self.window)
+            if len(self.counters) % 1000 == 0:
+                self._evict_idle(now)
+        self.last_seen[chat_id] = now
+        in_window = counter.add(joins, now)
+        
+        if self.is_lockdown(chat_id, now):
+            self.raid_joins[chat_id] = self.raid_joins.get(chat_id, 0) + joins
+            return False
+        if in_window >= self.threshold:
+            self.lockdowns[chat_id] = now + self.lockdown
+            self.raid_joins[chat_id] = in_window
+            RAIDS_TOTAL.inc()
+            return True
+        return False
+    
+    def _evict_idle(self, now: float):
+        """Drop counters of chats with no joins for several windows"""
+        idle_after = self.window * 5
+        for chat_id, seen in list(self.last_seen.items()):
+            if now - seen > idle_after and chat_id not in self.lockdowns:
+                del self.last_seen[chat_id]
+                self.counters.pop(chat_id, None)
+                self.raid_joins.pop(chat_id, None)
+
+# Global raid guard instance
+raid_guard = RaidGuard(
+    threshold=int(os.getenv('RAID_JOIN_THRESHOLD', '15')),
+    window=float(os.getenv('RAID_WINDOW', '60')),
+    lockdown=float(os.getenv('RAID_LOCKDOWN', '600')),
+)
+
+async def restrict_new_members(message: Message, bot: Bot):
+    """Mute members who joined during a lockdown until it ends"""
+    for member in message.new_chat_members or []:
+        if member.is_bot:
+            continue
+        try:
+            await bot.restrict_chat_member(
+                chat_id=message.chat.id,
+                user_id=member.id,
+                permissions=ChatPermissions(can_send_messages=False),
+                until_date=timedelta(seconds=raid_guard.lockdown)
+            )
+            RESTRICTED_TOTAL.inc("ok")
+        except Exception as e:
+            RESTRICTED_TOTAL.inc("error")
+            logger.error("Error restricting user %s in chat %s: %s", member.id, message.chat.id, e)
+
+async def start_lockdown(message: Message, bot: Bot):
+    """Announce a lockdown and record the raid"""
+    chat_id = message.chat.id
+    joins = raid_guard.raid_joins.get(chat_id, 0)
+    logger.warning("Join raid detected in chat %s: %d joins in %.0fs, lockdown for %.0fs",
+                   chat_id, joins, raid_guard.window, raid_guard.lockdown)
+    await db.add_raid_event(chat_id, joins)
+    try:
+        await bot.send_message(
+            chat_id,
+            f"🚨 Guruhga ommaviy qo'shilish aniqlandi! {int(raid_guard.lockdown // 60)} daqiqa davomida "
+            f"yangi a'zolar yozolmaydi."
+        )
+    except Exception as e:
+        logger.error("Error announcing lockdown in chat %s: %s", chat_id, e)
+
 async def handle_new_members(message: Message, bot: Bot):
     """Handle new member join messages"""
     try:
-        # Delete the "user joined" message
-        await message.delete()
-        logger.info(f"Deleted join message in chat {message.chat.id}")
+        # Queue the "user joined" message for batched deletion
+        if chat_settings.enabled(message.chat.id, JOIN_CLEANUP):
+            deletion_batcher.add(bot, message.chat.id, message.message_id)
+            logger.debug("Queued join message deletion in chat %s", message.chat.id)
+        
+        joins = len(message.new_chat_members or ())
+        if raid_guard.record_joins(message.chat.id, joins):
+            await start_lockdown(message, bot)
+        if raid_guard.is_lockdown(message.chat.id):
+            await restrict_new_members(message, bot)
         
     except Exception as e:
-        logger.error(f"Error deleting join message: {e}")
+        logger.error("Error deleting join message: %s", e)
 
 async def handle_left_members(message: Message, bot: Bot):
     """Handle member left messages"""
     try:
-        # Delete the "user left" message
-        await message.delete()
-        logger.info(f"Deleted leave message in chat {message.chat.id}")
+        # Queue the "user left" message for batched deletion
+        if chat_settings.enabled(message.chat.id, JOIN_CLEANUP):
+            deletion_batcher.add(bot, message.chat.id, message.message_id)
+            logger.debug("Queued leave message deletion in chat %s", message.chat.id)
         
     except Exception as e:
-        logger.error(f"Error deleting leave message: {e}")
+        logger.error("Error deleting leave message: %s", e)
 
-def setup_join_remover(dp: Dispatcher, bot: Bot):
-    """Setup join/leave message remover"""
+def setup_join_remover(parent: Router, bot: Bot):
+    """Setup join/leave message remover on the group router"""
+    
+    router = Router(name="joinremover")
+    router.message.filter(inline(F.content_type.in_(SERVICE_CONTENT_TYPES)))
     
-    @dp.message(lambda message: message.content_type == ContentType.NEW_CHAT_MEMBERS)
+    @router.message(inline(F.new_chat_members))
     async def new_member_handler(message: Message):
         await handle_new_members(message, bot)
     
-    @dp.message(lambda message: message.content_type == ContentType.LEFT_CHAT_MEMBER)
+    @router.message(inline(F.left_chat_member))
     async def left_member_handler(message: Message):
         await handle_left_members(message, bot)
-        
-    logger.info("Join remover setup completed")
\ No newline at end of file
+    
+    parent.include_router(router)
+    logger.info("Join remover setup completed")
@@ -1,99 +1,225 @@
 import re
 import logging
-from aiogram import Dispatcher, Bot
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+from aiogram import Router, Bot, F
 from aiogram.types import Message
 from aiogram.filters import BaseFilter
+from chatfilters import inline
+from metrics import CACHE_REQUESTS, CACHE_SIZE
+from joinremover import raid_guard
+from domainlists import domain_lists, ALLOW, DENY
+from chatsettings import chat_settings, LINK_FILTER, MENTION_CHECK
+from normalizer import normalize_for_scan
+from blocklist import blocklist
+from spamscore import spam_scorer, moderation_log
 
 logger = logging.getLogger(__name__)
 
+# Longest text that is scanned; Telegram caps messages at 4096 characters,
+# so this only matters if normalization or a future source produces more
+MAX_SCAN_CHARS = int(os.getenv('MAX_SCAN_CHARS', '4096'))
+
+# Link rules, compiled once into a single alternation so a message is
+# scanned in one pass over its lowercased copy (cheaper than IGNORECASE).
+# Every repeat is bounded (DNS labels are at most 63 characters, usernames
+# 32) and the domain rule is anchored to label starts by a lookbehind, so a
+# failed attempt costs a bounded number of steps and the scan stays linear.
+# The domain rule only needs to prove a host exists, so it matches the last
+# "label.tld" pair instead of the whole host. The previous
+# ``\b[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b`` let dots match inside the repeat and
+# backtracked quadratically on long dotted runs (hundreds of ms on a
+# 4096-character "a.a.a..." message; see benchmarks/bench_pathological.py).
+LINK_RULES = {
+    'url': r'https?://\S',
+    'www': r'www\.\S',
+    'domain': r'(?<![\w-])[a-z0-9-]{1,63}\.[a-z]{2,24}\b',
+    'telegram': r't\.me/\S',
+    'at_domain': r'@[a-z0-9_]{1,32}\.[a-z]{2,24}',
+}
+LINK_PATTERN = re.compile('|'.join(f'(?P<{name}>{rule})' for name, rule in LINK_RULES.items()))
+MENTION_PATTERN = re.compile(r'@([a-zA-Z0-9_]{1,32})\b')
+
+def find_link_rule(text: str) -> Optional[str]:
+    """Name of the first link rule matching ``text``, if any"""
+    match = LINK_PATTERN.search(text.lower())
+    return match.lastgroup if match else None
+
+def only_bare_domains(text: str) -> bool:
+    """True when every link in ``text`` is a bare "name.tld" (no URL, www or t.me)"""
+    return all(match.lastgroup == 'domain' for match in LINK_PATTERN.finditer(text.lower()))
+
+def message_content(message: Message) -> Optional[str]:
+    """Text of a message, or the caption of a photo/video/document"""
+    return message.text or message.caption
+
+class ScannedContent:
+    """Content hash of recently scanned messages, so an edit that leaves
+    the text unchanged (Telegram also sends edits for formatting, media swaps
+    and link preview changes) is not scanned again
+    
+    An LRU-ordered dict of (chat_id, message_id) -> hash, capped at
+    ``max_entries``; each lookup is O(1) and an entry costs a few dozen bytes.
+    """
+    
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self.hashes: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self.hashes)
+    
+    def unchanged(self, chat_id: int, message_id: int, content: str) -> bool:
+        """Record ``content`` for the message; True if it was already scanned as is"""
+        key = (chat_id, message_id)
+        digest = hash(content)
+        previous = self.hashes.get(key)
+        self.hashes[key] = digest
+        self.hashes.move_to_end(key)
+        if len(self.hashes) > self.max_entries:
+            self.hashes.popitem(last=False)
+        return previous == digest
+
+# Global cache instance
+scanned_content = ScannedContent(max_entries=int(os.getenv('SCANNED_CONTENT_MAX', '20000')))
+CACHE_SIZE.set_function(lambda: len(scanned_content), "scanned_content")
+
 class LinkDetectorFilter(BaseFilter):
-    """Filter to detect links and mentions in messages"""
+    """Filter to detect links and mentions in messages, captions and edits"""
     
-    async def __call__(self, message: Message) -> bool:
-        if not message.text or not message.chat:
+    async def __call__(self, message: Message):
+        content = message_content(message)
+        if not content or not message.chat:
             return False
             
         # Only work in groups and supergroups
         if message.chat.type not in ['group', 'supergroup']:
             return False
             
-        text = message.text
-        
-        # Check for links (http, https, www, .com, .net, etc)
-        link_patterns = [
-            r'https?://[^\s]+',
-            r'www\.[^\s]+',
-            r'\b[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b',
-            r't\.me/[^\s]+',
-            r'@[a-zA-Z0-9_]+\.[a-zA-Z]{2,}',
-        ]
+        # Edits whose text did not change were already scanned
+        if scanned_content.unchanged(message.chat.id, message.message_id, content):
+            CACHE_REQUESTS.inc("scanned_content", "hit")
+            return False
+        if message.edit_date:
+            CACHE_REQUESTS.inc("scanned_content", "miss")
+            
+        # Normalized and scanned once here; the handler gets the results as
+        # ``scan_text`` and ``link_rule``
+        text = normalize_for_scan(content[:MAX_SCAN_CHARS])
         
-        for pattern in link_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                return True
-                
-        # Check for mentions
-        mention_pattern = r'@[a-zA-Z0-9_]+'
-        mentions = re.findall(mention_pattern, text)
+        # Check for links (http, https, www, .com, .net, etc) and mentions
+        link_rule = find_link_rule(text)
+        if link_rule or MENTION_PATTERN.search(text):
+            return {"scan_text": text, "link_rule": link_rule}
         
-        if mentions:
-            return True
+        # Text-only ads are left to the optional spam model
+        threshold = spam_scorer.threshold(message.chat.id) if spam_scorer.active else None
+        if threshold is not None:
+            score = await spam_scorer.score(text)
+            if score >= threshold:
+                return {"scan_text": text, "link_rule": None, "spam_score": score}
+            moderation_log.record(message.chat.id, text, False)
             
         return False
 
-async def handle_link_message(message: Message, bot: Bot):
-    """Handle messages containing links or mentions"""
+async def handle_link_message(message: Message, bot: Bot, scan_text: str = None, link_rule: str = None,
+                              spam_score: float = None):
+    """Handle messages containing links or mentions
+    
+    ``scan_text`` and ``link_rule`` are the normalized text and the matched
+    link rule as produced by LinkDetectorFilter; ``spam_score`` is set when
+    the spam model flagged a message the rules did not match.
+    """
     try:
-        if not message.text or not message.from_user:
+        content = message_content(message)
+        if not content or not message.from_user:
             logger.debug("Message has no text or from_user, skipping")
             return
             
-        text = message.text
+        if scan_text is None:
+            scan_text = normalize_for_scan(content[:MAX_SCAN_CHARS])
+            link_rule = find_link_rule(scan_text)
+        text = scan_text
         user_id = message.from_user.id
         chat_id = message.chat.id
         username = message.from_user.username or message.from_user.full_name
         
-        logger.info(f"Processing message from user {user_id} in chat {chat_id}: '{text[:50]}...'")
+        logger.debug("Processing message from user %s in chat %s (%d chars)", user_id, chat_id, len(text))
+        
+        # Known spam domains and usernames are removed in every chat, before
+        # allowlists and feature settings are consulted
+        listed = blocklist.find(text.lower())
+        if listed:
+            await message.delete()
+            moderation_log.record(chat_id, text, True)
+            logger.warning("Blocklisted %s %s in message from user %s deleted in chat %s",
+                           listed[0], listed[1], user_id, chat_id)
+            return
+        
+        if spam_score is not None:
+            await message.delete()
+            await message.answer(f"@{message.from_user.username}, ❌ Reklama tarqatish taqiqlanadi!",
+                                 parse_mode="HTML")
+            moderation_log.record(chat_id, text, True)
+            logger.warning("Message scored as spam (%.2f) deleted from user %s in chat %s", spam_score, user_id, chat_id)
+            return
         
-        # Check for direct links first
-        link_patterns = [
-            r'https?://[^\s]+',
-            r'www\.[^\s]+', 
-            r'\b[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b',
-            r't\.me/[^\s]+',
-            r'@[a-zA-Z0-9_]+\.[a-zA-Z]{2,}',
-        ]
+        has_link = link_rule is not None
+        if has_link:
+            logger.info("Link detected in message from user %s: rule %s matched", user_id, link_rule)
         
-        has_link = False
-        for pattern in link_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                has_link = True
-                logger.warning(f"Link detected in message: pattern '{pattern}' matched in '{text}'")
-                break
+        # Per-chat lists override the generic patterns: denied entries are
+        # always removed (even with link filtering off), links to allowlisted
+        # domains only are let through
+        if has_link:
+            verdict = await domain_lists.verdict(chat_id, text)
+            if verdict == ALLOW:
+                has_link = False
+                logger.debug("All links in message from user %s are allowlisted in chat %s", user_id, chat_id)
+            elif verdict == DENY:
+                logger.info("Denylisted domain in message from user %s in chat %s", user_id, chat_id)
+            elif not chat_settings.enabled(chat_id, LINK_FILTER):
+                has_link = False
+            elif link_rule == 'domain' and spam_scorer.active and only_bare_domains(text):
+                # A bare "word.tld" is weak evidence on its own ("fayl.txt",
+                # "v2.0"); with a model loaded it decides
+                threshold = spam_scorer.threshold(chat_id)
+                if threshold is not None and await spam_scorer.score(text) < threshold:
+                    has_link = False
+                    moderation_log.record(chat_id, text, False)
+                    logger.debug("Bare domain in message from user %s scored below threshold", user_id)
         
         if has_link:
             # Delete message and warn
             await message.delete()
+            moderation_log.record(chat_id, text, True)
             await message.answer(f"@{message.from_user.username}, ❌ Reklama tarqatish taqiqlanadi! Linklar yuborish mumkin emas.",
                                  parse_mode="HTML")
-            logger.warning(f"Link message deleted from user {user_id} in chat {chat_id}")
+            logger.warning("Link message deleted from user %s in chat %s", user_id, chat_id)
             return
             
         # Check for mentions
-        mention_pattern = r'@([a-zA-Z0-9_]+)'
-        mentions = re.findall(mention_pattern, text)
+        mentions = MENTION_PATTERN.findall(text)
         
-        if mentions:
-            logger.info(f"Found mentions in message: {mentions}")
+        if mentions and chat_settings.enabled(chat_id, MENTION_CHECK):
+            logger.debug("Found mentions in message: %s", mentions)
+            
+            # During a join raid every mention is treated as spam, without
+            # spending API calls on membership lookups
+            if raid_guard.is_lockdown(chat_id):
+                await message.delete()
+                logger.warning("Mention deleted during raid lockdown from user %s in chat %s", user_id, chat_id)
+                return
             
             # Check each mention
             for mention in mentions:
-                logger.info(f"Checking mention: @{mention}")
+                logger.debug("Checking mention: @%s", mention)
                 
                 try:
                     # Try to check if user is in the chat
                     is_member = await check_user_in_chat(bot, chat_id, mention)
-                    logger.info(f"User @{mention} membership check result: {is_member}")
+                    logger.debug("User @%s membership check result: %s", mention, is_member)
                     
                     if not is_member:
                         # User not found in group - likely spam
@@ -102,7 +228,7 @@ async def handle_link_message(message: Message, bot: Bot):
                             f"@{message.from_user.username}, ⚠️ Reklama tarqatish taqiqlanadi! Guruhda yo'q foydalanuvchilarni mention qilish mumkin emas.",
                             parse_mode="HTML"
                         )
-                        logger.warning(f"Foreign mention deleted: @{mention} from user {user_id} in chat {chat_id}")
+                        logger.warning("Foreign mention deleted: @%s from user %s in chat %s", mention, user_id, chat_id)
                         
                         # Delete warning message after 5 seconds
                         import asyncio
@@ -113,56 +239,58 @@ async def handle_link_message(message: Message, bot: Bot):
                             pass
                         return
                     else:
-                        logger.info(f"Mention @{mention} is valid - user is in group")
+                        logger.debug("Mention @%s is valid - user is in group", mention)
                         
                 except Exception as e:
-                    logger.error(f"Error checking mention @{mention}: {e}")
+                    logger.error("Error checking mention @%s: %s", mention, e)
                     # If we can't verify, assume it's spam for safety
                     await message.delete()
                     await message.answer(f"@{message.from_user.username}, ⚠️ Reklama tarqatish taqiqlanadi!", parse_mode="HTML")
-                    logger.warning(f"Mention deleted due to verification error: @{mention}")
+                    logger.warning("Mention deleted due to verification error: @%s", mention)
                     return
                     
     except Exception as e:
-        logger.error(f"Error in handle_link_message: {e}")
+        logger.error("Error in handle_link_message: %s", e)
 
 async def check_user_in_chat(bot: Bot, chat_id: int, username: str) -> bool:
     """Check if user with given username is in the chat"""
     try:
-        logger.debug(f"Checking if @{username} is in chat {chat_id}")
+        logger.debug("Checking if @%s is in chat %s", username, chat_id)
         
         # Method 1: Try to get chat member by username
         try:
             # This works if the user has been active recently or is an admin
             member = await bot.get_chat_member(chat_id, f"@{username}")
             if member.status in ['creator', 'administrator', 'member']:
-                logger.info(f"@{username} confirmed as member with status: {member.status}")
+                logger.debug("@%s confirmed as member with status: %s", username, member.status)
                 return True
         except Exception as e:
-            logger.debug(f"get_chat_member failed for @{username}: {e}")
+            logger.debug("get_chat_member failed for @%s: %s", username, e)
         
         # Method 2: Check in administrators list
         try:
             admins = await bot.get_chat_administrators(chat_id)
             for admin in admins:
                 if admin.user.username and admin.user.username.lower() == username.lower():
-                    logger.info(f"@{username} found in administrators")
+                    logger.debug("@%s found in administrators", username)
                     return True
         except Exception as e:
-            logger.debug(f"Could not get administrators: {e}")
+            logger.debug("Could not get administrators: %s", e)
         
         # Method 3: Maintain a simple cache of recent users (in-memory)
         # This is a fallback method - we'll track users who send messages
         cache_key = f"{chat_id}:{username.lower()}"
         if hasattr(bot, '_user_cache') and cache_key in bot._user_cache:
-            logger.info(f"@{username} found in user cache")
+            CACHE_REQUESTS.inc("membership", "hit")
+            logger.debug("@%s found in user cache", username)
             return True
+        CACHE_REQUESTS.inc("membership", "miss")
         
-        logger.warning(f"@{username} not found in chat {chat_id} - treating as foreign")
+        logger.warning("@%s not found in chat %s - treating as foreign", username, chat_id)
         return False
             
     except Exception as e:
-        logger.error(f"Error in check_user_in_chat for @{username}: {e}")
+        logger.error("Error in check_user_in_chat for @%s: %s", username, e)
         return False
 
 async def cache_user_activity(bot: Bot, message: Message):
@@ -174,21 +302,32 @@ async def cache_user_activity(bot: Bot, message: Message):
         if message.from_user and message.from_user.username:
             cache_key = f"{message.chat.id}:{message.from_user.username.lower()}"
             bot._user_cache[cache_key] = True
-            logger.debug(f"Cached user activity: @{message.from_user.username} in chat {message.chat.id}")
+            logger.debug("Cached user activity: @%s in chat %s", message.from_user.username, message.chat.id)
             
     except Exception as e:
-        logger.error(f"Error caching user activity: {e}")
+        logger.error("Error caching user activity: %s", e)
 
-def setup_link_detector(dp: Dispatcher, bot: Bot):
-    """Setup link detector handlers"""
+def setup_link_detector(parent: Router, bot: Bot):
+    """Setup link detector handlers on the group router"""
     
-    @dp.message(LinkDetectorFilter())
-    async def link_detector_handler(message: Message):
-        await handle_link_message(message, bot)
+    router = Router(name="linkdetector")
     
-    # Cache user activity for all group messages
-    @dp.message(lambda message: message.chat and message.chat.type in ['group', 'supergroup'])
+    # Only texts and captions can carry links; everything else skips the scan
+    @router.message(inline(F.text | F.caption), LinkDetectorFilter())
+    async def link_detector_handler(message: Message, scan_text: str, link_rule: Optional[str],
+                                    spam_score: Optional[float] = None):
+        await handle_link_message(message, bot, scan_text, link_rule, spam_score)
+    
+    # Spammers post clean text and edit the link in afterwards
+    @router.edited_message(inline(F.text | F.caption), LinkDetectorFilter())
+    async def edited_link_detector_handler(message: Message, scan_text: str, link_rule: Optional[str],
+                                           spam_score: Optional[float] = None):
+        await handle_link_message(message, bot, scan_text, link_rule, spam_score)
+    
+    # Cache user activity for all remaining group messages
+    @router.message()
     async def cache_users_handler(message: Message):
         await cache_user_activity(bot, message)
-        
-    logger.info("Link detector setup completed")
\ No newline at end of file
+    
+    parent.include_router(router)
+    logger.info("Link detector setup completed")
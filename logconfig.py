@@ -0,0 +1,135 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from typing import Dict, Optional, Tuple
+
+# Hot-path loggers and how many records per message template they may emit
+# each second below WARNING; anything above that is counted and dropped
+DEFAULT_SAMPLE_BUDGETS = {
+    'linkdetector': 20,
+    'joinremover': 20,
+    'database': 20,
+}
+
+PLAIN_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for log shippers"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            payload['suppressed'] = suppressed
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+class RateSampler(logging.Filter):
+    """Per-logger, per-template rate limit for chatty records
+    
+    Keyed by the unformatted ``record.msg`` so it only works with lazy
+    ``%``-style calls; records at WARNING and above always pass. The number of
+    records dropped in a window is attached to the next record that passes.
+    """
+    
+    def __init__(self, budgets: Dict[str, int], interval: float = 1.0):
+        super().__init__()
+        self.budgets = budgets
+        self.interval = interval
+        self._windows: Dict[Tuple[str, str], list] = {}
+        self.dropped = 0
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        budget = self.budgets.get(record.name)
+        if budget is None:
+            return True
+        
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if window[1] < budget:
+            window[1] += 1
+            return True
+        window[2] += 1
+        self.dropped += 1
+        return False
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread
+    
+    The stock ``prepare`` renders the message on the calling thread, which is
+    the event loop for every handler. Records are only shared within this
+    process, so they can be enqueued as-is.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def _file_handler(path: str) -> logging.Handler:
+    """Rotating file handler, by time if LOG_ROTATE_WHEN is set, otherwise by size"""
+    backup_count = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    when = os.getenv('LOG_ROTATE_WHEN')
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=when, backupCount=backup_count, encoding='utf-8'
+        )
+    return logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+        backupCount=backup_count,
+        encoding='utf-8'
+    )
+
+def setup_logging(level: Optional[str] = None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue drained by a background listener thread
+    
+    Returns the started listener; it is stopped (and the queue flushed) at
+    interpreter exit.
+    """
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(PLAIN_FORMAT))
+    handlers = [console]
+    
+    log_file = os.getenv('LOG_FILE', 'bot.log')
+    if log_file:
+        file_handler = _file_handler(log_file)
+        if os.getenv('LOG_JSON', '1') == '1':
+            file_handler.setFormatter(JsonFormatter())
+        else:
+            file_handler.setFormatter(logging.Formatter(PLAIN_FORMAT))
+        handlers.append(file_handler)
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(RateSampler(DEFAULT_SAMPLE_BUDGETS))
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
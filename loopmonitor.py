@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from metrics import registry, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = registry.register(Histogram(
+    "bot_event_loop_lag_seconds", "How late the event loop woke the lag probe",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)))
+SLOW_HANDLERS = registry.register(Counter(
+    "bot_slow_handlers_total", "Handlers that exceeded the latency budget", ("handler",)))
+
+@dataclass
+class InFlight:
+    """A handler currently running inside its update task"""
+    task: asyncio.Task
+    handler: str
+    update_type: str
+    chat_id: Optional[int]
+    started: float
+    flagged: bool = False
+    
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+def format_task_stack(task: asyncio.Task, limit: int = 20) -> str:
+    """Innermost ``limit`` frames of a suspended task's await chain
+    
+    ``Task.print_stack`` only shows the task's own coroutine frame, so the
+    chain is followed through ``cr_await`` down to the innermost awaitable.
+    """
+    frames = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    lines = [f"Stack for {task.get_name()} (most recent call last):"]
+    for frame in frames[-limit:]:
+        code = frame.f_code
+        lines.append(f'  File "{code.co_filename}", line {frame.f_lineno}, in {code.co_name}')
+    if awaitable is not None:
+        lines.append(f"  awaiting {awaitable!r}")
+    return "\n".join(lines) + "\n"
+
+class LoopMonitor:
+    """Background probe for event-loop lag plus a watchdog over running handlers"""
+    
+    def __init__(self, interval: float = 0.5, lag_threshold: float = 0.1, handler_budget: float = 2.0):
+        self.interval = interval
+        self.lag_threshold = lag_threshold
+        self.handler_budget = handler_budget
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.in_flight: Dict[asyncio.Task, InFlight] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the probe on the running loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="loop-monitor")
+            logger.info("Loop monitor started (interval %.2fs, lag threshold %.3fs, handler budget %.1fs)",
+                        self.interval, self.lag_threshold, self.handler_budget)
+    
+    async def stop(self):
+        """Cancel the probe"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag > self.lag_threshold:
+                logger.warning("Event loop lagged %.3fs; %d handlers in flight", lag, len(self.in_flight))
+            self.check_handlers()
+    
+    def check_handlers(self):
+        """Flag handlers running longer than the budget, once each"""
+        for entry in list(self.in_flight.values()):
+            if not entry.flagged and entry.elapsed > self.handler_budget:
+                entry.flagged = True
+                SLOW_HANDLERS.inc(entry.handler)
+                logger.warning("Slow handler %s: %.1fs on %s update in chat %s",
+                               entry.handler, entry.elapsed, entry.update_type, entry.chat_id)
+    
+    def slow_handlers(self) -> List[InFlight]:
+        """Handlers currently over the latency budget, slowest first"""
+        slow = [entry for entry in self.in_flight.values() if entry.elapsed > self.handler_budget]
+        return sorted(slow, key=lambda entry: entry.elapsed, reverse=True)
+    
+    def dump_stacks(self, only_slow: bool = True) -> str:
+        """Stacks of in-flight handler tasks; also written to the log"""
+        entries = self.slow_handlers() if only_slow else list(self.in_flight.values())
+        if not entries:
+            return ""
+        parts = []
+        for entry in entries:
+            parts.append(f"{entry.handler} ({entry.update_type}, chat {entry.chat_id}, {entry.elapsed:.1f}s)\n"
+                         f"{format_task_stack(entry.task)}")
+        report = "\n".join(parts)
+        logger.warning("Handler stack dump:\n%s", report)
+        return report
+
+class WatchdogMiddleware(BaseMiddleware):
+    """Inner middleware registering running handlers with the monitor"""
+    
+    def __init__(self, monitor: LoopMonitor):
+        self.monitor = monitor
+    
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        task = asyncio.current_task()
+        if task is None:
+            return await handler(event, data)
+        
+        if isinstance(event, Message):
+            chat_id = event.chat.id
+        elif isinstance(event, CallbackQuery) and event.message:
+            chat_id = event.message.chat.id
+        else:
+            chat_id = None
+        update = data.get("event_update")
+        handler_object = data.get("handler")
+        entry = InFlight(
+            task=task,
+            handler=getattr(getattr(handler_object, "callback", None), "__name__", "unknown"),
+            update_type=update.event_type if update else type(event).__name__,
+            chat_id=chat_id,
+            started=time.monotonic(),
+        )
+        self.monitor.in_flight[task] = entry
+        try:
+            return await handler(event, data)
+        finally:
+            self.monitor.in_flight.pop(task, None)
+            elapsed = entry.elapsed
+            if elapsed > self.monitor.handler_budget and not entry.flagged:
+                SLOW_HANDLERS.inc(entry.handler)
+                logger.warning("Slow handler %s finished in %.1fs on %s update in chat %s",
+                               entry.handler, elapsed, entry.update_type, entry.chat_id)
+
+# Global monitor instance
+monitor = LoopMonitor(
+    interval=float(os.getenv('LOOP_MONITOR_INTERVAL', '0.5')),
+    lag_threshold=float(os.getenv('LOOP_LAG_THRESHOLD', '0.1')),
+    handler_budget=float(os.getenv('HANDLER_BUDGET', '2.0')),
+)
+
+def setup_loop_monitor(dp: Dispatcher):
+    """Register the slow-handler watchdog on message and callback handlers"""
+    middleware = WatchdogMiddleware(monitor)
+    for observer in (dp.message, dp.edited_message, dp.callback_query):
+        observer.middleware(middleware)
+    logger.info("Loop monitor setup completed")
@@ -1,42 +1,47 @@
 import logging
 import asyncio
-from aiogram import Bot, Dispatcher
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.enums import ChatType
 from aiogram.filters import Command
 from aiogram.types import Message
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.telegram import TelegramAPIServer
 import os
 from dotenv import load_dotenv
 
 from commands import setup_commands
 from linkdetector import setup_link_detector
-from joinremover import setup_join_remover
+from floodlimiter import setup_flood_limiter
+from duplicatedetector import setup_duplicate_detector
+from domainlists import setup_domain_lists
+from chatsettings import chat_settings, setup_chat_settings
+from joinremover import setup_join_remover, deletion_batcher
 from admin import setup_admin
 from database import db
+from chatfilters import GROUP_CHAT_TYPES, inline
+from logconfig import setup_logging
+from metrics import QUEUE_DEPTH, setup_metrics, start_metrics_server
+from loopmonitor import monitor, setup_loop_monitor
+from blocklist import blocklist
+from backup import backups
+from retention import retention
+from spamscore import spam_scorer, moderation_log, setup_spam_score
+from recorder import setup_recorder
+from ratelimit import setup_rate_limiter
+from runtime import create_session, install_event_loop
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
-)
+# Configure logging (queued, written by a background thread)
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
-# Set debug level for our modules
-logging.getLogger('linkdetector').setLevel(logging.DEBUG)
-logging.getLogger('commands').setLevel(logging.INFO)
-logging.getLogger('joinremover').setLevel(logging.INFO)
-logging.getLogger('admin').setLevel(logging.INFO)
-logging.getLogger('database').setLevel(logging.INFO)
-
 # Get bot token and super admin ID from environment
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 SUPER_ADMIN_ID = os.getenv('SUPER_ADMIN_ID')
+# Optional Bot API server override (local Bot API server or the replay harness)
+BOT_API_URL = os.getenv('BOT_API_URL')
 
 # Validate environment variables
 if not BOT_TOKEN:
@@ -87,16 +92,27 @@ async def track_user_activity(message: Message):
             await db.update_group_activity(message.chat.id)
             
     except Exception as e:
-        logger.error(f"Error tracking user activity: {e}")
+        logger.error("Error tracking user activity: %s", e)
 
-def setup_activity_tracking(dp: Dispatcher):
+def setup_activity_tracking(private_router: Router):
     """Setup activity tracking for private messages (group messages are handled in linkdetector.py)"""
     
-    # This handler only tracks private messages since group messages are handled in linkdetector
-    @dp.message(lambda message: message.chat and message.chat.type == 'private')
+    # The private router is already gated on chat type, so this is a plain catch-all
+    @private_router.message()
     async def private_activity_tracker(message: Message):
         await track_user_activity(message)
-        logger.debug(f"Private activity tracked for user {message.from_user.id if message.from_user else 'N/A'}")
+        logger.debug("Private activity tracked for user %s", message.from_user.id if message.from_user else 'N/A')
+
+def create_chat_routers():
+    """Create routers gated by chat type so each update only walks its own handlers"""
+    private_router = Router(name="private")
+    private_router.message.filter(inline(F.chat.type == ChatType.PRIVATE))
+    
+    group_router = Router(name="group")
+    group_router.message.filter(inline(F.chat.type.in_(GROUP_CHAT_TYPES)))
+    group_router.edited_message.filter(inline(F.chat.type.in_(GROUP_CHAT_TYPES)))
+    
+    return private_router, group_router
 
 async def on_startup():
     """Actions to perform on bot startup"""
@@ -106,6 +122,9 @@ async def on_startup():
     try:
         await db.init_db()
         logger.info("✅ Database initialized successfully")
+        # Settings are consulted on every message, so they are read once here
+        await chat_settings.load()
+        await spam_scorer.load()
     except Exception as e:
         logger.error(f"❌ Failed to initialize database: {e}")
         raise
@@ -117,15 +136,37 @@ async def on_shutdown():
     logger.info("🔄 Bot is shutting down...")
     logger.info("✅ Bot shutdown completed")
 
+def create_bot() -> Bot:
+    """Create the bot, pointed at BOT_API_URL when it is set"""
+    if BOT_API_URL:
+        logger.info(f"Using Bot API server at {BOT_API_URL}")
+        return Bot(token=BOT_TOKEN, session=create_session(TelegramAPIServer.from_base(BOT_API_URL)))
+    return Bot(token=BOT_TOKEN, session=create_session())
+
 async def main():
     # Perform startup actions
     await on_startup()
     
     # Initialize bot and dispatcher
-    bot = Bot(token=BOT_TOKEN)
+    bot = create_bot()
     storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
     
+    # Outgoing calls queue for Telegram's flood limits before anything else sees them
+    setup_rate_limiter(bot)
+    # Instrumentation first so every handler and API call is measured
+    setup_metrics(dp, bot)
+    QUEUE_DEPTH.set_function(log_listener.queue.qsize, "logging")
+    setup_loop_monitor(dp)
+    recorder = setup_recorder(dp)
+    if recorder:
+        recorder.start()
+    metrics_runner = await start_metrics_server()
+    monitor.start()
+    blocklist.start()
+    backups.start()
+    retention.start()
+    
     # Setup handlers in order of priority
     logger.info("🔧 Setting up handlers...")
     
@@ -137,14 +178,23 @@ async def main():
     logger.info("  👤 Setting up admin handlers...")
     setup_admin(dp, bot)
     
-    # 3. Content filters (link detector, join remover)
+    private_router, group_router = create_chat_routers()
+    
+    # 3. Content filters (join remover, flood limiter, duplicates, link detector) - group chats only
     logger.info("  🔍 Setting up content filters...")
-    setup_link_detector(dp, bot)
-    setup_join_remover(dp, bot)
+    setup_join_remover(group_router, bot)
+    setup_flood_limiter(group_router, bot)
+    setup_duplicate_detector(group_router, bot)
+    setup_chat_settings(group_router, bot)
+    setup_domain_lists(group_router, bot)
+    setup_spam_score(group_router, bot)
+    setup_link_detector(group_router, bot)
     
-    # 4. Activity tracking (lowest priority - catches remaining messages)
+    # 4. Activity tracking (lowest priority - catches remaining private messages)
     logger.info("  📊 Setting up activity tracking...")
-    setup_activity_tracking(dp)
+    setup_activity_tracking(private_router)
+    
+    dp.include_routers(group_router, private_router)
     
     logger.info("✅ All handlers setup completed")
     
@@ -162,10 +212,22 @@ async def main():
     finally:
         # Perform shutdown actions
         await on_shutdown()
+        await monitor.stop()
+        await blocklist.stop()
+        await backups.stop()
+        await retention.stop()
+        await moderation_log.flush()
+        if recorder:
+            await recorder.stop()
+        await deletion_batcher.close()
         await bot.session.close()
+        await db.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         logger.info("🔚 Bot session closed")
 
 if __name__ == '__main__':
+    logger.info(f"Event loop: {install_event_loop()}")
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
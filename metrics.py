@@ -0,0 +1,287 @@
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject, Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base for in-process metrics rendered in the Prometheus text format"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+    
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """Monotonic counter, one series per label tuple"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+    
+    def get(self, *labels: str) -> float:
+        return self.values.get(labels, 0)
+    
+    def total(self) -> float:
+        return sum(self.values.values())
+    
+    def samples(self):
+        return [("", _format_labels(self.labelnames, labels), value) for labels, value in self.values.items()]
+
+class Gauge(Metric):
+    """Point-in-time value, either set directly or read from a callback at scrape time"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+    
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+    
+    def set_function(self, function: Callable[[], float], *labels: str) -> None:
+        self.functions[labels] = function
+    
+    def get(self, *labels: str) -> float:
+        function = self.functions.get(labels)
+        if function is not None:
+            try:
+                return function()
+            except Exception as e:
+                logger.debug("Gauge %s callback failed: %s", self.name, e)
+                return 0
+        return self.values.get(labels, 0)
+    
+    def samples(self):
+        keys = list(self.values) + [labels for labels in self.functions if labels not in self.values]
+        return [("", _format_labels(self.labelnames, labels), self.get(*labels)) for labels in keys]
+
+class Histogram(Metric):
+    """Bucketed distribution; observations are O(log buckets)"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self.series: Dict[Tuple[str, ...], list] = {}
+    
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+    
+    def count(self, *labels: str) -> int:
+        series = self.series.get(labels)
+        return series[2] if series else 0
+    
+    def mean(self, *labels: str) -> float:
+        series = self.series.get(labels)
+        return series[1] / series[2] if series and series[2] else 0.0
+    
+    def samples(self):
+        result = []
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                result.append(("_bucket", _format_labels(self.labelnames, labels, le), cumulative))
+            result.append(("_sum", _format_labels(self.labelnames, labels), total))
+            result.append(("_count", _format_labels(self.labelnames, labels), count))
+        return result
+
+class RateWindow:
+    """Events per second over a trailing window of one-second slots
+    
+    Fixed-size ring buffer: ``add`` is O(1) and memory does not grow with load.
+    Until a full window has passed, the rate is over the seconds seen so far.
+    """
+    
+    __slots__ = ("size", "counts", "stamps", "started")
+    
+    def __init__(self, seconds: int = 60):
+        self.size = seconds
+        self.counts = [0] * seconds
+        self.stamps = [0] * seconds
+        self.started = int(time.monotonic())
+    
+    def add(self, amount: int = 1, now: Optional[float] = None) -> None:
+        second = int(now if now is not None else time.monotonic())
+        slot = second % self.size
+        if self.stamps[slot] != second:
+            self.stamps[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += amount
+    
+    def total(self, now: Optional[float] = None) -> int:
+        second = int(now if now is not None else time.monotonic())
+        oldest = second - self.size
+        return sum(count for count, stamp in zip(self.counts, self.stamps) if stamp > oldest)
+    
+    def rate(self, now: Optional[float] = None) -> float:
+        second = int(now if now is not None else time.monotonic())
+        # The current second counts as one, so the span is never zero
+        span = min(self.size, max(1, second - self.started + 1))
+        return self.total(second) / span
+
+class Registry:
+    """Holds every metric the exporter renders"""
+    
+    def __init__(self):
+        self.metrics: List[Metric] = []
+    
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+registry = Registry()
+
+UPDATES_TOTAL = registry.register(Counter(
+    "bot_updates_total", "Updates received from Telegram", ("type",)))
+HANDLER_SECONDS = registry.register(Histogram(
+    "bot_handler_seconds", "Handler execution time", ("handler",)))
+HANDLER_ERRORS = registry.register(Counter(
+    "bot_handler_errors_total", "Exceptions escaping handlers", ("handler", "error")))
+API_REQUESTS = registry.register(Counter(
+    "bot_api_requests_total", "Outgoing Bot API calls", ("method", "result")))
+API_SECONDS = registry.register(Histogram(
+    "bot_api_request_seconds", "Outgoing Bot API call latency", ("method",)))
+DB_SECONDS = registry.register(Histogram(
+    "bot_db_statement_seconds", "Database operation time", ("operation",)))
+CACHE_REQUESTS = registry.register(Counter(
+    "bot_cache_requests_total", "In-memory cache lookups", ("cache", "result")))
+CACHE_SIZE = registry.register(Gauge(
+    "bot_cache_entries", "Entries held by in-memory caches", ("cache",)))
+QUEUE_DEPTH = registry.register(Gauge(
+    "bot_queue_depth", "Items waiting in internal queues", ("queue",)))
+
+# Trailing update rate for the admin diagnostics view
+UPDATE_RATE = RateWindow(60)
+
+def cache_hit_ratio(cache: str) -> float:
+    """Hit ratio of a cache since startup"""
+    hits = CACHE_REQUESTS.get(cache, "hit")
+    total = hits + CACHE_REQUESTS.get(cache, "miss")
+    return hits / total if total else 0.0
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer update middleware counting incoming updates by type"""
+    
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if isinstance(event, Update):
+            UPDATES_TOTAL.inc(event.event_type)
+            UPDATE_RATE.add()
+        return await handler(event, data)
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware timing the matched handler"""
+    
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware counting and timing every outgoing API call"""
+    
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        name = method.__api_method__
+        start = time.perf_counter()
+        try:
+            response = await make_request(bot, method)
+        except Exception as e:
+            API_REQUESTS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - start, name)
+        API_REQUESTS.inc(name, "ok")
+        return response
+
+def setup_metrics(dp: Dispatcher, bot: Bot):
+    """Wire update, handler and Bot API instrumentation"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    for observer in (dp.message, dp.edited_message, dp.callback_query):
+        observer.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(RequestMetricsMiddleware())
+    CACHE_SIZE.set_function(lambda: len(getattr(bot, '_user_cache', ())), "membership")
+    logger.info("Metrics instrumentation setup completed")
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """GET /metrics"""
+    return web.Response(body=registry.render().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def start_metrics_server(host: Optional[str] = None, port: Optional[int] = None) -> Optional[web.AppRunner]:
+    """Serve /metrics on a local port; disabled unless METRICS_PORT is set"""
+    port = port or int(os.getenv('METRICS_PORT', '0'))
+    if not port:
+        logger.info("METRICS_PORT not set - metrics endpoint disabled")
+        return None
+    host = host or os.getenv('METRICS_HOST', '127.0.0.1')
+    
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics endpoint listening on http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,225 @@
+import logging
+import time
+from typing import Awaitable, Callable, List, NamedTuple
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# Rows copied per transaction when a migration rebuilds a table
+REBUILD_BATCH = 5000
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[aiosqlite.Connection], Awaitable[None]]
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, description: str):
+    """Register ``func(connection)`` as the step that brings the schema to ``version``"""
+    def decorator(func):
+        if MIGRATIONS and version != MIGRATIONS[-1].version + 1:
+            raise ValueError(f"Migration {version} does not follow {MIGRATIONS[-1].version}")
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return decorator
+
+async def _scalar(connection: aiosqlite.Connection, query: str, params: tuple = ()):
+    async with connection.execute(query, params) as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else None
+
+async def rebuild_table(connection: aiosqlite.Connection, table: str, create: str, copy: str,
+                        batch: int = REBUILD_BATCH):
+    """Replace ``table`` with ``{table}_new`` filled ``batch`` rows at a time
+    
+    ``create`` makes the new table and ``copy`` moves the old rows whose
+    rowid is in ``(?, ?]`` into it. Every batch is its own transaction, so
+    the WAL and the write lock stay small however big the table is. The
+    swap happens in the runner's final transaction together with the new
+    ``user_version``; a rebuild cut short starts over on the next run.
+    """
+    new = f"{table}_new"
+    await connection.commit()
+    await connection.execute(f"DROP TABLE IF EXISTS {new}")
+    await connection.execute(create)
+    await connection.commit()
+    
+    total = await _scalar(connection, f"SELECT COUNT(*) FROM {table}")
+    copied, after = 0, 0
+    while copied < total:
+        high = await _scalar(connection, f"SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT 1 OFFSET ?",
+                             (after, batch - 1))
+        if high is None:
+            high = await _scalar(connection, f"SELECT MAX(rowid) FROM {table}")
+        await connection.execute(copy, (after, high))
+        await connection.commit()
+        copied += batch
+        after = high
+        logger.info("Rebuilding %s: %d/%d rows copied", table, min(copied, total), total)
+    
+    await connection.execute("BEGIN")
+    await connection.execute(f"DROP TABLE {table}")
+    await connection.execute(f"ALTER TABLE {new} RENAME TO {table}")
+
+async def migrate(connection: aiosqlite.Connection) -> int:
+    """Apply pending migrations in order; returns the resulting schema version
+    
+    The version lives in ``PRAGMA user_version``. Each migration runs in a
+    transaction that also stores its version, so a failed one is rolled
+    back and retried on the next start.
+    """
+    current = await _scalar(connection, "PRAGMA user_version")
+    latest = MIGRATIONS[-1].version
+    if current > latest:
+        logger.warning("Database schema version %d is newer than this code knows (%d)", current, latest)
+        return current
+    
+    for step in MIGRATIONS[current:]:
+        start = time.perf_counter()
+        await connection.execute("BEGIN")
+        try:
+            await step.apply(connection)
+            await connection.execute(f"PRAGMA user_version = {step.version}")
+            await connection.commit()
+        except Exception as e:
+            await connection.rollback()
+            logger.error("Migration %d (%s) failed: %s", step.version, step.description, e)
+            raise
+        logger.info("Applied migration %d: %s (%.2fs)", step.version, step.description, time.perf_counter() - start)
+    return latest
+
+@migration(1, "initial schema")
+async def initial_schema(db: aiosqlite.Connection):
+    # Users table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            is_bot BOOLEAN DEFAULT 0,
+            language_code TEXT,
+            is_premium BOOLEAN DEFAULT 0,
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        )
+    """)
+    
+    # Groups table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS groups (
+            chat_id INTEGER PRIMARY KEY,
+            title TEXT,
+            type TEXT,
+            username TEXT,
+            member_count INTEGER DEFAULT 0,
+            first_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        )
+    """)
+    
+    # User-Group relations table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_groups (
+            user_id INTEGER,
+            chat_id INTEGER,
+            joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_admin BOOLEAN DEFAULT 0,
+            PRIMARY KEY (user_id, chat_id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (chat_id) REFERENCES groups (chat_id)
+        )
+    """)
+    
+    # Statistics table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS statistics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date DATE DEFAULT CURRENT_DATE,
+            total_users INTEGER DEFAULT 0,
+            total_groups INTEGER DEFAULT 0,
+            active_users INTEGER DEFAULT 0,
+            active_groups INTEGER DEFAULT 0,
+            messages_deleted INTEGER DEFAULT 0,
+            spam_detected INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Join raids detected by joinremover
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS raid_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            join_count INTEGER DEFAULT 0,
+            detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Per-chat domain allow/deny lists managed by group admins
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS chat_domains (
+            chat_id INTEGER,
+            domain TEXT,
+            list_type TEXT CHECK (list_type IN ('allow', 'deny')),
+            added_by INTEGER,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (chat_id, domain)
+        )
+    """)
+    
+    # Per-chat feature flags; chats without a row use the defaults
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS chat_settings (
+            chat_id INTEGER PRIMARY KEY,
+            flags INTEGER NOT NULL,
+            updated_by INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Per-chat spam score thresholds; NULL switches scoring off
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS chat_spam_thresholds (
+            chat_id INTEGER PRIMARY KEY,
+            threshold REAL,
+            updated_by INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+@migration(2, "one statistics row per date")
+async def unique_statistics_date(db: aiosqlite.Connection):
+    # Without a unique date, "INSERT OR IGNORE" added a row for every counted
+    # message and each UPDATE then bumped all of that day's rows. The oldest
+    # row of a day has seen every increment, so duplicates merge with MAX
+    await rebuild_table(db, "statistics", """
+        CREATE TABLE statistics_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date DATE UNIQUE DEFAULT CURRENT_DATE,
+            total_users INTEGER DEFAULT 0,
+            total_groups INTEGER DEFAULT 0,
+            active_users INTEGER DEFAULT 0,
+            active_groups INTEGER DEFAULT 0,
+            messages_deleted INTEGER DEFAULT 0,
+            spam_detected INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """, """
+        INSERT INTO statistics_new (date, total_users, total_groups, active_users, active_groups,
+                                    messages_deleted, spam_detected, created_at)
+        SELECT date, total_users, total_groups, active_users, active_groups,
+               messages_deleted, spam_detected, created_at
+        FROM statistics WHERE rowid > ? AND rowid <= ?
+        ON CONFLICT (date) DO UPDATE SET
+            total_users = MAX(total_users, excluded.total_users),
+            total_groups = MAX(total_groups, excluded.total_groups),
+            active_users = MAX(active_users, excluded.active_users),
+            active_groups = MAX(active_groups, excluded.active_groups),
+            messages_deleted = MAX(messages_deleted, excluded.messages_deleted),
+            spam_detected = MAX(spam_detected, excluded.spam_detected),
+            created_at = MIN(created_at, excluded.created_at)
+    """)
@@ -0,0 +1,134 @@
+import re
+import unicodedata
+
+# Invisible characters spammers put inside links: zero-width space/joiners,
+# word joiner, BOM, soft hyphen and the bidi controls
+_INVISIBLE = (
+    '\u00ad\u034f\u061c\u115f\u1160\u17b4\u17b5\u180e\u200b\u200c\u200d\u200e\u200f'
+    '\u202a\u202b\u202c\u202d\u202e\u2060\u2061\u2062\u2063\u2064\u2066\u2067\u2068'
+    '\u2069\u3164\ufeff\uffa0'
+)
+
+# Punctuation lookalikes that render as the separators links are made of
+_SEPARATOR_LOOKALIKES = {
+    '.': '\u3002\uff61\u2024\ufe52\u0701\u0702\u2e31\u00b7\u2219',
+    '/': '\u2044\u2215\u29f8\uff0f',
+    '@': '\uff20\ufe6b',
+    ':': '\uff1a\ufe55\u2236',
+}
+
+# Script confusables for ASCII letters (Cyrillic, Greek, Armenian), folded
+# only inside tokens that already mix them with ASCII
+_CONFUSABLES = {
+    'a': 'аАαΑ',
+    'b': 'ВΒв',
+    'c': 'сСϲ',
+    'd': 'ԁ',
+    'e': 'еЕΕҽ',
+    'h': 'һНΗ',
+    'i': 'іІιΙӀ',
+    'j': 'јЈ',
+    'k': 'КΚκ',
+    'l': 'ӏ',
+    'm': 'МΜ',
+    'n': 'Νո',
+    'o': 'оОοΟօ',
+    'p': 'рРρΡ',
+    'q': 'ԛ',
+    's': 'ѕЅ',
+    't': 'ТΤ',
+    'u': 'ս',
+    'v': 'ν',
+    'w': 'ԝ',
+    'x': 'хХΧ',
+    'y': 'уүΥ',
+    'z': 'Ζ',
+}
+
+def _compatibility_table() -> dict:
+    """Fullwidth forms, mathematical alphanumerics and enclosed letters that
+    NFKC folds to a single ASCII character, precomputed once"""
+    table = {}
+    ranges = [(0xFF01, 0xFF5E), (0x1D400, 0x1D7FF), (0x2460, 0x24FF), (0x1F130, 0x1F189)]
+    for first, last in ranges:
+        for code in range(first, last + 1):
+            folded = unicodedata.normalize('NFKC', chr(code))
+            if len(folded) == 1 and folded.isascii() and folded.isprintable():
+                table[code] = folded.lower() if folded.isalpha() else folded
+    return table
+
+def _build_tables():
+    base = _compatibility_table()
+    base.update({ord(char): None for char in _INVISIBLE})
+    for target, lookalikes in _SEPARATOR_LOOKALIKES.items():
+        base.update({ord(char): target for char in lookalikes})
+    confusables = {ord(char): target for target, chars in _CONFUSABLES.items() for char in chars}
+    return base, confusables
+
+# Applied to messages containing any of its characters / to mixed-script
+# candidate tokens only
+BASE_TABLE, CONFUSABLE_TABLE = _build_tables()
+# translate() with a dict costs a lookup per character, so it only runs when
+# this (much cheaper) character class search finds something to fold
+def _char_class(codes) -> str:
+    """Regex character class with contiguous code points collapsed to ranges"""
+    ranges = []
+    for code in sorted(codes):
+        if ranges and ranges[-1][1] == code - 1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return '[' + ''.join(re.escape(chr(first)) if first == last else f'{re.escape(chr(first))}-{re.escape(chr(last))}'
+                         for first, last in ranges) + ']'
+
+# Split by plane: a BMP-only class compiles to a bitmap test per character,
+# while astral characters (mostly emoji) are few, so they are pulled out and
+# looked up individually
+_NEEDS_BASE = re.compile(_char_class(code for code in BASE_TABLE if code < 0x10000))
+_ASTRAL = re.compile('[\U00010000-\U0010FFFF]')
+
+def _needs_base(text: str) -> bool:
+    if text.isascii():
+        return False
+    if _NEEDS_BASE.search(text):
+        return True
+    return _ASTRAL.search(text) is not None and any(ord(char) in BASE_TABLE for char in _ASTRAL.findall(text))
+
+# Common TLDs; a spaced-out dot ("t . me") is only folded in front of one
+# so ordinary " . " punctuation does not turn into a link
+_TLDS = r'(?:me|com|net|org|uz|ru|io|ly|co|gg|su|kz|ua|info|xyz|top|site|online|link|club|pro|biz|app|dev|shop|store|cc|tk)'
+
+# "t[.]me", "t(dot)me", "t {.} me" and "t . com"
+_BRACKETED_DOT = re.compile(r'\s?[\[\(\{<]\s?(?:\.|dot|nuqta|точка)\s?[\]\)\}>]\s?', re.IGNORECASE)
+_SPACED_DOT = re.compile(r'(?<=\w) {1,3}\. {1,3}(?=' + _TLDS + r'\b)', re.IGNORECASE)
+
+# Whitespace-delimited tokens containing a link separator; the lookbehind
+# anchors every attempt at a token start so scanning stays linear
+_CANDIDATE_TOKEN = re.compile(r'(?<!\S)[^\s.@/]*[.@/]\S*')
+_ASCII_LETTER = re.compile(r'[a-zA-Z]')
+
+def _fold_confusables(match: re.Match) -> str:
+    token = match.group()
+    if token.isascii() or not _ASCII_LETTER.search(token):
+        return token
+    return token.translate(CONFUSABLE_TABLE)
+
+def normalize_for_scan(text: str) -> str:
+    """Undo common link obfuscation before the link rules run
+
+    Strips invisible characters, folds fullwidth/math/enclosed letters and
+    separator lookalikes to ASCII, collapses bracketed or spaced-out dots and
+    maps Cyrillic/Greek lookalike letters to ASCII inside tokens that mix
+    scripts. The result is only scanned, never shown or stored.
+    """
+    # Each pass is guarded by a substring test so ordinary chatter, which
+    # needs none of them, costs a few C-level scans
+    if _needs_base(text):
+        text = text.translate(BASE_TABLE)
+    if '[' in text or '(' in text or '{' in text or '<' in text:
+        text = _BRACKETED_DOT.sub('.', text)
+    if ' .' in text:
+        text = _SPACED_DOT.sub('.', text)
+    if not text.isascii() and ('.' in text or '@' in text or '/' in text):
+        text = _CANDIDATE_TOKEN.sub(_fold_confusables, text)
+    return text
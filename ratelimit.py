@@ -0,0 +1,235 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple, Union
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from metrics import CACHE_SIZE, QUEUE_DEPTH, registry, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+API_THROTTLED = registry.register(Counter(
+    "bot_api_throttled_total", "Bot API calls delayed by a local rate limit", ("method", "limit")))
+API_THROTTLE_SECONDS = registry.register(Histogram(
+    "bot_api_throttle_seconds", "Time Bot API calls waited for the rate limiter", ("limit",)))
+API_RETRY_AFTER = registry.register(Counter(
+    "bot_api_retry_after_total", "429 responses received from the Bot API", ("method", "result")))
+
+# Lower goes first when calls queue for the global budget: moderation
+# actions before lookups, lookups before warnings and broadcasts
+MODERATION_METHODS = {"deleteMessage", "deleteMessages", "banChatMember", "restrictChatMember"}
+LOOKUP_METHODS = {"getChatMember", "getChatAdministrators", "getChat", "answerCallbackQuery"}
+# Long polling is not an API call Telegram rate-limits
+UNLIMITED_METHODS = {"getUpdates"}
+# Messages a quiet group can receive at once before the per-minute pace applies
+GROUP_BURST = 3
+
+def priority(method_name: str) -> int:
+    if method_name in MODERATION_METHODS:
+        return 0
+    if method_name in LOOKUP_METHODS:
+        return 1
+    return 2
+
+def is_send(method_name: str) -> bool:
+    """Methods that post a message into a chat, the ones Telegram limits per chat"""
+    return method_name.startswith("send") or method_name in ("copyMessage", "forwardMessage")
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``capacity`` saved up"""
+    
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        # Set from retry_after; nothing is let through before it
+        self.blocked_until = 0.0
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def delay(self, now: Optional[float] = None) -> float:
+        """Seconds until a token is available (0 if one is now)"""
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+    
+    def take(self):
+        self.tokens -= 1
+    
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+    
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+class RateLimiter(BaseRequestMiddleware):
+    """Bot session middleware keeping outgoing calls inside Telegram's limits
+    
+    Every call takes a token from a global bucket (``global_rate`` per
+    second); when it runs dry, calls queue and are released lowest
+    ``priority`` first, so deletions are not stuck behind a burst of
+    warnings or a broadcast. Messages sent into a chat also take a token
+    from that chat's bucket: ``group_per_minute`` for groups,
+    ``private_rate`` per second for private chats. A 429 blocks the chat's
+    bucket (or the global one for chat-less calls) for ``retry_after`` and
+    the call is retried up to ``max_retries`` times as long as the wait is
+    at most ``max_retry_after`` seconds.
+    """
+    
+    def __init__(self, global_rate: float = 30, group_per_minute: float = 20, private_rate: float = 1,
+                 group_burst: float = GROUP_BURST, max_retries: int = 2, max_retry_after: float = 30):
+        # A bucket lets through its burst plus its refill within any window,
+        # so refill rates leave room for the burst: no second carries more
+        # than ``global_rate`` calls and no minute more than
+        # ``group_per_minute`` messages into one group
+        if global_rate <= 1 or group_per_minute <= group_burst or private_rate <= 0:
+            raise ValueError(f"Rate limits leave no refill: {global_rate}/s global, "
+                             f"{group_per_minute}/min per group (burst {group_burst}), {private_rate}/s private")
+        self.global_bucket = TokenBucket(global_rate - 1, 1)
+        self.group_per_minute = group_per_minute
+        self.group_rate = (group_per_minute - group_burst) / 60
+        self.group_burst = group_burst
+        self.private_rate = private_rate
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.chats: Dict[Union[int, str], TokenBucket] = {}
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._drainer: Optional[asyncio.Task] = None
+    
+    def depth(self) -> int:
+        return len(self._waiters)
+    
+    def chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) >= 10000:
+                self._forget_idle()
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.private_rate, 1)
+            else:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            self.chats[chat_id] = bucket
+        return bucket
+    
+    def _forget_idle(self):
+        # A full, unblocked bucket behaves exactly like a new one
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self.chats.items() if bucket.idle(now)]:
+            del self.chats[chat_id]
+    
+    async def _wait_chat(self, bucket: TokenBucket, name: str, sends: bool):
+        # Other calls into the chat only wait out a retry_after
+        def delay():
+            return bucket.delay() if sends else max(0.0, bucket.blocked_until - time.monotonic())
+        
+        start = None
+        while (wait := delay()) > 0:
+            if start is None:
+                start = time.perf_counter()
+                API_THROTTLED.inc(name, "chat")
+            await asyncio.sleep(wait)
+        if sends:
+            bucket.take()
+        if start is not None:
+            API_THROTTLE_SECONDS.observe(time.perf_counter() - start, "chat")
+    
+    async def _wait_global(self, name: str):
+        if not self._waiters and self.global_bucket.delay() == 0:
+            self.global_bucket.take()
+            return
+        API_THROTTLED.inc(name, "global")
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority(name), next(self._order), future))
+        if self._drainer is None:
+            self._drainer = asyncio.create_task(self._drain(), name="api-rate-limiter")
+        await future
+        API_THROTTLE_SECONDS.observe(time.perf_counter() - start, "global")
+    
+    async def _drain(self):
+        try:
+            while self._waiters:
+                delay = self.global_bucket.delay()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                _, _, future = heapq.heappop(self._waiters)
+                # A cancelled caller gives its turn to the next one
+                if not future.done():
+                    self.global_bucket.take()
+                    future.set_result(None)
+        finally:
+            self._drainer = None
+    
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        name = method.__api_method__
+        if name in UNLIMITED_METHODS:
+            return await make_request(bot, method)
+        
+        chat_id = getattr(method, "chat_id", None)
+        bucket = self.chat_bucket(chat_id) if chat_id is not None else None
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                await self._wait_chat(bucket, name, is_send(name))
+            await self._wait_global(name)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                (bucket or self.global_bucket).block(e.retry_after)
+                if attempt == self.max_retries or e.retry_after > self.max_retry_after:
+                    API_RETRY_AFTER.inc(name, "failed")
+                    raise
+                API_RETRY_AFTER.inc(name, "retried")
+                # The blocked bucket makes the next attempt wait it out
+                logger.warning("%s throttled by Telegram in chat %s, retrying in %ss", name, chat_id, e.retry_after)
+
+def rate_limited(bot: Bot) -> bool:
+    """True when the bot's calls go through a RateLimiter"""
+    return any(isinstance(middleware, RateLimiter) for middleware in bot.session.middleware)
+
+def setup_rate_limiter(bot: Bot) -> Optional[RateLimiter]:
+    """Route the bot's API calls through a RateLimiter; RATE_LIMIT_GLOBAL=0 turns it off
+    
+    Call before ``setup_metrics`` so the request metrics, which sit inside
+    the limiter, time each attempt rather than the time spent queued.
+    """
+    global_rate = float(os.getenv('RATE_LIMIT_GLOBAL', '30'))
+    if global_rate <= 0:
+        logger.info("Bot API rate limiter disabled")
+        return None
+    group_per_minute = float(os.getenv('RATE_LIMIT_GROUP_PER_MINUTE', '20'))
+    private_rate = float(os.getenv('RATE_LIMIT_PRIVATE', '1'))
+    # Each bucket keeps one call (global) or its burst (groups) out of the
+    # refill rate, so smaller limits would never refill
+    if global_rate <= 1:
+        logger.error("RATE_LIMIT_GLOBAL must be above 1, got %g; using 30", global_rate)
+        global_rate = 30
+    if group_per_minute <= GROUP_BURST:
+        logger.error("RATE_LIMIT_GROUP_PER_MINUTE must be above %d, got %g; using 20", GROUP_BURST, group_per_minute)
+        group_per_minute = 20
+    if private_rate <= 0:
+        logger.error("RATE_LIMIT_PRIVATE must be positive, got %g; using 1", private_rate)
+        private_rate = 1
+    limiter = RateLimiter(global_rate=global_rate, group_per_minute=group_per_minute, private_rate=private_rate)
+    bot.session.middleware(limiter)
+    QUEUE_DEPTH.set_function(limiter.depth, "api_requests")
+    CACHE_SIZE.set_function(lambda: len(limiter.chats), "rate_limit_chats")
+    logger.info("Bot API rate limiter: %g/s global, %g/min per group", global_rate, limiter.group_per_minute)
+    return limiter
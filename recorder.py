@@ -0,0 +1,95 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from metrics import QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+class UpdateRecorder(BaseMiddleware):
+    """Outer update middleware appending every incoming update to a gzip JSONL file
+    
+    Each line is ``{"ts": <unix time>, "update": {...}}``. Lines are buffered in
+    memory and written by a worker thread, so the event loop never touches the
+    file; the buffer is flushed every ``flush_interval`` seconds or once it
+    holds ``batch_size`` lines.
+    """
+    
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer: List[str] = []
+        self.recorded = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        # Size-triggered flushes; the loop only keeps weak references to tasks
+        self._flushes: Set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+    
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if isinstance(event, Update):
+            payload = event.model_dump(mode="json", by_alias=True, exclude_none=True, exclude_unset=True)
+            self.buffer.append(json.dumps({"ts": time.time(), "update": payload}, ensure_ascii=False))
+            if len(self.buffer) == self.batch_size:
+                task = asyncio.create_task(self.flush())
+                self._flushes.add(task)
+                task.add_done_callback(self._flushes.discard)
+        return await handler(event, data)
+    
+    def _write(self, lines: List[str]):
+        # Appending gzip members keeps the file readable as one stream
+        with gzip.open(self.path, "at", encoding="utf-8") as output:
+            output.write("\n".join(lines) + "\n")
+    
+    async def flush(self):
+        """Write buffered updates from a worker thread"""
+        async with self._lock:
+            if not self.buffer:
+                return
+            lines, self.buffer = self.buffer, []
+            try:
+                await asyncio.to_thread(self._write, lines)
+                self.recorded += len(lines)
+            except Exception as e:
+                logger.error("Error writing recorded updates to %s: %s", self.path, e)
+    
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+    
+    def start(self):
+        """Start the periodic flush on the running loop"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically(), name="update-recorder")
+    
+    async def stop(self):
+        """Stop flushing and write whatever is still buffered"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        logger.info("Update recorder stopped, %d updates written to %s", self.recorded, self.path)
+
+def setup_recorder(dp: Dispatcher) -> Optional[UpdateRecorder]:
+    """Record incoming updates when RECORD_UPDATES points at a file"""
+    path = os.getenv('RECORD_UPDATES')
+    if not path:
+        return None
+    recorder = UpdateRecorder(path)
+    dp.update.outer_middleware(recorder)
+    QUEUE_DEPTH.set_function(lambda: len(recorder.buffer), "recorder")
+    logger.info("Recording incoming updates to %s", path)
+    return recorder
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+from typing import Dict, NamedTuple, Optional
+from database import db
+from metrics import registry, Counter
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DELETED = registry.register(Counter(
+    "bot_retention_deleted_rows_total", "Rows removed by retention policies", ("table",)))
+
+class RetentionPolicy(NamedTuple):
+    table: str
+    # SQL condition; its single "?" receives the age cutoff as a datetime() modifier
+    condition: str
+    days: int
+    label: str
+
+def _days(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+# A policy with days <= 0 is switched off. Users and groups are what
+# broadcasts and the admin stats work from, so pruning them is opt-in
+POLICIES = [
+    RetentionPolicy("users", "last_seen < datetime('now', ?)",
+                    _days('RETENTION_USER_DAYS', 0), "nofaol foydalanuvchilar"),
+    RetentionPolicy("groups", "last_active < datetime('now', ?)",
+                    _days('RETENTION_GROUP_DAYS', 0), "nofaol guruhlar"),
+    RetentionPolicy("statistics", "date < date('now', ?)",
+                    _days('RETENTION_STATISTICS_DAYS', 365), "statistika"),
+    RetentionPolicy("raid_events", "detected_at < datetime('now', ?)",
+                    _days('RETENTION_RAID_EVENT_DAYS', 90), "raid hodisalari"),
+]
+
+# Memberships of users and groups that were pruned above
+ORPHANED_MEMBERSHIPS = ("user_groups", "user_id NOT IN (SELECT user_id FROM users) "
+                        "OR chat_id NOT IN (SELECT chat_id FROM groups)")
+
+class RetentionJob:
+    """Background pruning of old rows plus incremental vacuum
+    
+    Every ``interval`` seconds each policy deletes matching rows ``chunk``
+    at a time, each chunk its own short transaction with a ``pause`` after
+    it, so message writes interleave instead of waiting behind one big
+    DELETE. Freed pages are then returned to the filesystem
+    ``vacuum_pages`` at a time, keeping the file (and the page cache it
+    needs) as small as the live data.
+    """
+    
+    def __init__(self, interval: float = 24 * 3600, chunk: int = 500, pause: float = 0.05,
+                 vacuum_pages: int = 512):
+        self.interval = interval
+        self.chunk = chunk
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self._task: Optional[asyncio.Task] = None
+    
+    async def _prune(self, table: str, condition: str, params: tuple = ()) -> int:
+        deleted, after = 0, 0
+        while after is not None:
+            count, after = await db.prune(table, condition, params, after=after, limit=self.chunk)
+            deleted += count
+            await asyncio.sleep(self.pause)
+        if deleted:
+            RETENTION_DELETED.inc(table, amount=deleted)
+        return deleted
+    
+    async def vacuum(self):
+        """Release free pages ``vacuum_pages`` at a time until none are left"""
+        previous = None
+        # Stops early if a step makes no progress (e.g. a file not yet in incremental mode)
+        while True:
+            remaining = await db.incremental_vacuum(self.vacuum_pages)
+            if remaining == 0 or remaining == previous:
+                return
+            previous = remaining
+            await asyncio.sleep(self.pause)
+    
+    async def run_once(self) -> Dict[str, int]:
+        """Apply every policy and vacuum; returns rows deleted per table"""
+        deleted = {}
+        for policy in POLICIES:
+            if policy.days > 0:
+                deleted[policy.table] = await self._prune(policy.table, policy.condition, (f"-{policy.days} days",))
+        if deleted.get("users") or deleted.get("groups"):
+            deleted[ORPHANED_MEMBERSHIPS[0]] = await self._prune(*ORPHANED_MEMBERSHIPS)
+        await self.vacuum()
+        logger.info("Retention pass removed %s", ", ".join(f"{count} {table}" for table, count in deleted.items()) or "nothing")
+        return deleted
+    
+    def start(self):
+        """Run a pass every ``interval`` seconds on the running loop (0 disables it)"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name="retention")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error("Error applying retention policies: %s", e)
+            await asyncio.sleep(self.interval)
+    
+    def status_text(self) -> str:
+        """One line for the admin settings screen"""
+        active = [f"{policy.label} {policy.days} kun" for policy in POLICIES if policy.days > 0]
+        if self.interval <= 0 or not active:
+            return "Eski ma'lumotlarni tozalash: Yo'q ❌"
+        return "Eski ma'lumotlarni tozalash: " + ", ".join(active)
+
+# Global retention job
+retention = RetentionJob(
+    interval=float(os.getenv('RETENTION_INTERVAL_HOURS', '24')) * 3600,
+    chunk=int(os.getenv('RETENTION_CHUNK', '500')),
+)
@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import time
+import zlib
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from aiogram import Router, Bot
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from chatfilters import ChatAdmin
+from database import db
+from metrics import registry, Counter, Histogram, CACHE_SIZE, QUEUE_DEPTH
+
+try:
+    import numpy as np
+except ImportError:
+    # Scoring is optional: without NumPy no model loads and every message
+    # goes through the regex rules only
+    np = None
+
+logger = logging.getLogger(__name__)
+
+SPAM_SCORED = registry.register(Counter(
+    "bot_spam_scored_total", "Messages scored by the spam model"))
+SPAM_BATCH_SIZE = registry.register(Histogram(
+    "bot_spam_score_batch_size", "Messages per spam model micro-batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)))
+
+# Words (digit runs collapse to their length), word pairs and a few link
+# shapes, each hashed into a 2**bits weight vector. Only the first
+# MAX_FEATURE_WORDS words count, so long messages cost the same as short ones
+MAX_FEATURE_WORDS = 200
+_WORD = re.compile(r'\w{2,32}|[$€₽%+]')
+_SHAPES = (('://', 'shape:url'), ('t.me/', 'shape:tme'), ('@', 'shape:at'), ('.', 'shape:dot'), ('\n', 'shape:lines'))
+
+def message_features(text: str, bits: int) -> List[int]:
+    """Hashed feature ids of (normalized) message text"""
+    text = text.lower()
+    words = [word if not word.isdigit() else f"num:{len(word)}"
+             for word in _WORD.findall(text, 0, MAX_FEATURE_WORDS * 16)[:MAX_FEATURE_WORDS]]
+    names = set(words)
+    names.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    names.update(name for marker, name in _SHAPES if marker in text)
+    names.add(f"len:{min(len(text).bit_length(), 12)}")
+    mask = (1 << bits) - 1
+    # crc32 rather than hash(): string hashes are salted per process
+    return [zlib.crc32(name.encode()) & mask for name in names]
+
+def _segments(batch: Sequence[List[int]]):
+    """Flattened feature ids and the message index of each one"""
+    lengths = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
+    indices = np.fromiter(chain.from_iterable(batch), dtype=np.int64, count=int(lengths.sum()))
+    return indices, np.repeat(np.arange(len(batch)), lengths)
+
+class SpamModel:
+    """Logistic model over hashed features: sigmoid(bias + sum of weights)
+    
+    A batch is scored with one gather and one bincount over the flattened
+    feature ids, so per-message cost is a few array elements and the Python
+    work is feature extraction only.
+    """
+    
+    def __init__(self, weights, bias: float, bits: int):
+        self.weights = weights
+        self.bias = bias
+        self.bits = bits
+    
+    @classmethod
+    def load(cls, path: str) -> "SpamModel":
+        with np.load(path) as data:
+            return cls(data["weights"].astype(np.float32), float(data["bias"]), int(data["bits"]))
+    
+    def save(self, path: str):
+        with open(path, "wb") as output:
+            np.savez_compressed(output, weights=self.weights, bias=self.bias, bits=self.bits)
+    
+    def score_batch(self, batch: Sequence[List[int]]):
+        """Spam probability of each feature list"""
+        indices, segments = _segments(batch)
+        totals = np.bincount(segments, weights=self.weights[indices], minlength=len(batch))
+        return 1.0 / (1.0 + np.exp(-(totals + self.bias)))
+
+def train(samples: Sequence[Tuple[str, bool]], bits: int = 18, epochs: int = 30,
+          learning_rate: float = 1.0, l2: float = 1e-4) -> SpamModel:
+    """Fit a model to (normalized text, is_spam) samples
+    
+    Naive Bayes log-count ratios give the starting weights, then a few
+    epochs of full-batch gradient descent on the logistic loss calibrate
+    them into probabilities.
+    """
+    batch = [message_features(text, bits) for text, _ in samples]
+    labels = np.array([1.0 if spam else 0.0 for _, spam in samples])
+    indices, segments = _segments(batch)
+    size = 1 << bits
+    
+    spam_counts = np.bincount(indices, weights=labels[segments], minlength=size)
+    ham_counts = np.bincount(indices, weights=1.0 - labels[segments], minlength=size)
+    weights = np.log((spam_counts + 1) / (spam_counts.sum() + size)) - np.log((ham_counts + 1) / (ham_counts.sum() + size))
+    weights[spam_counts + ham_counts == 0] = 0.0
+    # Naive Bayes counts every correlated word as independent evidence;
+    # scale by the typical message size so the descent starts unsaturated
+    weights /= max(1.0, float(np.mean([len(features) for features in batch])))
+    spam_ratio = min(max(labels.mean(), 1e-3), 1 - 1e-3)
+    bias = float(np.log(spam_ratio / (1 - spam_ratio)))
+    
+    for _ in range(epochs):
+        totals = np.bincount(segments, weights=weights[indices], minlength=len(batch)) + bias
+        errors = 1.0 / (1.0 + np.exp(-totals)) - labels
+        weights -= learning_rate * (np.bincount(indices, weights=errors[segments], minlength=size) / len(batch) + l2 * weights)
+        bias -= learning_rate * float(errors.mean())
+    return SpamModel(weights.astype(np.float32), bias, bits)
+
+class SpamScorer:
+    """Optional model stage behind the link rules, scoring in micro-batches
+    
+    ``score`` queues a message and resolves once its batch is scored: the
+    first message opens a ``max_delay`` window and everything queued before
+    it closes (or until ``batch_size`` pile up) is scored in one vectorized
+    call. Per-chat thresholds are cached like chat settings; a chat without
+    an override uses ``default_threshold`` and None switches scoring off.
+    """
+    
+    def __init__(self, model_path: Optional[str] = None, default_threshold: float = 0.9,
+                 batch_size: int = 64, max_delay: float = 0.005):
+        self.model_path = model_path
+        self.default_threshold = default_threshold
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.model: Optional[SpamModel] = None
+        self.thresholds: Dict[int, Optional[float]] = {}
+        self.pending: List[Tuple[List[int], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+    
+    @property
+    def active(self) -> bool:
+        return self.model is not None
+    
+    async def load(self):
+        """Load the model file (if NumPy and the file exist) and the chat thresholds"""
+        self.thresholds = await db.get_spam_thresholds()
+        if not self.model_path or not os.path.exists(self.model_path):
+            return
+        if np is None:
+            logger.warning("Spam model %s not loaded: NumPy is not installed", self.model_path)
+            return
+        try:
+            self.model = await asyncio.to_thread(SpamModel.load, self.model_path)
+            logger.info("Spam model loaded from %s (%d features, %d chat thresholds)",
+                        self.model_path, len(self.model.weights), len(self.thresholds))
+        except Exception as e:
+            logger.error("Error loading spam model from %s: %s", self.model_path, e)
+    
+    def threshold(self, chat_id: int) -> Optional[float]:
+        return self.thresholds.get(chat_id, self.default_threshold)
+    
+    async def set_threshold(self, chat_id: int, threshold: Optional[float], updated_by: Optional[int] = None):
+        await db.set_spam_threshold(chat_id, threshold, updated_by)
+        self.thresholds[chat_id] = threshold
+    
+    async def reset_threshold(self, chat_id: int):
+        await db.remove_spam_threshold(chat_id)
+        self.thresholds.pop(chat_id, None)
+    
+    async def score(self, text: str) -> float:
+        """Spam probability of normalized message text"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((message_features(text, self.model.bits), future))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self.flush)
+        return await future
+    
+    def flush(self):
+        """Score everything queued"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            scores = self.model.score_batch([features for features, _ in batch]).tolist()
+        except Exception as e:
+            logger.error("Error scoring %d messages: %s", len(batch), e)
+            scores = [0.0] * len(batch)
+        SPAM_SCORED.inc(amount=len(batch))
+        SPAM_BATCH_SIZE.observe(len(batch))
+        for (_, future), score in zip(batch, scores):
+            if not future.done():
+                future.set_result(score)
+
+class ModerationLog:
+    """Labelled moderation decisions for offline training, as gzip JSONL
+    
+    Each line is ``{"ts", "chat_id", "text", "spam"}`` with the normalized
+    text the rules saw. Deletions are always written; messages let through
+    are sampled at ``ham_rate``. Lines are buffered and appended from a
+    worker thread like the update recorder.
+    """
+    
+    def __init__(self, path: Optional[str] = None, ham_rate: float = 0.05, batch_size: int = 200):
+        self.path = path
+        self.ham_rate = ham_rate
+        self.batch_size = batch_size
+        self.buffer: List[str] = []
+        # Size-triggered flushes; the loop only keeps weak references to tasks
+        self._flushes: Set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+    
+    def record(self, chat_id: int, text: str, spam: bool):
+        if not self.path or (not spam and random.random() >= self.ham_rate):
+            return
+        self.buffer.append(json.dumps({"ts": time.time(), "chat_id": chat_id, "text": text, "spam": spam},
+                                      ensure_ascii=False))
+        if len(self.buffer) == self.batch_size:
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+    
+    def _write(self, lines: List[str]):
+        with gzip.open(self.path, "at", encoding="utf-8") as output:
+            output.write("\n".join(lines) + "\n")
+    
+    async def flush(self):
+        async with self._lock:
+            if not self.buffer:
+                return
+            lines, self.buffer = self.buffer, []
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except Exception as e:
+                logger.error("Error writing moderation log %s: %s", self.path, e)
+
+def read_samples(paths: Iterable[str]) -> List[Tuple[str, bool]]:
+    """(text, spam) pairs from moderation logs; later lines for the same text win"""
+    samples: Dict[str, bool] = {}
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as source:
+            for line in source:
+                if line.strip():
+                    event = json.loads(line)
+                    samples[event["text"]] = bool(event["spam"])
+    return list(samples.items())
+
+# Global instances; scoring stays off until a model file is present
+spam_scorer = SpamScorer(
+    model_path=os.getenv('SPAM_MODEL_FILE', 'spam_model.npz'),
+    default_threshold=float(os.getenv('SPAM_SCORE_THRESHOLD', '0.9')),
+    batch_size=int(os.getenv('SPAM_SCORE_BATCH', '64')),
+    max_delay=float(os.getenv('SPAM_SCORE_DELAY_MS', '5')) / 1000,
+)
+moderation_log = ModerationLog(
+    path=os.getenv('MODERATION_LOG') or None,
+    ham_rate=float(os.getenv('MODERATION_LOG_HAM_RATE', '0.05')),
+)
+CACHE_SIZE.set_function(lambda: len(spam_scorer.thresholds), "spam_thresholds")
+QUEUE_DEPTH.set_function(lambda: len(spam_scorer.pending), "spam_score")
+QUEUE_DEPTH.set_function(lambda: len(moderation_log.buffer), "moderation_log")
+
+def format_threshold(threshold: Optional[float]) -> str:
+    return "o'chirilgan ❌" if threshold is None else f"{threshold:.2f}"
+
+async def spam_score_command(message: Message, command: CommandObject, bot: Bot):
+    """Handle /spamscore [0.5-0.99 | off | default] from group admins"""
+    try:
+        chat_id = message.chat.id
+        argument = (command.args or "").strip().lower()
+        if not argument:
+            model = "yuklangan ✅" if spam_scorer.active else "yuklanmagan (faqat qoidalar ishlaydi)"
+            custom = " (standart)" if chat_id not in spam_scorer.thresholds else ""
+            await message.reply(
+                f"🧮 Spam modeli: {model}\n"
+                f"Chegara: {format_threshold(spam_scorer.threshold(chat_id))}{custom}\n\n"
+                "O'zgartirish: /spamscore 0.8 | off | default")
+            return
+        
+        updated_by = message.from_user.id if message.from_user else None
+        if argument == "default":
+            await spam_scorer.reset_threshold(chat_id)
+        elif argument == "off":
+            await spam_scorer.set_threshold(chat_id, None, updated_by)
+        else:
+            try:
+                threshold = float(argument.replace(',', '.'))
+            except ValueError:
+                threshold = None
+            if threshold is None or not 0.5 <= threshold < 1:
+                await message.reply("ℹ️ Chegara 0.5 dan 0.99 gacha bo'lishi kerak, masalan: /spamscore 0.85")
+                return
+            await spam_scorer.set_threshold(chat_id, threshold, updated_by)
+        
+        await message.reply(f"✅ Spam chegarasi: {format_threshold(spam_scorer.threshold(chat_id))}")
+        logger.info("Spam threshold in chat %s set to %s", chat_id, spam_scorer.threshold(chat_id))
+    
+    except Exception as e:
+        logger.error("Error in spamscore command: %s", e)
+        await message.reply("Xatolik yuz berdi. Iltimos qayta urinib ko'ring.")
+
+def setup_spam_score(parent: Router, bot: Bot):
+    """Setup spam threshold commands on the group router
+    
+    /spamscore from non-admins is not handled here and goes on to the
+    routers after it like any other message.
+    """
+    
+    router = Router(name="spamscore")
+    router.message.filter(Command("spamscore"), ChatAdmin())
+    
+    @router.message()
+    async def spam_score_handler(message: Message, command: CommandObject):
+        await spam_score_command(message, command, bot)
+    
+    parent.include_router(router)
+    logger.info("Spam scoring setup completed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the spam model from moderation logs (MODERATION_LOG files)")
+    parser.add_argument("logs", nargs="+", help="moderation log files (.jsonl or .jsonl.gz)")
+    parser.add_argument("--output", default="spam_model.npz")
+    parser.add_argument("--bits", type=int, default=18, help="feature hash size as a power of two")
+    parser.add_argument("--epochs", type=int, default=30)
+    args = parser.parse_args()
+    
+    samples = read_samples(args.logs)
+    spam = sum(1 for _, is_spam in samples if is_spam)
+    print(f"{len(samples)} samples, {spam} spam")
+    model = train(samples, bits=args.bits, epochs=args.epochs)
+    model.save(args.output)
+    print(f"Model written to {args.output}")